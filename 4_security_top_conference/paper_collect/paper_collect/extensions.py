@@ -0,0 +1,40 @@
+# Define here your custom extensions
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/extensions.html
+
+from scrapy import signals
+
+
+class CrawlCacheReport:
+    """
+    爬虫结束时汇总 HTTP 缓存与论文指纹库的效果：
+    - 缓存命中：未发出网络请求，直接使用缓存页面
+    - 重新验证：发出条件请求（If-None-Match / If-Modified-Since），服务器返回 304，未重新下载页面内容
+    - 下载：新页面或已变化的页面
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        ext = cls(crawler.stats)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_closed(self, spider, reason):
+        get = self.stats.get_value
+        hits = get('httpcache/hit', 0)
+        revalidated = get('httpcache/revalidate', 0)
+        # 首次下载 + 缓存失效后重新下载（页面已变化）
+        downloaded = get('httpcache/firsthand', 0) + get('httpcache/invalidate', 0)
+        self.stats.set_value('httpcache/requests_saved', hits)
+        spider.logger.info(
+            "HTTP cache: %d requests saved (served from cache), %d revalidated with 304 "
+            "(page not re-downloaded), %d pages downloaded (new or changed)",
+            hits, revalidated, downloaded)
+        if get('seen_papers/new') is not None or get('seen_papers/unchanged') is not None:
+            spider.logger.info(
+                "Papers: %d new, %d changed, %d unchanged (not emitted)",
+                get('seen_papers/new', 0), get('seen_papers/changed', 0), get('seen_papers/unchanged', 0))
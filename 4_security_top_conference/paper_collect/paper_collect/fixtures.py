@@ -0,0 +1,133 @@
+# 页面录制与离线回放
+#
+# FixtureRecorderMiddleware（middlewares.py）在爬取时把列表页和详情页保存为 fixture：
+#   fixtures/<spider>/index.jsonl   每行一个页面：url、状态码、响应头、回调名、可序列化的 meta 和 cb_kwargs
+#   fixtures/<spider>/<id>.html     原始响应体
+# 回放时按记录重建 HtmlResponse（带原 Request、回调、meta 和 cb_kwargs），不需要网络，
+# parse_bench.py 用它测量各回调的解析速度并核对 golden 输出。
+#
+#   scrapy crawl ndss -s FIXTURES_RECORD=True                 # 录制（可直接从 HTTP 缓存录制）
+#   python -m paper_collect.parse_bench fixtures --update-golden
+
+import hashlib
+import json
+import os
+
+from scrapy.http import HtmlResponse, Request
+
+INDEX_FILE = "index.jsonl"
+GOLDEN_FILE = "golden.json"
+
+# Scrapy 自身写入 meta 的键，不属于爬虫传递的数据，不录制
+SCRAPY_META_KEYS = {
+    "depth", "download_slot", "download_latency", "download_timeout", "download_maxsize",
+    "download_warnsize", "retry_times", "redirect_times", "redirect_ttl", "redirect_urls",
+    "redirect_reasons", "handle_httpstatus_list", "handle_httpstatus_all", "proxy",
+    "cookiejar", "ftp_user", "ftp_password", "referrer_policy", "max_retry_times", "bindaddress",
+    "is_start_request",
+}
+
+
+def fixture_id(url, callback):
+    return hashlib.sha1(f"{callback} {url}".encode("utf-8")).hexdigest()[:16]
+
+
+def callback_name(request):
+    callback = request.callback
+    if callback is None:
+        return "parse"
+    return getattr(callback, "__name__", str(callback))
+
+
+def recordable_meta(meta):
+    """meta 中爬虫自己传递、可 JSON 序列化的部分（如 item、title）"""
+    return _serializable({key: value for key, value in meta.items()
+                          if key not in SCRAPY_META_KEYS and not key.startswith(("_", "dont_"))})
+
+
+def _serializable(values):
+    kept = {}
+    for key, value in values.items():
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            continue
+        kept[key] = value
+    return kept
+
+
+def fixture_record(request, response):
+    """一个响应的 fixture 记录（不含响应体）"""
+    callback = callback_name(request)
+    headers = {name.decode("latin-1"): [v.decode("latin-1") for v in values]
+               for name, values in response.headers.items()}
+    return {
+        "id": fixture_id(response.url, callback),
+        "url": response.url,
+        "status": response.status,
+        "headers": headers,
+        "callback": callback,
+        "meta": recordable_meta(request.meta),
+        "cb_kwargs": _serializable(request.cb_kwargs),
+    }
+
+
+def write_fixture(directory, record, body):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, record["id"] + ".html"), "wb") as f:
+        f.write(body)
+
+
+def read_index(directory):
+    """{id: 记录}，按录制顺序"""
+    path = os.path.join(directory, INDEX_FILE)
+    records = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    records[record["id"]] = record
+    return records
+
+
+def write_index(directory, records):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, INDEX_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        for record in records.values():
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(path + ".tmp", path)
+
+
+def load_fixtures(directory):
+    """[(记录, 响应体)]，缺少响应体文件的记录跳过"""
+    fixtures = []
+    for record in read_index(directory).values():
+        path = os.path.join(directory, record["id"] + ".html")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                fixtures.append((record, f.read()))
+    return fixtures
+
+
+def replay_response(record, body, spider):
+    """按记录重建 HtmlResponse，request 的回调指向 spider 上的同名方法"""
+    request = Request(record["url"], callback=getattr(spider, record["callback"]),
+                      meta=json.loads(json.dumps(record["meta"])),
+                      cb_kwargs=json.loads(json.dumps(record.get("cb_kwargs", {}))))
+    return HtmlResponse(record["url"], status=record["status"], headers=record["headers"],
+                        body=body, request=request)
+
+
+def read_golden(directory):
+    path = os.path.join(directory, GOLDEN_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_golden(directory, golden):
+    with open(os.path.join(directory, GOLDEN_FILE), "w", encoding="utf-8") as f:
+        json.dump(golden, f, ensure_ascii=False, indent=2, sort_keys=True)
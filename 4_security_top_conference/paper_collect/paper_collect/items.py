@@ -3,6 +3,12 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/items.html
 
+import hashlib
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Optional
+
 import scrapy
 
 
@@ -10,3 +16,80 @@ class PaperCollectItem(scrapy.Item):
     # define the fields for your item here like:
     # name = scrapy.Field()
     pass
+
+
+# 各爬虫字段名 -> 统一字段名（AAAI 用 paper_title/pdf_url/paper_url）
+FIELD_ALIASES = {
+    'paper_title': 'title',
+    'pdf_url': 'pdf_link',
+    'paper_url': 'url',
+    'source_section_url': 'section_url',
+}
+
+# 页面上抓到的标签前缀，如 USENIX 的 "Authors: ..."、"Abstract: ..."
+_LABEL_PREFIX_RE = re.compile(r'^\s*(?:authors?|abstract)\s*:\s*', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+_DOI_RE = re.compile(r'10\.\d{4,9}/\S+')
+_NON_ALNUM_RE = re.compile(r'[^0-9a-z]+')
+
+
+def stable_paper_id(doi=None, title=None):
+    """
+    论文的稳定ID：有 DOI 时由 DOI 生成，否则由规范化标题生成。
+    爬虫项目单独部署时不依赖仓库里的 paper_analysis，所以在这里保留一份；
+    算法必须与 paper_analysis.sources.stable_id 一致（tests/test_items.py 核对）。
+    """
+    match = _DOI_RE.search(str(doi or '').strip().lower())
+    if match:
+        key = f"doi:{match.group(0).rstrip('.')}"
+    else:
+        text = unicodedata.normalize('NFKD', str(title or '')).encode('ascii', 'ignore').decode('ascii')
+        key = f"title:{_NON_ALNUM_RE.sub(' ', text.lower()).strip()}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def _clean(value, strip_label=False):
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        value = ", ".join(str(v) for v in value if v)
+    value = _WHITESPACE_RE.sub(' ', str(value)).strip()
+    if strip_label:
+        value = _LABEL_PREFIX_RE.sub('', value)
+    return value or None
+
+
+@dataclass(slots=True)
+class PaperItem:
+    """
+    统一字段的论文记录，供论文库（SQLitePipeline）使用。
+    导出的 feed 仍是各爬虫原有的 dict（见 PaperCollectPipeline）。
+    """
+
+    paper_id: str
+    title: str
+    authors: Optional[str] = None
+    abstract: Optional[str] = None
+    pdf_link: Optional[str] = None
+    url: Optional[str] = None
+    doi: Optional[str] = None
+    year: Optional[str] = None
+    source: Optional[str] = None
+    section_url: Optional[str] = None
+    relevance_score: Optional[float] = None
+
+    @classmethod
+    def from_dict(cls, data):
+        """把爬虫产出的 dict 规范化：统一字段名、合并空白、去掉标签前缀，生成稳定ID。"""
+        fields = {}
+        for key, value in data.items():
+            key = FIELD_ALIASES.get(key, key)
+            if key in cls.__dataclass_fields__ and key != 'paper_id':
+                fields[key] = value
+        for key in ('title', 'pdf_link', 'url', 'doi', 'source', 'section_url'):
+            fields[key] = _clean(fields.get(key))
+        fields['authors'] = _clean(fields.get('authors'), strip_label=True)
+        fields['abstract'] = _clean(fields.get('abstract'), strip_label=True)
+        fields['year'] = _clean(fields.get('year'))
+        fields['title'] = fields['title'] or ''
+        return cls(paper_id=stable_paper_id(fields.get('doi'), fields['title']), **fields)
@@ -3,11 +3,20 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import json
+import os
+import time
+from collections import deque
+
 from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import TextResponse
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
 
+from paper_collect.fixtures import fixture_record, read_index, write_fixture, write_index
+
 
 class PaperCollectSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -101,3 +110,255 @@ class PaperCollectDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+# 每个域名保留最近多少个响应延迟用于计算分位数（长时间爬取时内存不随请求数增长）
+LATENCY_WINDOW = 1000
+
+
+class _DomainState:
+    """一个域名的限速状态与统计数据"""
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.latency_ewma = None
+        self.successes = 0
+        self.requests = 0
+        self.responses = 0
+        self.errors = 0
+        self.throttled = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.backoffs = []
+        self.first_seen = time.time()
+        self.last_seen = self.first_seen
+
+
+class AdaptiveThrottleMiddleware:
+    """
+    按域名自适应调整并发数和下载延迟（AIMD）：
+    - 响应延迟低于目标值时逐步增加并发、缩短延迟
+    - 延迟过高时减少并发
+    - 429/503 或网络错误时并发减半、延迟加倍（遵守 Retry-After）
+    各域名的上下限可通过 ADAPTIVE_THROTTLE_HOSTS 配置，结束时输出每个域名的
+    请求速率、延迟分位数（最近 LATENCY_WINDOW 个响应）和退避次数，并写入
+    ADAPTIVE_THROTTLE_TELEMETRY_FILE。本中间件排在 HttpCacheMiddleware 之前，
+    缓存命中的响应（flags 含 'cached'）不计数，也不参与调整。
+    """
+
+    BACKOFF_STATUSES = {429, 503}
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool("ADAPTIVE_THROTTLE_ENABLED"):
+            raise NotConfigured
+        self.crawler = crawler
+        self.target_latency = settings.getfloat("ADAPTIVE_THROTTLE_TARGET_LATENCY", 1.0)
+        self.defaults = {
+            "min_concurrency": settings.getint("ADAPTIVE_THROTTLE_MIN_CONCURRENCY", 1),
+            "max_concurrency": settings.getint("ADAPTIVE_THROTTLE_MAX_CONCURRENCY", 8),
+            "start_concurrency": settings.getint("ADAPTIVE_THROTTLE_START_CONCURRENCY", 2),
+            "min_delay": settings.getfloat("ADAPTIVE_THROTTLE_MIN_DELAY", 0.25),
+            "max_delay": settings.getfloat("ADAPTIVE_THROTTLE_MAX_DELAY", 60.0),
+            "start_delay": settings.getfloat("ADAPTIVE_THROTTLE_START_DELAY",
+                                             settings.getfloat("DOWNLOAD_DELAY")),
+        }
+        self.hosts = settings.getdict("ADAPTIVE_THROTTLE_HOSTS")
+        self.telemetry_file = settings.get("ADAPTIVE_THROTTLE_TELEMETRY_FILE")
+        self.domains = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        s = cls(crawler)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def _limits(self, host):
+        limits = dict(self.defaults)
+        # 配置按域名后缀匹配："aaai.org" 同时适用于 ojs.aaai.org
+        for pattern in sorted(self.hosts, key=len):
+            if host == pattern or host.endswith("." + pattern):
+                limits.update(self.hosts[pattern])
+        limits["start_concurrency"] = min(max(limits["start_concurrency"], limits["min_concurrency"]),
+                                          limits["max_concurrency"])
+        limits["start_delay"] = min(max(limits["start_delay"], limits["min_delay"]), limits["max_delay"])
+        return limits
+
+    def _state(self, key):
+        if key not in self.domains:
+            self.domains[key] = _DomainState(self._limits(key))
+        return self.domains[key]
+
+    def _slot(self, request):
+        downloader = self.crawler.engine.downloader
+        return downloader.slots.get(request.meta.get("download_slot"))
+
+    def process_request(self, request, spider=None):
+        downloader = self.crawler.engine.downloader
+        key = downloader.get_slot_key(request)
+        state = self._state(key)
+        if key not in downloader.slots:
+            # 新域名的下载槽按起始并发/延迟创建
+            downloader.per_slot_settings.setdefault(key, {
+                "concurrency": state.limits["start_concurrency"],
+                "delay": state.limits["start_delay"],
+            })
+        return None
+
+    def _backoff(self, key, slot, reason, retry_after=None):
+        state = self._state(key)
+        limits = state.limits
+        slot.concurrency = max(limits["min_concurrency"], slot.concurrency // 2)
+        delay = max(slot.delay * 2, limits["min_delay"], retry_after or 0)
+        slot.delay = min(delay, limits["max_delay"])
+        state.successes = 0
+        state.backoffs.append({"time": round(time.time() - state.first_seen, 3), "reason": reason,
+                               "concurrency": slot.concurrency, "delay": round(slot.delay, 3)})
+        self.crawler.spider.logger.debug("Throttling %s (%s): concurrency %d, delay %.2fs",
+                                         key, reason, slot.concurrency, slot.delay)
+
+    def process_response(self, request, response, spider=None):
+        latency = request.meta.get("download_latency")
+        key = request.meta.get("download_slot")
+        slot = self._slot(request)
+        if "cached" in response.flags or latency is None or key is None or slot is None:
+            # 直接由缓存返回的响应，没有网络请求
+            return response
+
+        state = self._state(key)
+        limits = state.limits
+        state.requests += 1
+        state.responses += 1
+        state.last_seen = time.time()
+        state.latencies.append(latency)
+
+        if response.status in self.BACKOFF_STATUSES:
+            state.throttled += 1
+            retry_after = response.headers.get(b"Retry-After")
+            try:
+                retry_after = float(retry_after) if retry_after else None
+            except ValueError:
+                retry_after = None
+            self._backoff(key, slot, f"HTTP {response.status}", retry_after)
+            return response
+
+        state.latency_ewma = latency if state.latency_ewma is None else 0.8 * state.latency_ewma + 0.2 * latency
+        if state.latency_ewma > 2 * self.target_latency:
+            if slot.concurrency > limits["min_concurrency"]:
+                slot.concurrency -= 1
+                state.successes = 0
+            slot.delay = min(max(slot.delay, limits["min_delay"]) * 1.5, limits["max_delay"])
+        elif state.latency_ewma < self.target_latency:
+            state.successes += 1
+            slot.delay = max(limits["min_delay"], slot.delay * 0.8)
+            # 每轮（并发数个请求）都成功后并发加一
+            if state.successes >= slot.concurrency and slot.concurrency < limits["max_concurrency"]:
+                slot.concurrency += 1
+                state.successes = 0
+        return response
+
+    def process_exception(self, request, exception, spider=None):
+        key = request.meta.get("download_slot")
+        slot = self._slot(request)
+        if key is not None and slot is not None:
+            state = self._state(key)
+            state.requests += 1
+            state.errors += 1
+            self._backoff(key, slot, type(exception).__name__)
+        return None
+
+    def telemetry(self):
+        report = {}
+        downloader = self.crawler.engine.downloader if self.crawler.engine else None
+        for key, state in self.domains.items():
+            latencies = sorted(state.latencies)
+            elapsed = max(state.last_seen - state.first_seen, 1e-9)
+            slot = downloader.slots.get(key) if downloader else None
+            report[key] = {
+                "requests": state.requests,
+                "responses": state.responses,
+                "errors": state.errors,
+                "throttled": state.throttled,
+                "requests_per_second": round(state.responses / elapsed, 3) if state.responses > 1 else None,
+                "latency_p50": _percentile(latencies, 50),
+                "latency_p95": _percentile(latencies, 95),
+                "latency_p99": _percentile(latencies, 99),
+                "backoff_events": len(state.backoffs),
+                "backoffs": state.backoffs,
+                "final_concurrency": slot.concurrency if slot else None,
+                "final_delay": round(slot.delay, 3) if slot else None,
+            }
+        return report
+
+    def spider_closed(self, spider, reason):
+        report = self.telemetry()
+        for key, stats in report.items():
+            spider.logger.info(
+                "Throttle %s: %d responses, %s req/s, latency p50/p95/p99 %s/%s/%s s, "
+                "%d errors, %d throttled, %d backoffs, final concurrency %s, delay %s s",
+                key, stats["responses"], stats["requests_per_second"],
+                *(f"{v:.3f}" if v is not None else "-" for v in
+                  (stats["latency_p50"], stats["latency_p95"], stats["latency_p99"])),
+                stats["errors"], stats["throttled"], stats["backoff_events"],
+                stats["final_concurrency"], stats["final_delay"])
+        if self.telemetry_file:
+            path = self.telemetry_file.format(spider=spider.name)
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"spider": spider.name, "reason": reason, "domains": report}, f, indent=2)
+            spider.logger.info("Throttle telemetry saved to %s", path)
+
+
+class FixtureRecorderMiddleware:
+    """
+    把爬到的页面录制为离线 fixture（格式见 fixtures.py），供 parse_bench 回放：
+    scrapy crawl ndss -s FIXTURES_RECORD=True
+    FIXTURES_DIR 保存目录（每个爬虫一个子目录），FIXTURES_RECORD_LIMIT 每个回调最多录制的页面数。
+    HTTP 缓存命中的响应同样会录制，已有缓存时可以不联网录制。
+    """
+
+    def __init__(self, directory, limit):
+        self.directory = directory
+        self.limit = limit
+        self.spider_dir = None
+        self.records = {}
+        self.counts = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("FIXTURES_RECORD"):
+            raise NotConfigured
+        s = cls(settings.get("FIXTURES_DIR", "fixtures"), settings.getint("FIXTURES_RECORD_LIMIT", 20))
+        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def spider_opened(self, spider):
+        # 追加到已有录制：已录制的页面计入每个回调的数量上限
+        self.spider_dir = os.path.join(self.directory, spider.name)
+        self.records = read_index(self.spider_dir)
+        for record in self.records.values():
+            self.counts[record["callback"]] = self.counts.get(record["callback"], 0) + 1
+
+    def process_response(self, request, response, spider=None):
+        # TextResponse 包括 HtmlResponse 和 DBLP 等接口返回的 JSON
+        if response.status != 200 or not isinstance(response, TextResponse):
+            return response
+        record = fixture_record(request, response)
+        if record["id"] not in self.records:
+            if self.counts.get(record["callback"], 0) >= self.limit:
+                return response
+            self.counts[record["callback"]] = self.counts.get(record["callback"], 0) + 1
+        write_fixture(self.spider_dir, record, response.body)
+        self.records[record["id"]] = record
+        return response
+
+    def spider_closed(self, spider, reason):
+        write_index(self.spider_dir, self.records)
+        spider.logger.info("Recorded %d fixtures to %s", len(self.records), self.spider_dir)
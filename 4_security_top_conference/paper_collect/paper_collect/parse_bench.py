@@ -0,0 +1,373 @@
+# 离线解析基准测试
+#
+# 回放录制的 fixture（见 fixtures.py），对每个爬虫回调测量 items/s、每页 CPU 时间和
+# 内存峰值（tracemalloc，单独一轮，不计入耗时），并核对输出与 golden 是否一致。
+# 对 usenix/ndss 详情页和 AAAI 栏目页，另外比较三种选择器实现提取同样字段的速度：
+#   css    parsel + CSS 选择器
+#   xpath  parsel 解析 + 预编译的 lxml XPath
+#   lxml   直接用 lxml.html 解析响应体 + 预编译 XPath，不经过 parsel
+# 在爬虫项目目录下运行：
+#
+#   python -m paper_collect.parse_bench fixtures --update-golden   # 选择器改动前生成 golden
+#   python -m paper_collect.parse_bench fixtures --repeat 20 --json parse_bench.json
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from itemadapter import ItemAdapter, is_item
+from lxml import etree
+from lxml.html import HTMLParser
+from scrapy.crawler import Crawler
+from scrapy.http import Request
+from scrapy.settings import Settings
+from scrapy.spiderloader import SpiderLoader
+from scrapy.utils.misc import load_object
+
+from paper_collect.fixtures import load_fixtures, read_golden, read_index, replay_response, write_golden
+
+# 回放时的爬虫参数：AAAI 不做相关性预筛选，栏目页的每篇论文都产出请求
+SPIDER_ARGS = {"aaai": {"min_score": "0"}}
+RECORD_HINT = ("record pages first with FixtureRecorderMiddleware, e.g. "
+               "`scrapy crawl ndss -s FIXTURES_RECORD=True -s FIXTURES_DIR={}`")
+
+
+def _cls(name):
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+
+def _xpath(expr):
+    return etree.XPath(expr, smart_strings=False)
+
+
+def _join(texts, sep=" "):
+    return sep.join(text.strip() for text in texts if text and text.strip())
+
+
+# ---- usenix.parse_paper_details：作者、摘要、PDF 链接 ----
+
+USENIX_AUTHORS = _xpath(f'//div[{_cls("field-name-field-paper-people-text")}]//text()')
+USENIX_ABSTRACT = _xpath(f'//div[{_cls("field-name-field-paper-description")}]//text()')
+USENIX_PDF = _xpath(f'//span[{_cls("usenix-schedule-media")} and {_cls("pdf")}]//a/@href')
+USENIX_PDF_FALLBACK = _xpath(f'//div[{_cls("field-name-field-final-paper-pdf")}]//a/@href')
+
+
+def usenix_css(response):
+    pdf_link = (response.css('span.usenix-schedule-media.pdf a::attr(href)').get()
+                or response.css('div.field-name-field-final-paper-pdf a::attr(href)').get())
+    return [{
+        'authors': _join(response.css('div.field-name-field-paper-people-text ::text').getall()),
+        'abstract': _join(response.css('div.field-name-field-paper-description ::text').getall()),
+        'pdf_link': response.urljoin(pdf_link) if pdf_link else None,
+    }]
+
+
+def usenix_tree(response, root):
+    pdf_link = next(iter(USENIX_PDF(root) or USENIX_PDF_FALLBACK(root)), None)
+    return [{
+        'authors': _join(USENIX_AUTHORS(root)),
+        'abstract': _join(USENIX_ABSTRACT(root)),
+        'pdf_link': response.urljoin(pdf_link) if pdf_link else None,
+    }]
+
+
+def usenix_fields(outputs):
+    return [{key: output['item'][key] for key in ('authors', 'abstract', 'pdf_link')}
+            for output in outputs if 'item' in output]
+
+
+# ---- ndss.parse_paper_details：标题、作者、摘要、PDF 链接 ----
+
+NDSS_TITLE = _xpath('//h1[@class="entry-title"]/text()')
+NDSS_AUTHORS = _xpath('//div[@class="paper-data"]/p/strong/text()')
+NDSS_ABSTRACT = _xpath('//div[@class="paper-data"]/p//text()[not(ancestor::strong)]')
+NDSS_PDF = _xpath('//div[@class="paper-buttons"]//a[contains(@href, "paper.pdf")]/@href')
+
+
+def _ndss_record(title, authors, abstract, pdf_link):
+    abstract = " ".join(abstract).strip()
+    return [{
+        'title': title,
+        'authors': authors.strip() if authors else None,
+        'abstract': abstract or None,
+        'pdf_link': pdf_link or None,
+    }]
+
+
+def ndss_css(response):
+    # CSS 无法表达 not(ancestor::strong)：取 <p> 的直接文本和非 <strong> 子元素的文本
+    return _ndss_record(
+        response.css('h1.entry-title::text').get(),
+        response.css('div.paper-data > p > strong::text').get(),
+        response.css('div.paper-data > p::text, div.paper-data > p *:not(strong)::text').getall(),
+        response.css('div.paper-buttons a[href*="paper.pdf"]::attr(href)').get())
+
+
+def ndss_tree(response, root):
+    first = lambda values: values[0] if values else None  # noqa: E731
+    return _ndss_record(first(NDSS_TITLE(root)), first(NDSS_AUTHORS(root)), NDSS_ABSTRACT(root),
+                        first(NDSS_PDF(root)))
+
+
+def ndss_fields(outputs):
+    return [{key: output['item'][key] for key in ('title', 'authors', 'abstract', 'pdf_link')}
+            for output in outputs if 'item' in output]
+
+
+# ---- aaai.parse_section_articles：栏目页每篇论文的标题、链接、作者、PDF ----
+
+AAAI_ITEMS = _xpath(f'//ul[{_cls("cmp_article_list")} and {_cls("articles")}]/li')
+AAAI_SUMMARY = _xpath(f'.//div[{_cls("obj_article_summary")}]')
+AAAI_TITLE = _xpath(f'.//div[{_cls("obj_article_summary")}]//h3[{_cls("title")}]//a/text()')
+AAAI_HREF = _xpath(f'(.//div[{_cls("obj_article_summary")}]//h3[{_cls("title")}]//a)[1]/@href')
+AAAI_AUTHORS = _xpath(f'.//div[{_cls("obj_article_summary")}]//div[{_cls("meta")}]'
+                      f'//div[{_cls("authors")}]//text()')
+AAAI_PDF = _xpath(f'.//div[{_cls("obj_article_summary")}]//ul[{_cls("galleys_links")}]'
+                  f'//a[{_cls("pdf")}]/@href')
+
+
+def _aaai_record(response, title, href, authors, pdf):
+    return {
+        'title': (title or '').strip(),
+        'url': response.urljoin(href) if href else None,
+        'authors': _join(authors, "、"),
+        'pdf_link': response.urljoin(pdf) if pdf else None,
+    }
+
+
+def aaai_css(response):
+    records = []
+    for li in response.css('ul.cmp_article_list.articles > li'):
+        summary = li.css('div.obj_article_summary')
+        if not summary:
+            continue
+        title_el = summary.css('h3.title a')
+        records.append(_aaai_record(response, title_el.css('::text').get(), title_el.attrib.get('href'),
+                                    summary.css('div.meta div.authors ::text').getall(),
+                                    summary.css('ul.galleys_links a.pdf::attr(href)').get()))
+    return records
+
+
+def aaai_tree(response, root):
+    records = []
+    for li in AAAI_ITEMS(root):
+        if not AAAI_SUMMARY(li):
+            continue
+        title, href, pdf = AAAI_TITLE(li), AAAI_HREF(li), AAAI_PDF(li)
+        records.append(_aaai_record(response, title[0] if title else None, href[0] if href else None,
+                                    AAAI_AUTHORS(li), pdf[0] if pdf else None))
+    return records
+
+
+def aaai_fields(outputs):
+    records = []
+    for output in outputs:
+        item = output['meta']['item'] if 'request' in output else output['item']
+        records.append({'title': item['paper_title'], 'url': item['paper_url'],
+                        'authors': item['authors'], 'pdf_link': item['pdf_url']})
+    return records
+
+
+# (爬虫, 回调) -> (CSS 实现, 预编译 XPath 实现, 从 golden 输出取对应字段)
+STRATEGIES = {
+    ("usenix", "parse_paper_details"): (usenix_css, usenix_tree, usenix_fields),
+    ("ndss", "parse_paper_details"): (ndss_css, ndss_tree, ndss_fields),
+    ("aaai", "parse_section_articles"): (aaai_css, aaai_tree, aaai_fields),
+}
+
+
+def _parsel_root(response):
+    return response.selector.root
+
+
+def _lxml_root(response):
+    return etree.fromstring(response.body, parser=HTMLParser(recover=True, encoding=response.encoding),
+                            base_url=response.url)
+
+
+def strategies_for(spider_name, callback):
+    """{策略名: fn(response) -> 输出列表}，'spider' 即爬虫回调本身"""
+    strategies = {"spider": lambda response: list(
+        response.request.callback(response, **response.request.cb_kwargs) or ())}
+    if (spider_name, callback) in STRATEGIES:
+        css, tree, _ = STRATEGIES[spider_name, callback]
+        strategies["css"] = css
+        strategies["xpath"] = lambda response: tree(response, _parsel_root(response))
+        strategies["lxml"] = lambda response: tree(response, _lxml_root(response))
+    return strategies
+
+
+def normalize_outputs(results):
+    """回调产出的请求和 item 转为可比较、可存为 JSON 的 dict"""
+    outputs = []
+    for result in results or ():
+        if isinstance(result, Request):
+            output = {'request': result.url, 'callback': getattr(result.callback, '__name__', None),
+                      'priority': result.priority, 'meta': {key: result.meta[key] for key in sorted(result.meta)}}
+            # 只有用 cb_kwargs 传参的爬虫（如 css_papers）才记录，已有的 golden 不变
+            if result.cb_kwargs:
+                output['cb_kwargs'] = {key: result.cb_kwargs[key] for key in sorted(result.cb_kwargs)}
+            outputs.append(output)
+        elif is_item(result):
+            outputs.append({'item': ItemAdapter(result).asdict()})
+    return json.loads(json.dumps(outputs, ensure_ascii=False, default=str))
+
+
+def make_spider(name, settings):
+    spidercls = SpiderLoader.from_settings(settings).load(name)
+    # 回放不启动引擎，只需要回调用到的 settings 和 stats
+    crawler = Crawler(spidercls, settings)
+    crawler.stats = load_object(crawler.settings["STATS_CLASS"])(crawler)
+    spider = spidercls.from_crawler(crawler, **SPIDER_ARGS.get(name, {}))
+    crawler.spider = spider
+    return spider
+
+
+def _measure(strategy, pages, spider, repeat):
+    """对一组页面运行 repeat 轮，返回耗时、CPU 时间和输出条数"""
+    outputs = 0
+    wall, cpu = 0.0, 0.0
+    for _ in range(repeat):
+        # 每轮重新构造响应，parsel 的解析结果不跨轮缓存
+        responses = [replay_response(record, body, spider) for record, body in pages]
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        for response in responses:
+            outputs += len(strategy(response))
+        wall += time.perf_counter() - wall_start
+        cpu += time.process_time() - cpu_start
+    return wall, cpu, outputs
+
+
+def _peak_memory(strategy, pages, spider):
+    """每页处理时 Python 分配内存的峰值（KB）"""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for record, body in pages:
+            response = replay_response(record, body, spider)
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            strategy(response)
+            peaks.append((tracemalloc.get_traced_memory()[1] - before) / 1024)
+    finally:
+        tracemalloc.stop()
+    return max(peaks), sum(peaks) / len(peaks)
+
+
+def check_golden(spider, pages, golden):
+    """({策略名: 输出与 golden 不一致的 fixture id}, 缺少 golden 的页数)"""
+    mismatches, missing = {}, 0
+    for record, body in pages:
+        expected = golden.get(record["id"])
+        if expected is None:
+            missing += 1
+            continue
+        key = (spider.name, record["callback"])
+        for name, strategy in strategies_for(*key).items():
+            actual = strategy(replay_response(record, body, spider))
+            if name == "spider":
+                actual, wanted = normalize_outputs(actual), expected
+            else:
+                wanted = STRATEGIES[key][2](expected)
+            if actual != wanted:
+                mismatches.setdefault(name, []).append(record["id"])
+    return mismatches, missing
+
+
+def run_spider(directory, name, settings, repeat, update_golden):
+    pages = load_fixtures(directory)
+    spider = make_spider(name, settings)
+    golden = read_golden(directory)
+    if update_golden:
+        golden = {}
+        for record, body in pages:
+            response = replay_response(record, body, spider)
+            golden[record["id"]] = normalize_outputs(response.request.callback(response))
+        write_golden(directory, golden)
+        print(f"{name}: golden outputs of {len(golden)} pages saved")
+
+    by_callback = {}
+    for record, body in pages:
+        by_callback.setdefault(record["callback"], []).append((record, body))
+
+    results = []
+    for callback, callback_pages in by_callback.items():
+        mismatches, missing = check_golden(spider, callback_pages, golden)
+        for strategy_name, strategy in strategies_for(name, callback).items():
+            strategy(replay_response(*callback_pages[0], spider))  # 预热（选择器翻译缓存等）
+            wall, cpu, outputs = _measure(strategy, callback_pages, spider, repeat)
+            peak, mean_peak = _peak_memory(strategy, callback_pages, spider)
+            calls = len(callback_pages) * repeat
+            results.append({
+                "spider": name,
+                "callback": callback,
+                "strategy": strategy_name,
+                "pages": len(callback_pages),
+                "items_per_page": round(outputs / calls, 2),
+                "items_per_second": round(outputs / wall, 1) if wall else None,
+                "pages_per_second": round(calls / wall, 1) if wall else None,
+                "cpu_ms_per_page": round(cpu / calls * 1000, 3),
+                "peak_kb": round(peak, 1),
+                "mean_peak_kb": round(mean_peak, 1),
+                "golden": ("missing" if missing == len(callback_pages) else
+                           "mismatch" if strategy_name in mismatches else "ok"),
+                "mismatched": mismatches.get(strategy_name, []),
+            })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark spider callbacks on recorded pages, offline.")
+    parser.add_argument("fixtures", nargs="?", default="fixtures", help="FIXTURES_DIR of the recording")
+    parser.add_argument("--spider", action="append", help="only these spiders (default: all recorded)")
+    parser.add_argument("--repeat", type=int, default=5, help="passes over the pages per measurement")
+    parser.add_argument("--update-golden", action="store_true",
+                        help="save the current callback outputs as the expected outputs")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    # 没有录制过 fixture 时给出提示，而不是 FileNotFoundError
+    if not os.path.isdir(args.fixtures):
+        sys.exit(f"Error: no fixtures directory {args.fixtures}; {RECORD_HINT.format(args.fixtures)}")
+    names = args.spider or sorted(entry for entry in os.listdir(args.fixtures)
+                                  if os.path.isdir(os.path.join(args.fixtures, entry)))
+    empty = [name for name in names if not read_index(os.path.join(args.fixtures, name))]
+    if not names or empty:
+        sys.exit(f"Error: no recorded pages in {args.fixtures} for {', '.join(empty) or 'any spider'}; "
+                 f"{RECORD_HINT.format(args.fixtures)}")
+
+    settings = Settings()
+    settings.setmodule("paper_collect.settings", priority="project")
+    # 回放不需要缓存、限速和录制；日志只保留警告
+    settings.set("HTTPCACHE_ENABLED", False)
+    settings.set("FIXTURES_RECORD", False)
+    settings.set("LOG_LEVEL", "WARNING")
+
+    results = []
+    for name in names:
+        results += run_spider(os.path.join(args.fixtures, name), name, settings, args.repeat,
+                              args.update_golden)
+
+    print(f"\n{'spider.callback':<36}{'strategy':<9}{'pages':>6}{'items/s':>10}{'pages/s':>10}"
+          f"{'cpu ms':>9}{'peak KB':>9}  golden")
+    for r in results:
+        print(f"{r['spider'] + '.' + r['callback']:<36}{r['strategy']:<9}{r['pages']:>6}"
+              f"{r['items_per_second'] or 0:>10.1f}{r['pages_per_second'] or 0:>10.1f}"
+              f"{r['cpu_ms_per_page']:>9.3f}{r['peak_kb']:>9.1f}  {r['golden']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Results saved to {args.json}")
+    if any(r["golden"] == "mismatch" for r in results):
+        for r in results:
+            if r["mismatched"]:
+                print(f"{r['spider']}.{r['callback']} [{r['strategy']}] differs from golden on: "
+                      f"{', '.join(r['mismatched'])}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
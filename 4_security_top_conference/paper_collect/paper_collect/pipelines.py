@@ -3,11 +3,203 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+import hashlib
+import json
+import os
+import sqlite3
+import time
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.utils.project import data_path
+
+from paper_collect.items import PaperItem
 
 
 class PaperCollectPipeline:
-    def process_item(self, item, spider):
+    """
+    丢弃没有标题的论文。导出的 item 原样保留各爬虫的字段名和类型（AAAI 的
+    paper_title/pdf_url、authors 列表等）：datas/*.json 和 paper_analysis.sources
+    的适配器都按这些字段读取。统一字段的 PaperItem 只用于论文库（SQLitePipeline）。
+    """
+
+    def __init__(self, crawler=None):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_item(self, item, spider=None):
+        if isinstance(item, PaperItem):
+            title = item.title
+        else:
+            adapter = ItemAdapter(item)
+            title = adapter.get('title') or adapter.get('paper_title')
+        if not str(title or '').strip():
+            raise DropItem("Paper without a title")
         return item
+
+
+# 用于识别同一篇论文的字段（按顺序取第一个非空字段）
+PAPER_KEY_FIELDS = ('paper_id', 'paper_url', 'url', 'pdf_link', 'pdf_url', 'title', 'paper_title')
+
+
+class SeenPapersPipeline:
+    """
+    跨次运行的论文指纹库（SQLite）：每篇论文记录一次内容指纹，
+    重新爬取时只输出新增或内容有变化的论文，未变化的论文直接丢弃。
+
+    SEEN_PAPERS_ENABLED = False 关闭（需要完整导出时：-s SEEN_PAPERS_ENABLED=False）
+    SEEN_PAPERS_DB 指纹库路径（默认 .scrapy/seen_papers.sqlite3）
+    """
+
+    def __init__(self, crawler, path, commit_every=100):
+        self.crawler = crawler
+        self.path = path
+        self.stats = crawler.stats
+        self.commit_every = commit_every
+        self.conn = None
+        self._pending = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('SEEN_PAPERS_ENABLED'):
+            raise NotConfigured
+        path = crawler.settings.get('SEEN_PAPERS_DB') or os.path.join(data_path('', createdir=True),
+                                                                       'seen_papers.sqlite3')
+        return cls(crawler, path)
+
+    def open_spider(self, spider=None):
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen ("
+            " spider TEXT NOT NULL, key TEXT NOT NULL, fingerprint TEXT NOT NULL,"
+            " first_seen REAL NOT NULL, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (spider, key))")
+
+    @staticmethod
+    def paper_key(adapter):
+        for field in PAPER_KEY_FIELDS:
+            value = adapter.get(field)
+            if value:
+                return str(value).strip()
+        return None
+
+    @staticmethod
+    def fingerprint(adapter):
+        content = json.dumps(adapter.asdict(), sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    def process_item(self, item, spider=None):
+        spider_name = self.crawler.spider.name
+        adapter = ItemAdapter(item)
+        key = self.paper_key(adapter)
+        if key is None:
+            return item
+        fingerprint = self.fingerprint(adapter)
+        row = self.conn.execute("SELECT fingerprint FROM seen WHERE spider = ? AND key = ?",
+                                (spider_name, key)).fetchone()
+        if row is not None and row[0] == fingerprint:
+            self.stats.inc_value('seen_papers/unchanged')
+            raise DropItem(f"Unchanged paper: {key}", log_level='DEBUG')
+
+        now = time.time()
+        self.conn.execute(
+            "INSERT INTO seen (spider, key, fingerprint, first_seen, updated_at) VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT (spider, key) DO UPDATE SET fingerprint = excluded.fingerprint,"
+            " updated_at = excluded.updated_at",
+            (spider_name, key, fingerprint, now, now))
+        self.stats.inc_value('seen_papers/new' if row is None else 'seen_papers/changed')
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.conn.commit()
+            self._pending = 0
+        return item
+
+    def close_spider(self, spider=None):
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+
+# PaperItem 字段 -> papers 表的列（顺序即列顺序）
+PAPER_COLUMNS = ('paper_id', 'title', 'authors', 'abstract', 'pdf_link', 'url', 'doi', 'year',
+                 'source', 'section_url', 'relevance_score')
+
+
+class SQLitePipeline:
+    """
+    把论文流式写入 SQLite（表 papers，主键为稳定的 paper_id）。
+    论文先在内存中缓冲，每 PAPERS_DB_BATCH_SIZE 条在一个事务里 executemany 批量 upsert，
+    爬虫结束时写入剩余部分。重复抓到的论文只更新非空字段，已有摘要不会被空值覆盖。
+
+    PAPERS_DB_ENABLED = False 关闭
+    PAPERS_DB 数据库路径（默认 .scrapy/papers.sqlite3）
+    PAPERS_DB_BATCH_SIZE 每批写入条数（默认 500）
+
+    查询示例：sqlite3 .scrapy/papers.sqlite3 "SELECT title FROM papers WHERE source = 'usenix'"
+    """
+
+    def __init__(self, crawler, path, batch_size=500):
+        self.crawler = crawler
+        self.path = path
+        self.stats = crawler.stats
+        self.batch_size = max(1, batch_size)
+        self.conn = None
+        self._buffer = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('PAPERS_DB_ENABLED'):
+            raise NotConfigured
+        path = crawler.settings.get('PAPERS_DB') or os.path.join(data_path('', createdir=True),
+                                                                  'papers.sqlite3')
+        return cls(crawler, path, crawler.settings.getint('PAPERS_DB_BATCH_SIZE', 500))
+
+    def open_spider(self, spider=None):
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS papers ("
+            " paper_id TEXT PRIMARY KEY, title TEXT NOT NULL, authors TEXT, abstract TEXT,"
+            " pdf_link TEXT, url TEXT, doi TEXT, year TEXT, source TEXT, section_url TEXT,"
+            " relevance_score REAL, first_seen REAL NOT NULL, updated_at REAL NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS papers_source_year ON papers (source, year)")
+        self.conn.commit()
+
+    def process_item(self, item, spider=None):
+        # 只在写库时统一字段，导出的 item 不变
+        paper = item if isinstance(item, PaperItem) else PaperItem.from_dict(ItemAdapter(item).asdict())
+        if not paper.source:
+            paper.source = self.crawler.spider.name
+        self._buffer.append(tuple(getattr(paper, column) for column in PAPER_COLUMNS))
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+        return item
+
+    def flush(self):
+        if not self._buffer:
+            return
+        now = time.time()
+        updates = ", ".join(f"{column} = COALESCE(excluded.{column}, {column})"
+                            for column in PAPER_COLUMNS[1:])
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO papers ({', '.join(PAPER_COLUMNS)}, first_seen, updated_at)"
+                f" VALUES ({', '.join('?' * (len(PAPER_COLUMNS) + 2))})"
+                f" ON CONFLICT (paper_id) DO UPDATE SET {updates}, updated_at = excluded.updated_at",
+                [row + (now, now) for row in self._buffer])
+        self.stats.inc_value('papers_db/written', len(self._buffer))
+        self.stats.inc_value('papers_db/batches')
+        self._buffer = []
+
+    def close_spider(self, spider=None):
+        if self.conn is not None:
+            self.flush()
+            self.conn.close()
+            self.conn = None
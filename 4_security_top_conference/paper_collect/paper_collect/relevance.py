@@ -0,0 +1,48 @@
+# 安全相关性预筛选
+#
+# 在请求论文详情页之前，用关键词正则对列表页上的标题（和所在栏目名）打分，
+# 只为分数达到阈值的论文抓取详情页。所有关键词合并为一个正则，一次扫描完成匹配。
+
+import re
+
+# 关键词（正则片段，从词首匹配）-> 权重
+SECURITY_TERMS = {
+    r"secur": 3, r"privac": 3, r"private": 2, r"(?<!generative )adversar": 3, r"attack": 3,
+    r"backdoor": 3, r"jailbreak": 3, r"poison": 3, r"malware": 3, r"malicious": 3, r"intrusion": 3,
+    r"vulnerab": 3, r"exploit(?!ation)": 1, r"fraud": 3, r"phishing": 3, r"forensic": 3,
+    r"watermark": 3, r"deepfake": 3, r"encrypt": 3, r"crypt": 3, r"steganogra": 3,
+    r"membership inference": 3, r"model (?:stealing|extraction)": 3, r"prompt injection": 3,
+    r"red[- ]?team": 3, r"side[- ]channel": 3, r"botnet": 3, r"blockchain": 2,
+    r"smart contract": 2, r"captcha": 3, r"spoof": 3, r"threat": 2, r"defen[cs]": 2,
+    r"authenticat": 2, r"copyright": 2, r"unlearn": 2, r"trustworth": 2, r"safe": 2,
+    r"harmful": 2, r"toxic": 1, r"evasion": 2, r"tamper": 2, r"fake": 2, r"misinformation": 2,
+    r"anomal": 1, r"robust": 1, r"perturbation": 1, r"federated": 1, r"differential(?:ly)? privat": 1,
+    r"certif(?:ied|iabl)": 1, r"fairness": 1, r"audit": 1, r"detect\w* (?:ai|machine)[- ]generated": 2,
+}
+
+# 栏目名中出现这些词时额外加分（如 "AAAI-25 Special Track on AI Alignment"）
+SECTION_TERMS = {
+    r"secur": 2, r"privac": 2, r"safe": 2, r"alignment": 1, r"ethic": 1,
+}
+
+
+def _compile(terms):
+    pattern = "\\b(?:" + "|".join(f"(?P<t{i}>{term})" for i, term in enumerate(terms)) + ")"
+    return re.compile(pattern, re.IGNORECASE), list(terms.values())
+
+
+class RelevanceScorer:
+    """标题与栏目名的安全相关性打分：每个关键词按权重计一次分。"""
+
+    def __init__(self, terms=SECURITY_TERMS, section_terms=SECTION_TERMS):
+        self._title_re, self._title_weights = _compile(terms)
+        self._section_re, self._section_weights = _compile(section_terms)
+
+    @staticmethod
+    def _score(regex, weights, text):
+        matched = {int(m.lastgroup[1:]) for m in regex.finditer(text or "")}
+        return sum(weights[i] for i in matched)
+
+    def score(self, title, section=""):
+        return (self._score(self._title_re, self._title_weights, title)
+                + self._score(self._section_re, self._section_weights, section))
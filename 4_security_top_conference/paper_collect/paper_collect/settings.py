@@ -22,7 +22,7 @@ ROBOTSTXT_OBEY = True
 # 让爬虫更像一个真实用户
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 
-# 设置请求延迟，避免频繁请求
+# 设置请求延迟，避免频繁请求（启用 AdaptiveThrottleMiddleware 时改为按域名自动调整）
 DOWNLOAD_DELAY = 2
 
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
@@ -56,21 +56,64 @@ CONCURRENT_REQUESTS = 16
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "paper_collect.middlewares.PaperCollectDownloaderMiddleware": 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    # "paper_collect.middlewares.PaperCollectDownloaderMiddleware": 543,
+    # 优先级高于 RetryMiddleware(550)，以便在重试前看到 429/503 和网络错误
+    "paper_collect.middlewares.AdaptiveThrottleMiddleware": 600,
+    # 在 HttpCacheMiddleware(900) 之后，缓存命中的页面也能录制
+    "paper_collect.middlewares.FixtureRecorderMiddleware": 950,
+}
+
+# 按域名自适应并发与延迟：延迟低于目标值时加并发、缩短延迟，429/503/网络错误时退避
+ADAPTIVE_THROTTLE_ENABLED = True
+ADAPTIVE_THROTTLE_TARGET_LATENCY = 1.0
+ADAPTIVE_THROTTLE_START_CONCURRENCY = 2
+ADAPTIVE_THROTTLE_START_DELAY = 0.5
+ADAPTIVE_THROTTLE_MIN_CONCURRENCY = 1
+ADAPTIVE_THROTTLE_MAX_CONCURRENCY = 8
+ADAPTIVE_THROTTLE_MIN_DELAY = 0.25
+ADAPTIVE_THROTTLE_MAX_DELAY = 60
+# 单个域名的上下限（按域名后缀匹配），未配置的项使用上面的默认值
+ADAPTIVE_THROTTLE_HOSTS = {
+    "dblp.org": {"max_concurrency": 2, "min_delay": 1.0},
+    "dl.acm.org": {"max_concurrency": 2, "min_delay": 1.0},
+    "aaai.org": {"max_concurrency": 4},
+    "usenix.org": {"max_concurrency": 4},
+}
+# 结束时写出每个域名的请求速率、延迟分位数和退避记录（{spider} 替换为爬虫名）
+ADAPTIVE_THROTTLE_TELEMETRY_FILE = ".scrapy/telemetry/{spider}_throttle.json"
+
+# 录制离线 fixture（列表页、详情页），供 python -m paper_collect.parse_bench 回放测速
+# 使用 -s FIXTURES_RECORD=True 开启；每个回调最多录制 FIXTURES_RECORD_LIMIT 个页面
+FIXTURES_RECORD = False
+FIXTURES_DIR = "fixtures"
+FIXTURES_RECORD_LIMIT = 20
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+EXTENSIONS = {
+    # "scrapy.extensions.telnet.TelnetConsole": None,
+    "paper_collect.extensions.CrawlCacheReport": 500,
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-#ITEM_PIPELINES = {
-#    "paper_collect.pipelines.PaperCollectPipeline": 300,
-#}
+ITEM_PIPELINES = {
+    # 丢弃无标题论文；导出保持各爬虫原有字段，统一字段只用于论文库
+    "paper_collect.pipelines.PaperCollectPipeline": 300,
+    "paper_collect.pipelines.SQLitePipeline": 800,
+    "paper_collect.pipelines.SeenPapersPipeline": 900,
+}
+
+# 论文库：按 paper_id 批量 upsert 到 SQLite，可直接用 SQL 查询，不必加载整个 JSON
+PAPERS_DB_ENABLED = True
+#PAPERS_DB = ".scrapy/papers.sqlite3"
+PAPERS_DB_BATCH_SIZE = 500
+
+# 论文指纹库：重新爬取时只输出新增或内容有变化的论文
+# 需要完整导出时使用 -s SEEN_PAPERS_ENABLED=False
+SEEN_PAPERS_ENABLED = True
+#SEEN_PAPERS_DB = ".scrapy/seen_papers.sqlite3"
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -87,11 +130,21 @@ CONCURRENT_REQUESTS = 16
 
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
-#HTTPCACHE_ENABLED = True
-#HTTPCACHE_EXPIRATION_SECS = 0
-#HTTPCACHE_DIR = "httpcache"
-#HTTPCACHE_IGNORE_HTTP_CODES = []
-#HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+# AAAI 爬虫的安全相关性预筛选：标题和栏目名的关键词得分低于阈值的论文
+# skip: 不请求详情页；deprioritize: 仍然请求，但排在高相关论文之后
+AAAI_RELEVANCE_THRESHOLD = 2
+AAAI_RELEVANCE_MODE = "skip"
+
+# 持久化 HTTP 缓存（.scrapy/httpcache）：按 RFC2616 规则判断缓存是否新鲜，
+# 过期页面用 ETag / Last-Modified 发送条件请求，未变化时服务器返回 304，不再重新下载
+HTTPCACHE_ENABLED = True
+HTTPCACHE_POLICY = "scrapy.extensions.httpcache.RFC2616Policy"
+# 没有缓存头的页面也保存，下次通过条件请求重新验证
+HTTPCACHE_ALWAYS_STORE = True
+HTTPCACHE_EXPIRATION_SECS = 0
+HTTPCACHE_DIR = "httpcache"
+HTTPCACHE_IGNORE_HTTP_CODES = [429, 500, 502, 503, 504]
+HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
 
 # Set settings whose default value is deprecated to a future-proof value
 TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
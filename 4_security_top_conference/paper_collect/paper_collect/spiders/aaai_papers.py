@@ -1,5 +1,7 @@
 import scrapy
 
+from paper_collect.relevance import RelevanceScorer
+
 class AAAISpider(scrapy.Spider):
     name = "aaai"
     year = "2025"
@@ -16,6 +18,19 @@ class AAAISpider(scrapy.Spider):
         'Accept-Encoding': 'gzip, deflate, br',
     }
 
+    # 安全相关性预筛选：标题+栏目名得分低于阈值的论文不请求详情页
+    # 阈值与处理方式见 settings.py 的 AAAI_RELEVANCE_*，也可用 -a min_score=0 关闭
+    scorer = RelevanceScorer()
+
+    def __init__(self, min_score=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.min_score = min_score
+
+    async def start(self):
+        # Scrapy >= 2.13 调用 start()，旧版本调用 start_requests()
+        for request in self.start_requests():
+            yield request
+
     def start_requests(self):
         urls = ["https://aaai.org/proceeding/aaai-39-2025/"]
         for url in urls:
@@ -54,6 +69,11 @@ class AAAISpider(scrapy.Spider):
             self.logger.warning("No articles on %s", response.url)
             return
 
+        threshold = float(self.min_score if self.min_score is not None
+                          else self.settings.getfloat('AAAI_RELEVANCE_THRESHOLD', 0))
+        deprioritize = self.settings.get('AAAI_RELEVANCE_MODE', 'skip') == 'deprioritize'
+        stats = self.crawler.stats
+
         for li in list_items:
             summary = li.css('div.obj_article_summary')
             if not summary:
@@ -71,6 +91,21 @@ class AAAISpider(scrapy.Spider):
             pdf_relative_url = summary.css('ul.galleys_links a.pdf::attr(href)').get()
             pdf_url = response.urljoin(pdf_relative_url) if pdf_relative_url else None
 
+            # 论文所在栏目名，如 "AAAI Technical Track on Safe, Robust and Responsible AI"
+            section = li.xpath('ancestor::div[contains(concat(" ", @class, " "), " section ")][1]'
+                               '/h2//text()').get(default='').strip()
+            score = self.scorer.score(title, section)
+            priority = 0
+            if score < threshold:
+                if not deprioritize:
+                    stats.inc_value('aaai/relevance/skipped')
+                    continue
+                # 低相关论文仍然抓取，但排在所有高相关论文之后
+                stats.inc_value('aaai/relevance/deprioritized')
+                priority = -1
+            else:
+                stats.inc_value('aaai/relevance/kept')
+
             item = {
                 'paper_title': title,
                 'paper_url': paper_page_url,
@@ -78,7 +113,8 @@ class AAAISpider(scrapy.Spider):
                 'pdf_url': pdf_url,
                 'source_section_url': response.url,
                 'year': self.year,
-                'source': 'aaai'
+                'source': 'aaai',
+                'relevance_score': score
             }
 
             if paper_page_url:
@@ -90,7 +126,8 @@ class AAAISpider(scrapy.Spider):
                     paper_page_url,
                     callback=self.parse_paper_page,
                     meta={'item': item}, # Pass the partially filled item
-                    headers=paper_detail_headers
+                    headers=paper_detail_headers,
+                    priority=priority
                 )
             else:
                 self.logger.warning(f"No paper_url found for title: {title} on {response.url}")
@@ -114,4 +151,12 @@ class AAAISpider(scrapy.Spider):
         item['abstract'] = abstract if abstract else None # Store None if abstract is still empty
 
         self.logger.info(f"Extracted abstract for: {item['paper_title']}")
-        yield item
\ No newline at end of file
+        yield item
+
+    def closed(self, reason):
+        stats = self.crawler.stats
+        self.logger.info(
+            "Relevance prefilter: %d papers kept, %d skipped, %d deprioritized",
+            stats.get_value('aaai/relevance/kept', 0),
+            stats.get_value('aaai/relevance/skipped', 0),
+            stats.get_value('aaai/relevance/deprioritized', 0))
\ No newline at end of file
@@ -1,10 +1,103 @@
+import html
+import re
+from urllib.parse import urlencode
+
 import scrapy
 
 
 class CssPapersSpider(scrapy.Spider):
+    """
+    通过 DBLP 检索 API 分页获取某届会议的论文列表，再并发抓取 ACM 页面上的摘要。
+
+    参数（-a）：
+        venue      DBLP 会议标识，默认 ccs
+        year       年份，默认 2023
+        toc        直接指定 DBLP 目录键，默认 db/conf/{venue}/{venue}{year}.bht
+        page_size  每页条数（DBLP 上限 1000），默认 200
+
+    示例：scrapy crawl css_papers -a year=2024 -o ccs2024_papers.json
+    """
     name = "css_papers"
     allowed_domains = ["dblp.org", "dl.acm.org"]
-    start_urls = ["https://dblp.org/search/publ/api?q=toc%3Adb/conf/ccs/ccs2023.bht%3A&h=1000&format=json"]
+    api_url = "https://dblp.org/search/publ/api"
+    abstract_url = "https://dl.acm.org/doi/{doi}"
+    max_page_size = 1000
+
+    # DBLP 作者同名消歧编号，如 "Song Bian 0001"
+    _disambiguation_re = re.compile(r"\s+\d{4}$")
+
+    def __init__(self, venue="ccs", year="2023", toc=None, page_size=200, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.venue = venue
+        self.year = str(year)
+        self.toc = toc or f"db/conf/{venue}/{venue}{self.year}.bht"
+        self.page_size = max(1, min(int(page_size), self.max_page_size))
+
+    def page_url(self, offset):
+        query = {"q": f"toc:{self.toc}:", "h": self.page_size, "f": offset, "format": "json"}
+        return f"{self.api_url}?{urlencode(query)}"
+
+    async def start(self):
+        for request in self.start_requests():
+            yield request
+
+    def start_requests(self):
+        # Scrapy < 2.13 调用 start_requests()，新版本调用 start()
+        yield scrapy.Request(self.page_url(0), callback=self.parse, cb_kwargs={"offset": 0})
+
+    def parse(self, response, offset=0):
+        hits = response.json().get("result", {}).get("hits", {})
+        total = int(hits.get("@total", 0))
+        page = hits.get("hit", [])
+        self.logger.info(f"DBLP {self.toc}: papers {offset}-{offset + len(page)} of {total}")
+
+        # 先发出下一页请求，再处理本页，分页与摘要抓取并行进行
+        next_offset = offset + len(page)
+        if page and next_offset < total:
+            yield scrapy.Request(self.page_url(next_offset), callback=self.parse,
+                                 cb_kwargs={"offset": next_offset})
+
+        for hit in page:
+            info = hit.get("info", {})
+            if info.get("type") == "Editorship":  # 会议论文集本身，不是论文
+                continue
+            item = self.parse_hit(info)
+            doi = info.get("doi")
+            if doi:
+                yield scrapy.Request(self.abstract_url.format(doi=doi), callback=self.parse_abstract,
+                                     errback=self.abstract_failed, cb_kwargs={"item": item})
+            else:
+                yield item
+
+    def parse_hit(self, info):
+        authors = info.get("authors", {}).get("author", [])
+        if isinstance(authors, dict):  # 只有一位作者时不是列表
+            authors = [authors]
+        names = [self._disambiguation_re.sub("", html.unescape(a.get("text", ""))) for a in authors]
+        doi = info.get("doi")
+        return {
+            # DBLP 标题以句点结尾，与 USENIX/NDSS 保持一致去掉
+            "title": html.unescape(info.get("title", "")).strip().removesuffix("."),
+            "authors": ", ".join(n for n in names if n),
+            "abstract": None,
+            "pdf_link": f"https://dl.acm.org/doi/pdf/{doi}" if doi else info.get("ee"),
+            "doi": doi,
+            "year": info.get("year", self.year),
+            "source": self.venue,
+        }
+
+    def parse_abstract(self, response, item):
+        # ACM 新版页面摘要在 section#abstract 中，旧版在 div.abstractSection 中
+        parts = response.css("section#abstract div[role=paragraph] ::text").getall()
+        if not parts:
+            parts = response.css("div.abstractSection ::text").getall()
+        # 文本节点内部也可能有换行和缩进，统一合并为单个空格
+        abstract = " ".join(" ".join(parts).split())
+        item["abstract"] = abstract or None
+        yield item
 
-    def parse(self, response):
-        pass
+    def abstract_failed(self, failure):
+        # 摘要页抓取失败时仍然输出论文，摘要留空
+        item = failure.request.cb_kwargs["item"]
+        self.logger.warning(f"No abstract for {item['title']}: {failure.value!r}")
+        yield item
@@ -0,0 +1,4 @@
+# Shared helpers for labeling and analysing the collected papers.
+#
+# The labeling scripts (web_of_science/llm_labels.py and
+# 4_security_top_conference/llm4_labels.py) import from this package.
@@ -0,0 +1,214 @@
+# Label and keyword analytics over the labeled outputs.
+#
+# Every *_keywords.json file is reduced once to a partial aggregate (paper
+# counts per venue/year/theme_label and keyword counts per venue/year),
+# cached by file content hash. The summary is the sum of the partials, so
+# adding one conference's output only aggregates that file; when no input
+# changed, the cached summary and report are reused as they are. Papers
+# without a year (the *_keywords_v2 outputs) take --year; those still
+# without one are counted, but left out of the per-year shares and trends.
+#
+#   python -m paper_analysis.analytics datas/*_keywords*.json --labels web_of_science/labels.txt --year 2024
+#   python -m paper_analysis.analytics datas/*_keywords*.json --labels web_of_science/labels.txt \
+#       -o datas/analytics_summary.json --report datas/analytics_report.md --top 30
+
+import argparse
+import hashlib
+import json
+import os
+import re
+
+import pandas as pd
+
+from .columnar import (UNKNOWN_YEAR, covered_by_full_output, input_year, paper_rows, parse_year_options,
+                       venue_and_year)
+from .parsing import keyword_terms
+from .taxonomy import Taxonomy
+from .wos import file_hash
+
+UNMATCHED_DOMAIN = "(未匹配)"
+# Bump when the partial or summary format changes so caches are not reused
+FORMAT_VERSION = 2
+
+_LATIN_RE = re.compile(r'[a-z]')
+
+
+def partial_aggregate(path, taxonomy, default_year=None):
+    """
+    Counts of one labeled file: {'labels': [...records], 'keywords': [...records]}.
+    Papers without a year get `default_year`, else the year in the file name.
+    """
+    venue, file_year = venue_and_year(path)
+    rows = pd.DataFrame(paper_rows(path, default_year=default_year or file_year),
+                        columns=['year', 'theme_label', 'keywords'])
+    rows['venue'] = venue
+    rows['theme_label'] = rows['theme_label'].fillna('').str.strip()
+    domains = {label: taxonomy.domain_of_label(label) for label in rows['theme_label'].unique()}
+    rows['domain'] = rows['theme_label'].map(
+        {label: domain.name if domain else UNMATCHED_DOMAIN for label, domain in domains.items()})
+    labels = rows.groupby(['venue', 'year', 'domain', 'theme_label']).size().rename('papers')
+
+    # One English term per keyword line (the Chinese translation would count it twice)
+    rows['term'] = rows['keywords'].map(
+        lambda text: [term for term in keyword_terms(text) if _LATIN_RE.search(term)])
+    terms = rows[['venue', 'year', 'term']].explode('term').dropna()
+    keywords = terms.groupby(['venue', 'year', 'term']).size().rename('papers')
+    return {'labels': labels.reset_index().to_dict('records'),
+            'keywords': keywords.reset_index().to_dict('records')}
+
+
+def load_partial(path, taxonomy, labels_digest, cache_dir, digest=None, default_year=None):
+    """
+    The partial aggregate of `path` (papers without a year get `default_year`),
+    from the cache when the file, labels and year are unchanged.
+    """
+    digest = digest or file_hash(path)
+    # Venue and year come from the file name, so a renamed copy is a different partial
+    venue, file_year = venue_and_year(path)
+    default_year = default_year or file_year
+    name = f"{digest[:32]}-{labels_digest}-{venue}-{default_year or ''}-v{FORMAT_VERSION}.json"
+    cached = os.path.join(cache_dir, name) if cache_dir else None
+    if cached and os.path.exists(cached):
+        with open(cached, 'r', encoding='utf-8') as file:
+            return json.load(file), True
+    partial = partial_aggregate(path, taxonomy, default_year)
+    if cached:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cached + ".tmp", 'w', encoding='utf-8') as file:
+            json.dump(partial, file, ensure_ascii=False)
+        os.replace(cached + ".tmp", cached)
+    return partial, False
+
+
+def _shares(counts, by):
+    """{group: {domain: share}} with shares of each group summing to 1."""
+    table = counts.groupby([by, 'domain'])['papers'].sum().unstack(fill_value=0)
+    table = table.div(table.sum(axis=1), axis=0).round(4)
+    return {str(group): {domain: share for domain, share in row.items() if share}
+            for group, row in table.iterrows()}
+
+
+def summarize(partials, top=20):
+    """Combine partial aggregates into the summary dict."""
+    labels = pd.DataFrame([r for p in partials for r in p['labels']],
+                          columns=['venue', 'year', 'domain', 'theme_label', 'papers'])
+    keywords = pd.DataFrame([r for p in partials for r in p['keywords']],
+                            columns=['venue', 'year', 'term', 'papers'])
+
+    label_counts = labels.groupby('theme_label')['papers'].sum().sort_values(ascending=False)
+    domain_counts = labels.groupby('domain')['papers'].sum().sort_values(ascending=False)
+    labels['venue_year'] = labels['venue'] + " " + labels['year'].astype(str)
+
+    # Per-year figures only over papers with a year; the rest are reported as unknown_year_papers
+    dated = labels[labels['year'].astype(str) != UNKNOWN_YEAR]
+    dated_keywords = keywords[keywords['year'].astype(str) != UNKNOWN_YEAR]
+
+    term_totals = keywords.groupby('term')['papers'].sum().sort_values(ascending=False)
+    top_terms = term_totals.head(top).index
+    trend = (dated_keywords[dated_keywords['term'].isin(top_terms)]
+             .groupby(['term', 'year'])['papers'].sum().unstack(fill_value=0))
+    by_venue = keywords.groupby(['venue', 'term'])['papers'].sum().sort_values(ascending=False)
+
+    return {
+        'papers': int(labels['papers'].sum()),
+        'unknown_year_papers': int(labels['papers'].sum() - dated['papers'].sum()),
+        'label_histogram': {label: int(n) for label, n in label_counts.items()},
+        'domain_histogram': {domain: int(n) for domain, n in domain_counts.items()},
+        'domain_share_by_venue': _shares(labels, 'venue'),
+        'domain_share_by_year': _shares(dated, 'year'),
+        'domain_share_by_venue_year': _shares(labels, 'venue_year'),
+        'top_keywords': {term: int(n) for term, n in term_totals.head(top).items()},
+        'keyword_trends': {term: {str(year): int(n) for year, n in trend.loc[term].items() if n}
+                           if term in trend.index else {} for term in top_terms},
+        'top_keywords_by_venue': {
+            venue: {term: int(n) for term, n in group.droplevel(0).head(top).items()}
+            for venue, group in by_venue.groupby(level=0, sort=True)},
+    }
+
+
+def render_report(summary, top=20):
+    """Markdown report of a summary."""
+    lines = ["# Paper label analytics", "", f"{summary['papers']} labeled papers.", ""]
+    if summary['unknown_year_papers']:
+        lines[-2] += (f" {summary['unknown_year_papers']} of them have no year and are left out of "
+                      "the keyword trends by year (see `--year`).")
+    lines += ["## Domains", "", "| Domain | Papers |", "|---|---|"]
+    lines += [f"| {domain} | {n} |" for domain, n in summary['domain_histogram'].items()]
+
+    shares = summary['domain_share_by_venue_year']
+    domains = list(summary['domain_histogram'])
+    lines += ["", "## Domain share by venue and year", "",
+              "| Venue/year | " + " | ".join(domains) + " |", "|---" * (len(domains) + 1) + "|"]
+    for group, row in shares.items():
+        lines.append(f"| {group} | " + " | ".join(f"{row.get(d, 0):.1%}" for d in domains) + " |")
+
+    lines += ["", f"## Top {top} labels", "", "| Label | Papers |", "|---|---|"]
+    lines += [f"| {label} | {n} |" for label, n in list(summary['label_histogram'].items())[:top]]
+
+    lines += ["", f"## Top {top} keywords", "", "| Keyword | Papers | By year |", "|---|---|---|"]
+    for term, n in summary['top_keywords'].items():
+        years = ", ".join(f"{year}: {count}" for year, count in summary['keyword_trends'][term].items())
+        lines.append(f"| {term} | {n} | {years} |")
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Label and keyword distributions of the labeled outputs.")
+    parser.add_argument("inputs", nargs="+", help="*_keywords.json files")
+    parser.add_argument("--labels", required=True, help="labels.txt used to map labels to domains")
+    parser.add_argument("-o", "--output", default="analytics_summary.json")
+    parser.add_argument("--report", default="analytics_report.md", help="Markdown report ('' disables)")
+    parser.add_argument("--top", type=int, default=20, help="keywords and labels listed")
+    parser.add_argument("--year", action="append",
+                        help="YEAR of papers without one in inputs whose file names carry none, "
+                             "or FILE=YEAR for one input (repeatable)")
+    parser.add_argument("--cache-dir", default=".analytics_cache",
+                        help="partial aggregate cache ('' disables)")
+    args = parser.parse_args(argv)
+    try:
+        year, file_years = parse_year_options(args.year)
+    except ValueError as error:
+        parser.error(str(error))
+
+    with open(args.labels, "r", encoding="utf-8") as file:
+        labels_text = file.read()
+    taxonomy = Taxonomy.parse(labels_text)
+    labels_digest = hashlib.sha256(labels_text.encode("utf-8")).hexdigest()[:12]
+
+    inputs = [path for path in args.inputs if not covered_by_full_output(path)]
+    digests = {path: file_hash(path) for path in inputs}
+    default_years = {path: input_year(path, year, file_years) for path in inputs}
+    # The summary depends on exactly these inputs, the labels and the options
+    summary_key = hashlib.sha256(json.dumps(
+        [sorted((os.path.basename(path), digest, default_years[path]) for path, digest in digests.items()),
+         labels_digest,
+         args.top, FORMAT_VERSION]).encode("utf-8")).hexdigest()
+
+    if os.path.exists(args.output):
+        with open(args.output, "r", encoding="utf-8") as file:
+            previous = json.load(file)
+        if previous.get('key') == summary_key and (not args.report or os.path.exists(args.report)):
+            print(f"Inputs unchanged, cached summary {args.output} is up to date")
+            return
+
+    partials = []
+    for path in inputs:
+        partial, cached = load_partial(path, taxonomy, labels_digest, args.cache_dir or None, digests[path],
+                                       default_years[path])
+        print(f"{path}: {'cached' if cached else 'aggregated'}")
+        partials.append(partial)
+
+    summary = summarize(partials, args.top)
+    summary['key'] = summary_key
+    summary['inputs'] = [os.path.basename(path) for path in inputs]
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    print(f"Summary of {summary['papers']} papers saved to {args.output}")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write(render_report(summary, args.top))
+        print(f"Report saved to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
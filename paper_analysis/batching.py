@@ -0,0 +1,191 @@
+# Multi-paper batched prompts.
+#
+# Several papers are packed into one request so the instructions and the
+# labels.txt taxonomy are sent once per batch instead of once per paper.
+# The model answers with a JSON array keyed by the paper IDs we assign
+# ("P<input index>"), which is parsed back into per-paper results. Papers
+# missing from a malformed answer are retried in smaller batches, down to
+# single-paper calls. Each paper's entry of an answer is cached on its own
+# (keyed by its title and abstract), so re-runs hit the cache however the
+# papers are ordered or batched.
+
+import json
+import re
+
+from .cache import CacheMiss
+from .llm import build_chain
+
+BATCH_PROMPT_TEMPLATE = """
+你是一个网络安全领域的科研导师。下面给出若干篇论文的编号、标题和摘要。
+
+{papers}
+
+请对每一篇论文分别执行以下任务：
+1.  提取三个最能代表论文研究方向的核心关键词，每个关键词要求简洁、准确。
+2.  每个关键词的格式为：`关键词 (中文翻译) - 简短归纳`，简短归纳在15字以内。
+3.  根据论文内容从以下主题标签中选择一个最适合的主题标签：
+
+{labels}
+
+请只输出一个JSON数组，每篇论文对应一个对象，不要输出任何其他文字或格式：
+[
+  {{"id": "P0", "keywords": ["Keyword1 (翻译1) - 简短归纳1", "Keyword2 (翻译2) - 简短归纳2", "Keyword3 (翻译3) - 简短归纳3"], "theme_label": "选定的主题标签名称"}}
+]
+"""
+
+_FENCE_RE = re.compile(r'^```[a-zA-Z]*\s*|\s*```$')
+
+
+def paper_id(index):
+    return f"P{index}"
+
+
+def paper_inputs(title, abstract):
+    """Cache inputs of one paper's entry in a batch answer."""
+    return {"title": title, "abstract": abstract}
+
+
+def format_papers_block(papers):
+    """papers: (index, title, abstract) triples."""
+    return "\n\n".join(
+        f"[{paper_id(index)}]\nTitle: {title}\nAbstract: {abstract}"
+        for index, title, abstract in papers)
+
+
+def _load_entries(text):
+    text = _FENCE_RE.sub('', text.strip())
+    start, end = text.find('['), text.rfind(']')
+    if start != -1 and end > start:
+        try:
+            entries = json.loads(text[start:end + 1])
+            if isinstance(entries, list):
+                return entries
+        except ValueError:
+            pass
+    # Fall back to one JSON object per line
+    entries = []
+    for line in text.splitlines():
+        line = line.strip().rstrip(',')
+        if line.startswith('{'):
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+
+def parse_batch_response(response, ids):
+    """
+    Map paper IDs to (keywords_output, theme_label), the label as written
+    (BatchLabeler resolves it). Entries with an unknown ID, no keywords or
+    no label are dropped, so callers can retry them.
+    """
+    wanted = set(ids)
+    parsed = {}
+    for entry in _load_entries(response):
+        if not isinstance(entry, dict):
+            continue
+        entry_id = str(entry.get('id', '')).strip().strip('[]')
+        keywords = entry.get('keywords')
+        theme_label = str(entry.get('theme_label') or '').strip()
+        if isinstance(keywords, list):
+            keywords = "\n".join(str(k).strip() for k in keywords if str(k).strip())
+        keywords = (keywords or '').strip() if isinstance(keywords, str) else ''
+        if entry_id in wanted and keywords and theme_label:
+            parsed[entry_id] = (keywords, theme_label)
+    return parsed
+
+
+class BatchLabeler:
+    """Labels papers `batch_size` at a time through a LabelingEngine."""
+
+    def __init__(self, chain, labels, batch_size):
+        self.chain = chain
+        self.labels = labels
+        self.batch_size = max(1, int(batch_size))
+
+    @classmethod
+    def from_llm(cls, llm, labels, batch_size):
+        """Build the batch chain on `llm` (None for cache-only runs)."""
+        return cls(build_chain(llm, BATCH_PROMPT_TEMPLATE, ["papers", "labels"]), labels, batch_size)
+
+    @staticmethod
+    async def _finish(engine, semaphore, title, keywords_output, label_line, usage):
+        """The paper's result with its label line resolved, or None to leave it to a smaller batch."""
+        try:
+            theme_label = await engine._theme_label(semaphore, title, keywords_output, label_line, usage)
+        except CacheMiss:
+            return None
+        except Exception as e:
+            # Left to the smaller batches, down to a single-paper call
+            engine.metrics.count("exceptions", type(e).__name__)
+            print(f"Label re-ask for paper '{title}' failed: {e}")
+            return None
+        return engine._result(keywords_output, theme_label, usage)
+
+    async def label(self, engine, semaphore, papers, split=False):
+        """
+        papers: (index, title, abstract) triples with non-empty abstracts.
+        Returns {index: result}. `split` marks the smaller batches of a partly
+        answered batch: they make one attempt without the retry policy, so a
+        paper that breaks the answer costs one call per halving, and only the
+        final single-paper call is retried.
+        """
+        route_tier = engine._route_tier()
+        results, unanswered = {}, []
+        for index, title, abstract in papers:
+            usage = engine._new_usage(engine._baseline_tokens(title, abstract))
+            entry = engine._cached(BATCH_PROMPT_TEMPLATE, paper_inputs(title, abstract), route_tier, usage)
+            result = None
+            if entry is not None:
+                result = await self._finish(engine, semaphore, title, *json.loads(entry), usage)
+            if result is None:
+                unanswered.append((index, title, abstract))
+            else:
+                results[index] = result
+        papers = unanswered
+        if len(papers) == 1:
+            index, title, abstract = papers[0]
+            results[index] = await engine._label_one(semaphore, title, abstract)
+            return results
+        if not papers:
+            return results
+
+        usage, served = engine._new_usage(), {}
+        parsed = {}
+        try:
+            # Cached per paper below instead of per (batch-position dependent) prompt
+            response = await engine._invoke(
+                semaphore, self.chain, BATCH_PROMPT_TEMPLATE,
+                {"papers": format_papers_block(papers), "labels": self.labels}, usage,
+                use_cache=False, retry=not split, served=served)
+            with engine.metrics.stage("parse"):
+                parsed = parse_batch_response(response, [paper_id(index) for index, _, _ in papers])
+        except CacheMiss:
+            pass
+        except Exception as e:
+            engine.metrics.count("exceptions", type(e).__name__)
+            print(f"Batch request for {len(papers)} papers failed: {e}")
+
+        share = {name: value / len(papers) for name, value in usage.items()}
+        for index, title, abstract in papers:
+            if paper_id(index) in parsed:
+                keywords_output, label_line = parsed[paper_id(index)]
+                engine._store(BATCH_PROMPT_TEMPLATE, paper_inputs(title, abstract), route_tier, served,
+                              json.dumps([keywords_output, label_line], ensure_ascii=False))
+                paper_usage = dict(share, baseline_input_tokens=engine._baseline_tokens(title, abstract))
+                result = await self._finish(engine, semaphore, title, keywords_output, label_line, paper_usage)
+                if result is not None:
+                    results[index] = result
+
+        missing = [paper for paper in papers if paper[0] not in results]
+        if missing:
+            if not engine.cache_only:
+                print(f"Warning: batch answer covered {len(papers) - len(missing)} of {len(papers)} papers; "
+                      f"retrying {len(missing)} in smaller batches.")
+                engine.metrics.count("retries", "batch_split", len(missing))
+            half = (len(missing) + 1) // 2
+            for part in (missing[:half], missing[half:]):
+                if part:
+                    results.update(await self.label(engine, semaphore, part, split=True))
+        return results
@@ -0,0 +1,158 @@
+# Offline benchmark of the labeling pipeline.
+#
+# Builds a workload of N papers from a collection (repeating it with
+# distinct titles when N is larger), starts the mock compatible-mode server
+# (paper_analysis.mock_server) and runs the real `label` command against it
+# with --client compatible. Reports papers/s, per-paper API latency
+# percentiles, output tokens, API calls, retries and failures (and with
+# --stream the time to first token and to label). Options after `--` are
+# passed on to `label`, so any concurrency/caching/batching setting can be
+# compared without spending API quota.
+#
+#   python -m paper_analysis.bench datas/CCS24.json -n 1000 --labels web_of_science/labels.txt
+#   python -m paper_analysis.bench datas/CCS24.json -n 5000 --labels web_of_science/labels.txt \
+#       --latency 1.0 --rate-limit-rate 0.05 --json bench.json -- --concurrency 64 --qps 50
+#   python -m paper_analysis.bench datas/CCS24.json -n 500 --labels web_of_science/labels.txt \
+#       --trailing-lines 5 -- --stream
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from .cli import LabelingSession, journal_path_for, label_file, parse_args
+from .dedup import load_papers
+from .journal import iter_journal
+from .mock_server import MockServer, add_behavior_arguments, behavior_from_args
+from .sources import detect_adapter
+
+FAILED_PREFIX = "关键词提取失败"
+
+
+def build_workload(path, count, output_path):
+    """Write `count` papers from `path` to `output_path`, suffixing titles of repeated copies."""
+    papers = load_papers(path)
+    if not papers:
+        raise SystemExit(f"Error: no papers in {path}")
+    adapter = detect_adapter(papers[0])
+    workload = []
+    for i, paper in enumerate(itertools.islice(itertools.cycle(papers), count)):
+        paper = dict(paper)
+        if i >= len(papers):
+            paper[adapter.title_field] = f"{paper.get(adapter.title_field, '')} [{i // len(papers)}]"
+        workload.append(paper)
+    with open(output_path, "w", encoding="utf-8") as file:
+        json.dump(workload, file, ensure_ascii=False)
+    return len(workload)
+
+
+def summarize_run(journal_path, elapsed, client_stats, metrics=None):
+    latencies, api_calls, failures, papers, output_tokens = [], 0, 0, 0, 0
+    for record in iter_journal(journal_path):
+        papers += 1
+        usage = record.get("usage") or {}
+        if str((record.get("full") or {}).get("keywords", "")).startswith(FAILED_PREFIX):
+            failures += 1
+        if usage.get("api_calls"):
+            api_calls += usage["api_calls"]
+            output_tokens += usage.get("output_tokens", 0)
+            latencies.append(usage.get("latency", 0.0))
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (0.0, 0.0, 0.0)
+    return {
+        "papers": papers,
+        "seconds": round(elapsed, 3),
+        "papers_per_second": round(papers / elapsed, 2) if elapsed else 0.0,
+        "latency_p50": round(float(p50), 3),
+        "latency_p95": round(float(p95), 3),
+        "latency_p99": round(float(p99), 3),
+        "api_calls": int(api_calls),
+        "output_tokens_per_call": round(output_tokens / api_calls, 1) if api_calls else 0.0,
+        "streams": (metrics or {}).get("stream", {}),
+        "http_requests": client_stats.get("requests", 0),
+        "retries": sum((metrics or {}).get("retries", {}).values()) or client_stats.get("retries", 0),
+        "retries_by_class": (metrics or {}).get("retries", {}),
+        "circuit_opens": (metrics or {}).get("circuit_open", {}).get("total", 0),
+        "failed_requests": client_stats.get("failures", 0),
+        "failed_papers": failures,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the labeling pipeline against a local mock API.")
+    parser.add_argument("input", help="paper collection to build the workload from, e.g. datas/CCS24.json")
+    parser.add_argument("-n", "--papers", type=int, default=1000, help="workload size")
+    parser.add_argument("--labels", required=True, help="labels.txt sent in the prompts")
+    parser.add_argument("--base-url", help="use an already running server instead of starting the mock")
+    parser.add_argument("--json", help="also write the report to this file")
+    add_behavior_arguments(parser)
+    argv = list(sys.argv[1:] if argv is None else argv)
+    label_args = argv[argv.index("--") + 1:] if "--" in argv else []
+    args = parser.parse_args(argv[:argv.index("--")] if "--" in argv else argv)
+
+    server = None
+    if not args.base_url:
+        server = MockServer(behavior_from_args(args)).start()
+    base_url = args.base_url or server.base_url
+
+    with tempfile.TemporaryDirectory(prefix="paper_bench_") as work_dir:
+        workload = os.path.join(work_dir, "bench.json")
+        count = build_workload(args.input, args.papers, workload)
+        metrics_path = os.path.join(work_dir, "metrics.json")
+        label_argv = ["label", workload, "--labels", args.labels, "--client", "compatible",
+                      "--base-url", base_url, "--api-key", "bench", "--cache", "",
+                      "--output-dir", work_dir, "--metrics", metrics_path] + label_args
+        label_options = parse_args(label_argv)
+        print(f"Benchmarking {count} papers against {base_url}: {' '.join(label_args) or 'default options'}")
+
+        session = LabelingSession(label_options)
+        started = time.monotonic()
+        try:
+            label_file(session, workload)
+        finally:
+            session.close()
+        elapsed = time.monotonic() - started
+        client_stats = session.llm.stats if session.llm is not None else {}
+        with open(label_options.metrics, "r", encoding="utf-8") as file:
+            metrics = json.load(file)
+        report = summarize_run(journal_path_for(label_options, workload), elapsed, client_stats, metrics)
+        report["stages"] = metrics["stages"]
+        if "routing" in metrics:
+            report["routing"] = metrics["routing"]
+
+    if server is not None:
+        report["server"] = dict(server.behavior.stats)
+        server.close()
+    report["options"] = label_args
+
+    print(f"\n{report['papers']} papers in {report['seconds']:.1f}s: {report['papers_per_second']:.1f} papers/s")
+    print(f"Per-paper API latency p50 {report['latency_p50']:.3f}s, p95 {report['latency_p95']:.3f}s, "
+          f"p99 {report['latency_p99']:.3f}s")
+    print(f"API calls {report['api_calls']}, HTTP requests {report['http_requests']}, "
+          f"retries {report['retries']} {report['retries_by_class'] or ''}, "
+          f"failed requests {report['failed_requests']}, failed papers {report['failed_papers']}, "
+          f"circuit opened {report['circuit_opens']} times")
+    print(f"Output tokens per API call {report['output_tokens_per_call']:.1f}")
+    if report["streams"]:
+        ttft, to_label = report["stages"].get("ttft", {}), report["stages"].get("time_to_label", {})
+        print(f"Streams {report['streams']}: time to first token p50 {ttft.get('p50', 0):.3f}s "
+              f"p99 {ttft.get('p99', 0):.3f}s, to label p50 {to_label.get('p50', 0):.3f}s "
+              f"p99 {to_label.get('p99', 0):.3f}s")
+    if "server" in report:
+        print(f"Server: {report['server']}")
+    for route in report.get("routing", {}).get("routes", []):
+        print(f"Route {route['name']} [{route['tier']}]: {route['requests']} requests, "
+              f"{route['requests_per_second']:.2f} req/s, p95 {route['latency']['p95']:.3f}s, "
+              f"{route['escalated']} escalated, {route['ejections']} ejections")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Report saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
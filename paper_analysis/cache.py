@@ -0,0 +1,203 @@
+# Persistent, content-addressed cache for raw LLM responses.
+#
+# Entries are keyed by a hash of everything that determines the answer
+# (model, labels.txt version, prompt template, title, abstract), so a re-run
+# with unchanged inputs makes no API calls. The raw response is cached, not
+# the parsed result, so changing the output format is free as well.
+#
+# Maintenance:
+#   python -m paper_analysis.cache llm_cache.sqlite3 --stats
+#   python -m paper_analysis.cache llm_cache.sqlite3 --invalidate-model qwen-plus-2025-04-28
+#   python -m paper_analysis.cache llm_cache.sqlite3 --max-age-days 30 --max-mb 200
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key            TEXT PRIMARY KEY,
+    model          TEXT NOT NULL,
+    labels_version TEXT NOT NULL,
+    response       TEXT NOT NULL,
+    size           INTEGER NOT NULL,
+    created_at     REAL NOT NULL,
+    accessed_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_model ON responses (model);
+CREATE INDEX IF NOT EXISTS idx_responses_labels ON responses (labels_version);
+CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at);
+"""
+
+# Access-time updates are committed in batches; new responses are committed
+# immediately so a crash never loses a paid-for answer.
+_COMMIT_EVERY = 50
+
+
+class CacheMiss(Exception):
+    """Raised in cache-only runs when a response is not cached."""
+
+
+def labels_version(labels):
+    """Short content hash identifying one version of labels.txt."""
+    return hashlib.sha256(labels.encode('utf-8')).hexdigest()[:12]
+
+
+class ResponseCache:
+    """
+    SQLite-backed response cache bound to one model and one labels version.
+
+    `max_entries`, `max_bytes` and `max_age_days` are enforced by `evict()`,
+    which runs on open and on close; None disables a limit.
+    """
+
+    def __init__(self, path, model="", labels="", max_entries=None, max_bytes=None,
+                 max_age_days=None):
+        self.path = path
+        self.model = model
+        self.labels_version = labels_version(labels) if labels else ""
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._pending = 0
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self.evict()
+
+    def make_key(self, *parts):
+        """Hash the bound model/labels version together with `parts`."""
+        payload = json.dumps([self.model, self.labels_version, *parts], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        row = self._conn.execute(
+            "SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._conn.execute(
+            "UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        self._maybe_commit()
+        return row[0]
+
+    def put(self, key, response, model=None):
+        """Store `response`; `model` overrides the bound model in the entry's model column."""
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO responses "
+            "(key, model, labels_version, response, size, created_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, model or self.model, self.labels_version, response,
+             len(response.encode('utf-8')), now, now))
+        self.writes += 1
+        self._conn.commit()
+        self._pending = 0
+
+    def _maybe_commit(self):
+        self._pending += 1
+        if self._pending >= _COMMIT_EVERY:
+            self._conn.commit()
+            self._pending = 0
+
+    def invalidate(self, model=None, labels_version=None):
+        """Delete entries for a model and/or a labels version. Returns the count."""
+        clauses, params = [], []
+        if model is not None:
+            clauses.append("model = ?")
+            params.append(model)
+        if labels_version is not None:
+            clauses.append("labels_version = ?")
+            params.append(labels_version)
+        if not clauses:
+            return 0
+        cur = self._conn.execute(
+            "DELETE FROM responses WHERE " + " AND ".join(clauses), params)
+        self._conn.commit()
+        return cur.rowcount
+
+    def evict(self):
+        """Apply the age, entry-count and size limits, oldest access first."""
+        removed = 0
+        if self.max_age_days is not None:
+            cutoff = time.time() - self.max_age_days * 86400
+            removed += self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (cutoff,)).rowcount
+        if self.max_entries is not None:
+            removed += self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                "ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,)).rowcount
+        if self.max_bytes is not None:
+            total = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                doomed = []
+                for key, size in self._conn.execute(
+                        "SELECT key, size FROM responses ORDER BY accessed_at ASC"):
+                    if total <= self.max_bytes:
+                        break
+                    doomed.append((key,))
+                    total -= size
+                self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+                removed += len(doomed)
+        self._conn.commit()
+        return removed
+
+    def stats(self):
+        entries, size = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'entries': entries,
+            'bytes': size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def close(self):
+        self.evict()
+        self._conn.commit()
+        self._conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or prune the LLM response cache.")
+    parser.add_argument("path", help="cache database file")
+    parser.add_argument("--stats", action="store_true", help="print entry count and size")
+    parser.add_argument("--invalidate-model", help="drop all entries for this model")
+    parser.add_argument("--invalidate-labels", metavar="LABELS_FILE",
+                        help="drop all entries made with this version of labels.txt")
+    parser.add_argument("--max-entries", type=int)
+    parser.add_argument("--max-mb", type=float)
+    parser.add_argument("--max-age-days", type=float)
+    args = parser.parse_args(argv)
+
+    cache = ResponseCache(
+        args.path,
+        max_entries=args.max_entries,
+        max_bytes=int(args.max_mb * 1024 * 1024) if args.max_mb else None,
+        max_age_days=args.max_age_days,
+    )
+    if args.invalidate_model:
+        print(f"Removed {cache.invalidate(model=args.invalidate_model)} entries for model {args.invalidate_model}")
+    if args.invalidate_labels:
+        with open(args.invalidate_labels, "r", encoding="utf-8") as file:
+            version = labels_version(file.read().strip())
+        print(f"Removed {cache.invalidate(labels_version=version)} entries for labels version {version}")
+    if args.stats:
+        print(json.dumps(cache.stats(), indent=4))
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
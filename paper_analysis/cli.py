@@ -0,0 +1,472 @@
+# Unified labeling entry point.
+#
+#   python -m paper_analysis label datas/SP24.json datas/CCS24.json --labels web_of_science/labels.txt
+#   python -m paper_analysis label datas/usenix_papers.json --model qwen3-235b-a22b --output-suffix _v2
+#   python -m paper_analysis label datas/SP24.json datas/usenix_papers.json --dry-run
+#   python -m paper_analysis label datas/SP24.json --stats
+#   python -m paper_analysis label datas/usenix_papers.json datas/usenix24_papers.json --dedup
+#   python -m paper_analysis label datas/CCS24.json --routes routes.json   # several keys/models, see router.py
+#
+# Every option can also be given in a JSON file passed with --config (keys
+# are the option names with dashes replaced by underscores); command-line
+# flags override it. All input files are processed in one process with a
+# single shared LLM client, response cache and rate limiter. langchain,
+# Tongyi and NumPy are imported only once something actually needs them.
+
+import argparse
+import json
+import os
+
+from .cache import ResponseCache
+from .journal import LabelJournal, iter_journal, iter_papers, materialize_journal, paper_key, usage_totals
+from .llm import BASE_URL, DEFAULT_LABEL, DEFAULT_MODEL, MAX_OUTPUT_TOKENS, PROMPT_TEMPLATE
+from .metrics import NULL_METRICS, Metrics
+from .retry import FailureQueue, failure_queue_path
+from .sources import ADAPTERS, detect_adapter
+
+
+def output_paths(input_path, output_dir, suffix=""):
+    """
+    SP24.json -> SP24_papers_keywords.json / SP24_papers_keywords_only.json;
+    usenix_papers.json -> usenix_papers_keywords.json / ..._keywords_only.json.
+    """
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    if not stem.endswith("_papers"):
+        stem += "_papers"
+    return (os.path.join(output_dir, f"{stem}_keywords{suffix}.json"),
+            os.path.join(output_dir, f"{stem}_keywords_only{suffix}.json"))
+
+
+def journal_path_for(args, input_path):
+    return output_paths(input_path, args.output_dir, args.output_suffix)[0] + ".journal.jsonl"
+
+
+def resolve_adapter(source, input_path):
+    if source != "auto":
+        return ADAPTERS[source]
+    for paper in iter_papers(input_path):
+        return detect_adapter(paper)
+    return ADAPTERS["conference"]
+
+
+def print_decode_error(input_path, error):
+    print(f"Error: Could not decode JSON from {input_path}: {error}")
+
+
+class LabelingSession:
+    """Shared state for one CLI run: labels, cache, and the lazily built engine."""
+
+    def __init__(self, args):
+        self.args = args
+        with open(args.labels, "r", encoding="utf-8") as file:
+            self.labels = file.read().strip()
+        self.cache = None
+        if args.cache:
+            # With --routes the model that answered is part of every key (engine.cache_key)
+            self.cache = ResponseCache(args.cache, model="" if args.routes else args.model, labels=self.labels,
+                                       max_age_days=args.cache_max_age_days)
+        self._engine = None
+        self.llm = None
+        self.router = None
+        self.metrics = Metrics() if args.metrics or args.prometheus else NULL_METRICS
+        self.fulltext = None
+        if args.fulltext:
+            from .fulltext import FullTextSource
+            self.fulltext = FullTextSource(args.fulltext, args.fulltext_chars)
+        # --dedup: (path, index) of every duplicate -> (path, index) of the first copy
+        self.duplicate_of = {}
+        self.cluster_results = {}
+        if args.dedup:
+            self._index_duplicates()
+
+    def _index_duplicates(self):
+        from .dedup import DedupIndex
+
+        index = DedupIndex(threshold=self.args.dedup_threshold)
+        refs = []
+        for input_path in self.args.inputs:
+            if not os.path.exists(input_path):
+                continue
+            try:
+                adapter = resolve_adapter(self.args.source, input_path)
+                for i, paper in enumerate(iter_papers(input_path)):
+                    common = adapter.common(paper)
+                    refs.append((input_path, i))
+                    first = index.add(common['title'], common['doi'])
+                    if first != len(refs) - 1:
+                        self.duplicate_of[refs[-1]] = refs[first]
+            except json.JSONDecodeError as e:
+                # Reported again, and the file skipped, when it is labeled
+                print_decode_error(input_path, e)
+        print(f"Deduplication: {len(refs)} papers, {len(self.duplicate_of)} duplicates "
+              f"will reuse the label of their first copy")
+
+    def first_copy_result(self, ref):
+        """Result of the labeled first copy of a paper, from this run or its journal."""
+        if ref not in self.cluster_results:
+            input_path, _ = ref
+            journal_path = journal_path_for(self.args, input_path)
+            if os.path.exists(journal_path):
+                for record in iter_journal(journal_path):
+                    full = record.get('full') or {}
+                    self.cluster_results.setdefault((input_path, record.get('index')), {
+                        'keywords': full.get('keywords'),
+                        'theme_label': full.get('theme_label'),
+                        'usage': None,
+                    })
+        return self.cluster_results.get(ref)
+
+    def fields(self, adapter):
+        """(title, text) of a paper for the prompt: the abstract, plus full-text excerpts with --fulltext."""
+        return self.fulltext.fields(adapter) if self.fulltext is not None else adapter.fields
+
+    def engine(self):
+        if self._engine is None:
+            self._engine = self._build_engine()
+        return self._engine
+
+    def _build_engine(self):
+        from .batching import BatchLabeler
+        from .engine import LabelingEngine
+        from .llm import LABEL_PROMPT_TEMPLATE, build_chain, build_llm
+        from .retry import CircuitBreaker, RetryPolicy
+        from .taxonomy import cached_taxonomy
+        from .two_stage import TwoStageClassifier
+
+        args = self.args
+        llm = None
+        if not args.cache_only:
+            api_key = args.api_key or os.getenv("TONGYI_API_KEY") or os.getenv("DASHSCOPE_API_KEY")
+            if args.routes:
+                from .router import Router
+                try:
+                    llm = self.router = Router.from_config(args.routes, api_key, stream=args.stream)
+                except ValueError as e:
+                    raise SystemExit(f"Error: {args.routes}: {e}")
+            elif not api_key:
+                raise SystemExit("Error: no API key; pass --api-key or set TONGYI_API_KEY.")
+            else:
+                llm = build_llm(args.model, api_key, args.base_url, args.client, stream=args.stream)
+        self.llm = llm
+
+        taxonomy = cached_taxonomy(self.labels)
+        if args.label_aliases:
+            with open(args.label_aliases, "r", encoding="utf-8") as file:
+                for alias, target in json.load(file).items():
+                    taxonomy.add_alias(alias, target)
+
+        preclassifier = None
+        if args.preclassifier:
+            from .preclassifier import PreClassifier
+            preclassifier = PreClassifier.load(args.preclassifier)
+
+        return LabelingEngine(
+            build_chain(llm, PROMPT_TEMPLATE, ["title", "abstract", "labels"]),
+            self.labels,
+            args.default_label,
+            concurrency=args.concurrency,
+            qps=args.qps,
+            tpm=args.tpm,
+            prompt_template=PROMPT_TEMPLATE,
+            cache=self.cache,
+            two_stage=(TwoStageClassifier.from_llm(llm, taxonomy, self.labels, args.default_label)
+                       if args.two_stage else None),
+            batcher=BatchLabeler.from_llm(llm, self.labels, args.batch_size) if args.batch_size > 1 else None,
+            preclassifier=preclassifier,
+            preclassifier_threshold=args.preclassifier_threshold,
+            cache_only=args.cache_only,
+            metrics=self.metrics,
+            retry_policy=RetryPolicy(max_retries=args.max_retries),
+            breaker=(CircuitBreaker(args.breaker_threshold, args.breaker_cooldown, metrics=self.metrics)
+                     if args.breaker_threshold > 0 else None),
+            streaming=args.stream,
+            max_output_tokens=args.max_output_tokens,
+            reask_chain=(None if args.no_reask
+                         else build_chain(llm, LABEL_PROMPT_TEMPLATE, ["title", "keywords", "labels"])),
+            router=self.router,
+        )
+
+    def close(self):
+        if self.cache is not None:
+            print(f"Cache stats: {self.cache.stats()}")
+            self.cache.close()
+        if self.router is not None:
+            self.router.print_report()
+        if self.fulltext is not None:
+            print(f"Full text: excerpts for {len(self.fulltext.found)} PDFs, "
+                  f"{len(self.fulltext.missing)} PDF links without extracted text")
+        self.metrics.write(self.args.metrics, self.args.prometheus, getattr(self.llm, "stats", None),
+                           self.router)
+
+
+def print_usage(journal_path):
+    usage = usage_totals(journal_path)
+    if not usage['papers']:
+        return
+    n = usage['papers']
+    print(f"Estimated tokens per paper: input {usage['input_tokens'] / n:.0f} "
+          f"(single-shot prompt: {usage['baseline_input_tokens'] / n:.0f}), "
+          f"output {usage['output_tokens'] / n:.0f}")
+    if usage['api_calls']:
+        print(f"API calls: {usage['api_calls']:.0f}, mean latency {usage['latency'] / usage['api_calls']:.2f}s")
+    if usage.get('streamed_calls'):
+        streamed = usage['streamed_calls']
+        print(f"Streamed calls: {streamed:.0f}, mean time to first token {usage['ttft'] / streamed:.2f}s, "
+              f"to label {usage['time_to_label'] / streamed:.2f}s")
+    if usage.get('escalations'):
+        print(f"Escalated to the bigger model: {usage['escalations']:.0f} papers "
+              f"({usage['escalations'] / n:.1%})")
+    if usage['local_labels']:
+        print(f"Labeled locally: {usage['local_labels']} papers "
+              f"({usage['local_labels'] / n:.1%} of LLM calls avoided)")
+
+
+def failed_journal_keys(journal_path):
+    """Keys of journaled papers whose latest result is an API or unknown-error placeholder."""
+    from .engine import FAILED_API, FAILED_UNKNOWN
+
+    failed = set()
+    if os.path.exists(journal_path):
+        for record in iter_journal(journal_path):
+            if (record.get('full') or {}).get('keywords') in (FAILED_API, FAILED_UNKNOWN):
+                failed.add(record.get('key'))
+            else:
+                failed.discard(record.get('key'))
+    return failed
+
+
+def dry_run(session, input_path, adapter, journal_path):
+    """Count what a real run would do without importing or calling the LLM."""
+    from .engine import MISSING_ABSTRACT, cache_key, estimate_tokens
+
+    done = set()
+    if os.path.exists(journal_path):
+        done = {record.get("key") for record in iter_journal(journal_path)}
+
+    total = journaled = no_abstract = cached = duplicates = 0
+    prompt_tokens = 0
+    fields = session.fields(adapter)
+    # Models whose cached answers the router's default tier would use
+    tier, models = None, [None]
+    if session.args.routes:
+        from .router import config_models
+
+        tier, models = config_models(session.args.routes)
+    overhead = estimate_tokens(PROMPT_TEMPLATE) + estimate_tokens(session.labels)
+    for index, paper in enumerate(iter_papers(input_path)):
+        total += 1
+        title, abstract = fields(paper)
+        if paper_key(index, *adapter.fields(paper)) in done:
+            journaled += 1
+        elif (input_path, index) in session.duplicate_of:
+            duplicates += 1
+        elif not abstract or abstract == MISSING_ABSTRACT:
+            no_abstract += 1
+        else:
+            prompt_tokens += overhead + estimate_tokens(title) + estimate_tokens(abstract)
+            # Same keys as LabelingEngine._invoke for the single-shot prompt
+            inputs = {"title": title, "abstract": abstract, "labels": session.labels}
+            keys = [cache_key(session.cache, PROMPT_TEMPLATE, inputs, session.labels, tier, model)
+                    for model in models] if session.cache is not None else []
+            if any(session.cache.get(key) is not None for key in keys):
+                cached += 1
+    pending = total - journaled - no_abstract - duplicates
+    print(f"{input_path} [{adapter.name}]: {total} papers, {journaled} already journaled, "
+          f"{duplicates} duplicates, {no_abstract} without abstract, {pending} to label "
+          f"({cached} cached, {pending - cached} API calls, ~{prompt_tokens} single-shot input tokens)")
+
+
+def label_file(session, input_path):
+    args = session.args
+    if not os.path.exists(input_path):
+        print(f"Error: Input papers file not found at {input_path}")
+        return
+    try:
+        adapter = resolve_adapter(args.source, input_path)
+    except json.JSONDecodeError as e:
+        print_decode_error(input_path, e)
+        return
+    output_full, output_keywords_only = output_paths(input_path, args.output_dir, args.output_suffix)
+    journal_path = journal_path_for(args, input_path)
+
+    if args.dry_run:
+        try:
+            dry_run(session, input_path, adapter, journal_path)
+        except json.JSONDecodeError as e:
+            print_decode_error(input_path, e)
+        return
+    if args.stats:
+        print(f"{input_path} [{adapter.name}] -> {output_full}")
+        if os.path.exists(journal_path):
+            print(f"Journaled papers: {len(LabelJournal(journal_path))}")
+            print_usage(journal_path)
+        return
+
+    failures = FailureQueue(failure_queue_path(output_full))
+    retry_keys = None
+    if args.retry_failures:
+        # Only the queued papers and journaled API failures; their new results are appended
+        # to the journal, where the last record of a paper wins
+        retry_keys = set(failures.pending) | failed_journal_keys(journal_path)
+        if not retry_keys:
+            print(f"{input_path}: no failed papers to retry")
+            failures.close()
+            return
+
+    engine = session.engine()
+    # Papers already in the journal (from an earlier, interrupted run) are skipped
+    journal = LabelJournal(journal_path)
+    if retry_keys is not None:
+        print(f"Retrying {len(retry_keys)} failed papers from {input_path}")
+    elif len(journal):
+        print(f"Resuming: {len(journal)} papers already labeled in {journal_path}")
+
+    duplicates = []
+
+    def pending_papers():
+        papers = session.metrics.timed_iter(enumerate(iter_papers(input_path)), "load")
+        for index, paper in papers:
+            key = paper_key(index, *adapter.fields(paper))
+            if retry_keys is not None:
+                if key in retry_keys:
+                    yield index, paper
+                continue
+            if key in journal:
+                continue
+            if (input_path, index) in session.duplicate_of:
+                duplicates.append((index, paper))
+                continue
+            yield index, paper
+
+    def store_result(index, paper, result):
+        if result is None:  # not cached in a cache-only run; left for a later run
+            return
+        if args.dedup:
+            session.cluster_results[(input_path, index)] = result
+        paper_data, paper_keywords_data = adapter.records(paper, result)
+        key = paper_key(index, *adapter.fields(paper))
+        journal.append(key, index, paper_data, paper_keywords_data, usage=result['usage'])
+        if result.get('error'):
+            failures.add(key, index, adapter.fields(paper)[0], result['error'])
+        else:
+            failures.resolve(key)
+
+    print(f"Processing papers from {input_path} [{adapter.name}]...")
+    try:
+        engine.label_stream(pending_papers(), session.fields(adapter), store_result)
+        # Duplicates come after their first copy, which is labeled by now
+        reused = 0
+        for index, paper in duplicates:
+            result = session.first_copy_result(session.duplicate_of[(input_path, index)])
+            if result is not None:
+                session.metrics.record_result(dict(result, usage=None))
+                store_result(index, paper, dict(result, usage=None))
+                reused += 1
+        if duplicates:
+            print(f"Reused labels for {reused} of {len(duplicates)} duplicate papers")
+    except json.JSONDecodeError as e:
+        print_decode_error(input_path, e)
+        return
+    finally:
+        journal.close()
+        failures.close()
+
+    if len(failures):
+        print(f"{len(failures)} papers still failing after retries, queued in {failures.path}; "
+              f"re-run with --retry-failures to process only them")
+    print_usage(journal_path)
+    try:
+        count = materialize_journal(journal_path, output_full, output_keywords_only)
+        print(f"\nFull data with keywords saved to {output_full} ({count} papers)")
+        print(f"Keywords-only data saved to {output_keywords_only}")
+    except IOError as e:
+        print(f"Error writing output JSON file: {e}")
+
+
+def build_parser(config=None):
+    parser = argparse.ArgumentParser(prog="python -m paper_analysis",
+                                     description="Keyword extraction and theme labeling for collected papers.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    label = commands.add_parser("label", help="extract keywords and theme labels with the LLM")
+    label.add_argument("inputs", nargs="+", help="input papers JSON files")
+    label.add_argument("--config", help="JSON file with default values for these options")
+    label.add_argument("--source", default="auto", choices=["auto"] + sorted(ADAPTERS),
+                       help="field layout of the inputs (default: detected per file)")
+    label.add_argument("--labels", default="labels.txt", help="taxonomy file (default: labels.txt)")
+    label.add_argument("--output-dir", default=".", help="directory for the *_keywords*.json outputs")
+    label.add_argument("--output-suffix", default="", help="e.g. _v2 -> *_keywords_v2.json")
+    label.add_argument("--model", default=DEFAULT_MODEL)
+    label.add_argument("--base-url", default=BASE_URL)
+    label.add_argument("--client", default="tongyi", choices=["tongyi", "compatible"],
+                       help="langchain Tongyi, or plain HTTP to the compatible-mode --base-url")
+    label.add_argument("--api-key", help="DashScope key (default: $TONGYI_API_KEY / $DASHSCOPE_API_KEY)")
+    label.add_argument("--routes", help="JSON file of keys/endpoints/models to balance over (replaces "
+                                        "--model/--base-url/--client, see router.py)")
+    label.add_argument("--default-label", default=DEFAULT_LABEL)
+    label.add_argument("--label-aliases",
+                       help='JSON file of extra label names, e.g. {"模糊测试": "3.8.1"}')
+    label.add_argument("--no-reask", action="store_true",
+                       help="store an answer's unknown label as the default label instead of asking again")
+    label.add_argument("--concurrency", type=int, default=16)
+    label.add_argument("--qps", type=float, default=10, help="request rate limit (0 disables)")
+    label.add_argument("--tpm", type=float, default=1000000, help="tokens-per-minute limit (0 disables)")
+    label.add_argument("--cache", default="llm_cache.sqlite3", help="response cache file ('' disables)")
+    label.add_argument("--cache-max-age-days", type=float, default=90)
+    label.add_argument("--cache-only", action="store_true",
+                       help="never call the API; label only papers whose answers are cached")
+    label.add_argument("--two-stage", action="store_true", help="domain first, then that domain's labels")
+    label.add_argument("--batch-size", type=int, default=1, help="papers per request")
+    label.add_argument("--stream", action="store_true",
+                       help="stream answers and close each one as soon as its label has arrived")
+    label.add_argument("--max-output-tokens", type=int, default=MAX_OUTPUT_TOKENS,
+                       help="with --stream, cut answers at this many tokens (0 disables)")
+    label.add_argument("--fulltext", help="PDF store from 'python -m paper_analysis.fulltext fetch'; adds "
+                                          "introduction/conclusion excerpts to the prompts")
+    label.add_argument("--fulltext-chars", type=int, default=3000, help="excerpt characters per paper")
+    label.add_argument("--preclassifier", help="local model from 'python -m paper_analysis.preclassifier train'")
+    label.add_argument("--preclassifier-threshold", type=float, default=0.5)
+    label.add_argument("--dedup", action="store_true",
+                       help="label each paper once across all inputs; duplicates reuse its label")
+    label.add_argument("--dedup-threshold", type=float, default=0.8, help="title similarity for --dedup")
+    label.add_argument("--dry-run", action="store_true", help="report what would be labeled and exit")
+    label.add_argument("--stats", action="store_true", help="report journal and usage statistics and exit")
+    label.add_argument("--max-retries", type=int,
+                       help="cap on retries per API call (default: per error class, see retry.py)")
+    label.add_argument("--breaker-threshold", type=int, default=10,
+                       help="consecutive failed calls that pause the run (0 disables)")
+    label.add_argument("--breaker-cooldown", type=float, default=30, help="first pause in seconds")
+    label.add_argument("--retry-failures", action="store_true",
+                       help="re-label only the papers that failed in earlier runs and patch the outputs")
+    label.add_argument("--metrics", help="JSON summary of stage timings, tokens and errors of the run")
+    label.add_argument("--prometheus", help="also write them as a Prometheus textfile (*.prom)")
+    if config:
+        # Config values replace the defaults, so explicit flags still win
+        label.set_defaults(**config)
+    return parser
+
+
+def parse_args(argv=None):
+    pre = argparse.ArgumentParser(add_help=False)
+    pre.add_argument("--config")
+    known, _ = pre.parse_known_args(argv)
+    config = None
+    if known.config:
+        with open(known.config, "r", encoding="utf-8") as file:
+            config = json.load(file)
+    return build_parser(config).parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "label":
+        session = LabelingSession(args)
+        try:
+            for input_path in args.inputs:
+                label_file(session, input_path)
+        finally:
+            session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,469 @@
+# Columnar paper store.
+#
+# Collected and labeled papers live in datas/ as pretty-printed JSON arrays,
+# so a question like "how many SP24 papers per theme_label" means parsing a
+# whole file. `convert` writes them once into a columnar store partitioned
+# by venue and year, one directory per (input file, year). Papers of a file
+# without years (usenix_papers_keywords_v2.json) take the year of the same
+# paper in another input, such as the raw usenix24_papers.json:
+#
+#   <store>/venue=sp/year=2024/SP24_papers_keywords/
+#       meta.json                         row count, source, dictionaries
+#       title.offsets.npy + title.bin     text column: int64 offsets + UTF-8 blob
+#       theme_label.npy                   int32 codes into the theme_label dictionary
+#       keyword_terms.offsets.npy + .npy  keyword codes per paper (CSR)
+#       paper_id.npy                      uint64 stable_id of each paper
+#
+# `query` prunes partitions by directory name, then parts whose dictionaries
+# cannot match the label/keyword filter, memory-maps only the columns it
+# needs and decodes text only for the selected rows. A paper stored by
+# several inputs of a venue is counted once, preferably from a labeled part.
+#
+#   python -m paper_analysis.columnar convert datas/*.json -o datas/columnar
+#   python -m paper_analysis.columnar query datas/columnar --venue sp --year 2024 --count-by theme_label
+#   python -m paper_analysis.columnar query datas/columnar --keyword fuzz --show venue,year,title
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+
+import numpy as np
+
+from .dedup import load_papers
+from .parsing import keyword_terms
+from .sources import detect_adapter, stable_id
+
+TEXT_COLUMNS = ('title', 'authors', 'abstract', 'keywords', 'doi', 'pdf_link')
+GROUP_COLUMNS = ('venue', 'year', 'theme_label', 'keyword')
+# Bump when the on-disk layout changes so stale parts are rewritten
+FORMAT_VERSION = 2
+UNKNOWN_YEAR = "unknown"
+
+_VENUE_RE = re.compile(r'[a-z]+')
+_YEAR_RE = re.compile(r'(?<!\d)(20\d{2}|\d{2})(?!\d)')
+
+
+def venue_and_year(path):
+    """'CCS24_papers_keywords.json' -> ('ccs', '2024'); 'usenix_papers.json' -> ('usenix', None)."""
+    stem = os.path.splitext(os.path.basename(path))[0].lower()
+    venue = _VENUE_RE.search(stem)
+    year = _YEAR_RE.search(stem)
+    if year and len(year.group(1)) == 2:
+        return (venue.group(0) if venue else stem), "20" + year.group(1)
+    return (venue.group(0) if venue else stem), (year.group(1) if year else None)
+
+
+def parse_year_options(values):
+    """
+    --year values -> (fallback year, {file name: year}). "2024" is the year of
+    papers without one in inputs whose file names carry none (usenix_papers.json);
+    "usenix_papers_keywords_v2.json=2024" sets the year of one input.
+    """
+    fallback, file_years = None, {}
+    for value in values or ():
+        name, _, year = value.rpartition("=")
+        if not year.isdigit():
+            raise ValueError(f"--year {value!r}: expected YEAR or FILE=YEAR")
+        if name:
+            file_years[os.path.basename(name)] = year
+        else:
+            fallback = year
+    return fallback, file_years
+
+
+def input_year(path, year=None, file_years=None):
+    """Year of the papers of `path` that carry none: its FILE=YEAR option, its file name, else `year`."""
+    return (file_years or {}).get(os.path.basename(path)) or venue_and_year(path)[1] or year
+
+
+def covered_by_full_output(path):
+    """True for a *_keywords_only output whose full *_keywords output (a superset) exists."""
+    full = path.replace("_keywords_only", "_keywords")
+    return full != path and os.path.exists(full)
+
+
+def paper_rows(path, default_year=None):
+    """Source-independent rows of one raw or labeled collection."""
+    for paper in load_papers(path):
+        row = detect_adapter(paper).common(paper)
+        if isinstance(paper.get('authors'), list):
+            row['authors'] = "; ".join(paper['authors'])
+        row['year'] = row['year'] or str(paper.get('pub_year') or default_year or UNKNOWN_YEAR)
+        row['keywords'] = paper.get('keywords') or ''
+        row['theme_label'] = paper.get('theme_label')
+        row['paper_id'] = stable_id(row['doi'], row['title'])
+        yield row
+
+
+def _write_text(part_dir, column, values):
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    np.save(os.path.join(part_dir, f"{column}.offsets.npy"), offsets)
+    with open(os.path.join(part_dir, f"{column}.bin"), 'wb') as file:
+        file.write(b"".join(encoded))
+
+
+def write_part(part_dir, rows, meta):
+    """Write one partition directory for `rows` (all of the same venue and year)."""
+    tmp_dir = part_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for column in TEXT_COLUMNS:
+        _write_text(tmp_dir, column, [str(row.get(column) or '') for row in rows])
+
+    dictionaries = {}
+    meta['labeled'] = any(row['theme_label'] is not None for row in rows)
+    if meta['labeled']:
+        labels = sorted({row['theme_label'] or '' for row in rows})
+        codes = {label: i for i, label in enumerate(labels)}
+        np.save(os.path.join(tmp_dir, "theme_label.npy"),
+                np.array([codes[row['theme_label'] or ''] for row in rows], dtype=np.int32))
+        dictionaries['theme_label'] = labels
+
+    per_row = [keyword_terms(row['keywords']) for row in rows]
+    terms = sorted({term for row_terms in per_row for term in row_terms})
+    codes = {term: i for i, term in enumerate(terms)}
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum([len(row_terms) for row_terms in per_row], out=offsets[1:])
+    np.save(os.path.join(tmp_dir, "keyword_terms.offsets.npy"), offsets)
+    np.save(os.path.join(tmp_dir, "keyword_terms.npy"),
+            np.array([codes[term] for row_terms in per_row for term in row_terms], dtype=np.int32))
+    dictionaries['keyword_terms'] = terms
+    np.save(os.path.join(tmp_dir, "paper_id.npy"),
+            np.array([int(row['paper_id'], 16) for row in rows], dtype=np.uint64))
+
+    meta.update(rows=len(rows), format_version=FORMAT_VERSION, dictionaries=dictionaries)
+    with open(os.path.join(tmp_dir, "meta.json"), 'w', encoding='utf-8') as file:
+        json.dump(meta, file, ensure_ascii=False)
+    shutil.rmtree(part_dir, ignore_errors=True)
+    os.replace(tmp_dir, part_dir)
+
+
+def _load_manifest(store):
+    try:
+        with open(os.path.join(store, "manifest.json"), 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def _save_manifest(store, manifest):
+    tmp_path = os.path.join(store, "manifest.json.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(store, "manifest.json"))
+
+
+def known_years(paths, file_years=None):
+    """{paper_id: year} of the papers in `paths` whose year the papers or the file names give."""
+    years = {}
+    for path in paths:
+        for row in paper_rows(path, default_year=input_year(path, None, file_years)):
+            if row['year'] != UNKNOWN_YEAR:
+                years.setdefault(row['paper_id'], row['year'])
+    return years
+
+
+def convert(paths, store, venue=None, year=None, file_years=None):
+    """
+    Convert collections into `store`. Papers without a year take it from
+    input_year(path, file_years=file_years), else from the same paper in
+    another of `paths`, else `year`. Inputs whose content, years and layout
+    version are unchanged since the last conversion are skipped. Yields
+    (path, written part count or None when unchanged; 0 for a keywords-only
+    output whose full output exists).
+    """
+    from .wos import file_hash  # pulls in pandas, which queries do not need
+
+    os.makedirs(store, exist_ok=True)
+    manifest = _load_manifest(store)
+    digests = {path: file_hash(path) for path in paths if not covered_by_full_output(path)}
+    # Borrowed years depend on all inputs, so a file that borrowed is rebuilt when they change
+    batch = hashlib.sha256(json.dumps(sorted((os.path.abspath(path), digest)
+                                             for path, digest in digests.items())).encode()).hexdigest()
+    borrowed = None
+    for path in paths:
+        if path not in digests:
+            yield path, 0
+            continue
+        default_year = input_year(path, None, file_years)
+        years = {'default_year': default_year, 'fallback_year': year}
+        entry = manifest.get(os.path.abspath(path))
+        if (entry and entry['sha256'] == digests[path] and entry['format_version'] == FORMAT_VERSION
+                and entry['years'] == years and entry['year_sources'] in (None, batch)):
+            yield path, None
+            continue
+
+        file_venue = venue or venue_and_year(path)[0]
+        stem = os.path.splitext(os.path.basename(path))[0]
+        rows = list(paper_rows(path, default_year=default_year))
+        year_sources = None
+        if any(row['year'] == UNKNOWN_YEAR for row in rows):
+            if borrowed is None:
+                borrowed = known_years(digests, file_years)
+            year_sources = batch
+            for row in rows:
+                if row['year'] == UNKNOWN_YEAR:
+                    row['year'] = borrowed.get(row['paper_id']) or year or UNKNOWN_YEAR
+        partitions = {}
+        for row in rows:
+            partitions.setdefault(row['year'], []).append(row)
+
+        for old in (entry or {}).get('parts', []):
+            shutil.rmtree(os.path.join(store, old), ignore_errors=True)
+        parts = []
+        for row_year, rows in sorted(partitions.items()):
+            part = os.path.join(f"venue={file_venue}", f"year={row_year}", stem)
+            write_part(os.path.join(store, part), rows,
+                       {'source_file': os.path.basename(path), 'venue': file_venue, 'year': row_year})
+            parts.append(part)
+        manifest[os.path.abspath(path)] = {'sha256': digests[path], 'format_version': FORMAT_VERSION,
+                                           'years': years, 'year_sources': year_sources, 'parts': parts}
+        _save_manifest(store, manifest)
+        yield path, len(parts)
+
+
+class Part:
+    """Read-only, memory-mapped view of one partition directory."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), 'r', encoding='utf-8') as file:
+            self.meta = json.load(file)
+        self.rows = self.meta['rows']
+        self.dictionaries = self.meta['dictionaries']
+        # Rows whose paper is counted in another part (see iter_parts)
+        self.duplicate = np.zeros(self.rows, dtype=bool)
+
+    def _array(self, name):
+        return np.load(os.path.join(self.path, name), mmap_mode='r')
+
+    def text(self, column, rows):
+        """Decode `column` for the given row positions only."""
+        offsets = self._array(f"{column}.offsets.npy")
+        blob_path = os.path.join(self.path, f"{column}.bin")
+        if os.path.getsize(blob_path) == 0:
+            return [''] * len(rows)
+        blob = np.memmap(blob_path, dtype=np.uint8, mode='r')
+        return [blob[offsets[i]:offsets[i + 1]].tobytes().decode('utf-8') for i in rows]
+
+    def label_codes(self):
+        return self._array("theme_label.npy")
+
+    def paper_ids(self):
+        return self._array("paper_id.npy")
+
+    def keyword_codes(self):
+        """(offsets, codes) of the per-paper keyword terms."""
+        return self._array("keyword_terms.offsets.npy"), self._array("keyword_terms.npy")
+
+    def matching_codes(self, dictionary, needle):
+        needle = needle.lower()
+        return np.array([i for i, value in enumerate(self.dictionaries.get(dictionary, []))
+                         if needle in value.lower()], dtype=np.int32)
+
+
+def _partition_value(name, key):
+    prefix = f"{key}="
+    return name[len(prefix):] if name.startswith(prefix) else None
+
+
+def mark_duplicates(parts):
+    """
+    Set `part.duplicate` on rows whose paper is already in a preferred part
+    (labeled first, then with a known year) or earlier in the same part.
+    """
+    seen = np.empty(0, dtype=np.uint64)
+    for part in sorted(parts, key=lambda part: (not part.meta['labeled'], part.meta['year'] == UNKNOWN_YEAR)):
+        ids = np.asarray(part.paper_ids())
+        first = np.zeros(len(ids), dtype=bool)
+        first[np.unique(ids, return_index=True)[1]] = True
+        part.duplicate = ~first | np.isin(ids, seen)
+        seen = np.concatenate([seen, ids])
+
+
+def iter_parts(store, venue=None, year=None, kind="all"):
+    """
+    Parts of the store, pruned by the venue= directory names before anything
+    is read. A paper in several parts of a venue (a raw collection and its
+    labeled output, two crawls of one conference) is kept in one of them and
+    marked as duplicate in the others, whatever their year partitions; parts
+    with nothing left and parts of other years are not yielded.
+    """
+    for venue_dir in sorted(os.listdir(store)):
+        value = _partition_value(venue_dir, "venue")
+        if value is None or (venue and value != venue.lower()):
+            continue
+        parts = []
+        for year_dir in sorted(os.listdir(os.path.join(store, venue_dir))):
+            if _partition_value(year_dir, "year") is None:
+                continue
+            base = os.path.join(store, venue_dir, year_dir)
+            parts += [Part(os.path.join(base, name)) for name in sorted(os.listdir(base))
+                      if not name.endswith(".tmp")]
+        if kind != "all":
+            parts = [part for part in parts if (kind == "labeled") == part.meta['labeled']]
+        mark_duplicates(parts)
+        for part in parts:
+            if (not year or part.meta['year'] == str(year)) and not part.duplicate.all():
+                yield part
+
+
+def select(part, label=None, keyword=None):
+    """Row positions of `part` matching the filters, or None when the part cannot match."""
+    mask = ~part.duplicate
+    if label:
+        codes = part.matching_codes('theme_label', label)
+        if not part.meta['labeled'] or not len(codes):
+            return None
+        mask &= np.isin(part.label_codes(), codes)
+    if keyword:
+        codes = part.matching_codes('keyword_terms', keyword)
+        if not len(codes):
+            return None
+        offsets, terms = part.keyword_codes()
+        owners = np.repeat(np.arange(part.rows), np.diff(offsets))
+        mask &= np.bincount(owners[np.isin(terms, codes)], minlength=part.rows) > 0
+    return np.flatnonzero(mask)
+
+
+def _column_values(part, column, rows):
+    if column in ('venue', 'year'):
+        return [part.meta[column]] * len(rows)
+    if column == 'theme_label':
+        if not part.meta['labeled']:
+            return [''] * len(rows)
+        labels = part.dictionaries['theme_label']
+        return [labels[code] for code in part.label_codes()[rows]]
+    if column == 'keyword_terms':
+        offsets, codes = part.keyword_codes()
+        terms = part.dictionaries['keyword_terms']
+        return ["; ".join(terms[c] for c in codes[offsets[i]:offsets[i + 1]]) for i in rows]
+    return part.text(column, rows)
+
+
+def _group_codes(part, column, rows):
+    """(int codes, lookup list) of a group column for the given rows."""
+    if column in ('venue', 'year'):
+        return np.zeros(len(rows), dtype=np.int32), [part.meta[column]]
+    if not part.meta['labeled']:
+        return np.zeros(len(rows), dtype=np.int32), ['']
+    return np.asarray(part.label_codes())[rows], part.dictionaries['theme_label']
+
+
+def count_by(parts_and_rows, columns):
+    """{(value, ...): paper count} over the selected rows; 'keyword' counts each term of a paper."""
+    counts = {}
+    for part, rows in parts_and_rows:
+        keyword_codes = None
+        if 'keyword' in columns:
+            # One entry per (paper, keyword term) of the selected papers
+            offsets, codes = part.keyword_codes()
+            selected = np.zeros(part.rows, dtype=bool)
+            selected[rows] = True
+            owners = np.repeat(np.arange(part.rows), np.diff(offsets))
+            entries = np.flatnonzero(selected[owners])
+            rows, keyword_codes = owners[entries], np.asarray(codes)[entries]
+        groups = [(keyword_codes, part.dictionaries['keyword_terms']) if column == 'keyword'
+                  else _group_codes(part, column, rows) for column in columns]
+        if not len(rows):
+            continue
+        keys, group_counts = np.unique(np.stack([codes for codes, _ in groups], axis=1), axis=0,
+                                       return_counts=True)
+        for key, count in zip(keys, group_counts):
+            key = tuple(lookup[code] for code, (_, lookup) in zip(key, groups))
+            counts[key] = counts.get(key, 0) + int(count)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Columnar store of the collected and labeled papers.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = commands.add_parser("convert", help="convert JSON collections into the store")
+    convert_parser.add_argument("inputs", nargs="+", help="raw or labeled paper JSON files")
+    convert_parser.add_argument("-o", "--store", default="datas/columnar")
+    convert_parser.add_argument("--venue", help="venue for all inputs (default: from the file name)")
+    convert_parser.add_argument("--year", action="append",
+                                help="YEAR of papers without one that no other input dates, "
+                                     "or FILE=YEAR for one input (repeatable)")
+
+    query_parser = commands.add_parser("query", help="filter and aggregate the store")
+    query_parser.add_argument("store", nargs="?", default="datas/columnar")
+    query_parser.add_argument("--venue", "--source", dest="venue")
+    query_parser.add_argument("--year")
+    query_parser.add_argument("--label", help="theme_label substring, e.g. 漏洞挖掘 or 3.8.1")
+    query_parser.add_argument("--keyword", help="LLM keyword substring, e.g. fuzz or 模糊测试")
+    query_parser.add_argument("--kind", choices=["auto", "all", "labeled", "raw"], default="auto",
+                              help="labeled outputs, raw collections or all papers, each once, from a "
+                                   "labeled output where there is one (auto: labeled outputs when "
+                                   "filtering or counting by label/keyword, else all)")
+    query_parser.add_argument("--count-by", help=f"comma-separated of {', '.join(GROUP_COLUMNS)}")
+    query_parser.add_argument("--show", default="venue,year,theme_label,title",
+                              help=f"columns to print: {', '.join(('venue', 'year', 'theme_label', 'keyword_terms') + TEXT_COLUMNS)}")
+    query_parser.add_argument("--limit", type=int, default=20)
+    query_parser.add_argument("--json", action="store_true", help="print JSON lines")
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        try:
+            year, file_years = parse_year_options(args.year)
+        except ValueError as error:
+            parser.error(str(error))
+        for path, parts in convert(args.inputs, args.store, args.venue, year, file_years):
+            if parts is None:
+                print(f"{path}: unchanged")
+            elif parts == 0:
+                print(f"{path}: skipped, covered by the full *_keywords output")
+            else:
+                print(f"{path}: {parts} partition(s) written")
+        return
+
+    kind = args.kind
+    if kind == "auto":
+        # Label and keyword questions are about the labeled outputs only
+        by_label = args.count_by and re.search(r'theme_label|keyword', args.count_by)
+        kind = "labeled" if args.label or args.keyword or by_label else "all"
+    selected = []
+    for part in iter_parts(args.store, args.venue, args.year, kind):
+        rows = select(part, args.label, args.keyword)
+        if rows is not None and len(rows):
+            selected.append((part, rows))
+    total = sum(len(rows) for _, rows in selected)
+
+    if args.count_by:
+        columns = [column.strip() for column in args.count_by.split(",")]
+        unknown = [column for column in columns if column not in GROUP_COLUMNS]
+        if unknown:
+            parser.error(f"cannot count by {', '.join(unknown)}")
+        counts = sorted(count_by(selected, columns).items(), key=lambda kv: (-kv[1], kv[0]))
+        for key, count in counts[:args.limit] if args.limit else counts:
+            if args.json:
+                print(json.dumps(dict(zip(columns, key), count=count), ensure_ascii=False))
+            else:
+                print(f"{count:6d}  " + " | ".join(key))
+        print(f"{total} papers, {len(counts)} groups")
+        return
+
+    columns = [column.strip() for column in args.show.split(",")]
+    shown = 0
+    for part, rows in selected:
+        rows = rows[:args.limit - shown] if args.limit else rows
+        values = [_column_values(part, column, rows) for column in columns]
+        for record in zip(*values):
+            if args.json:
+                print(json.dumps(dict(zip(columns, record)), ensure_ascii=False))
+            else:
+                print(" | ".join(record))
+        shown += len(rows)
+        if args.limit and shown >= args.limit:
+            break
+    print(f"{total} papers matched")
+
+
+if __name__ == "__main__":
+    main()
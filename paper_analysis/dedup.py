@@ -0,0 +1,188 @@
+# Cross-source paper deduplication.
+#
+# The same paper shows up in several collections (usenix_papers.json vs
+# usenix24_papers.json, ccs2023_publications.json vs the WoS CCS export,
+# ...). Papers are matched on their normalized DOI, and on the MinHash
+# signature of their normalized title with LSH banding, so near-duplicate
+# titles are found without comparing every pair. Each cluster becomes one
+# canonical record with a stable ID derived from its DOI (or title).
+#
+#   python -m paper_analysis.dedup datas/usenix_papers.json datas/usenix24_papers.json \
+#       datas/ccs2023_publications.json datas/CCS24.json -o datas/canonical_papers.json
+
+import argparse
+import json
+import zlib
+
+import numpy as np
+
+from .journal import iter_papers
+from .sources import detect_adapter, normalize_doi, normalize_title, stable_id
+
+
+def shingles(normalized_title, size=3):
+    text = normalized_title
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class MinHasher:
+    """MinHash signatures with multiply-shift hashing over CRC32 shingle hashes."""
+
+    def __init__(self, num_perm=64, seed=1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set):
+        x = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingle_set), dtype=np.uint64,
+                        count=len(shingle_set))
+        # uint64 arithmetic wraps, which is exactly the multiply-shift scheme
+        hashed = (self.a[:, None] * x[None, :] + self.b[:, None]) >> np.uint64(32)
+        return hashed.min(axis=1)
+
+
+class DedupIndex:
+    """
+    Incremental duplicate index. `add` returns the position of the first
+    paper (in insertion order) of the cluster the new paper joins.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=64, bands=16):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self._parent = []
+        self._cluster_dois = {}
+        self._shingles = []
+        self._by_doi = {}
+        self._buckets = {}
+        self.doi_matches = 0
+        self.title_matches = 0
+
+    def __len__(self):
+        return len(self._parent)
+
+    def find(self, i):
+        root = i
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while self._parent[i] != root:
+            self._parent[i], i = root, self._parent[i]
+        return root
+
+    def _union(self, i, j):
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            # The earliest paper stays the representative
+            root, child = min(ri, rj), max(ri, rj)
+            self._parent[child] = root
+            self._cluster_dois[root] |= self._cluster_dois.pop(child)
+
+    def _compatible(self, i, j):
+        # Two different DOIs are two different papers, however similar the titles
+        di, dj = self._cluster_dois[self.find(i)], self._cluster_dois[self.find(j)]
+        return not di or not dj or bool(di & dj)
+
+    def add(self, title, doi=''):
+        i = len(self._parent)
+        self._parent.append(i)
+        doi = normalize_doi(doi)
+        self._cluster_dois[i] = {doi} if doi else set()
+        shingle_set = shingles(normalize_title(title))
+        self._shingles.append(shingle_set)
+
+        if doi:
+            if doi in self._by_doi:
+                self._union(i, self._by_doi[doi])
+                self.doi_matches += 1
+            else:
+                self._by_doi[doi] = i
+
+        if shingle_set:
+            signature = self.hasher.signature(shingle_set)
+            candidates = set()
+            for band in range(self.bands):
+                key = (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                bucket = self._buckets.setdefault(key, [])
+                candidates.update(bucket)
+                bucket.append(i)
+            for j in sorted(candidates):
+                if self.find(j) == self.find(i) or not self._compatible(i, j):
+                    continue
+                other = self._shingles[j]
+                if len(shingle_set & other) / len(shingle_set | other) >= self.threshold:
+                    self._union(i, j)
+                    self.title_matches += 1
+        return self.find(i)
+
+    def clusters(self):
+        """{representative position: [member positions]} in insertion order."""
+        groups = {}
+        for i in range(len(self._parent)):
+            groups.setdefault(self.find(i), []).append(i)
+        return groups
+
+
+def load_papers(path):
+    """Papers of one collection: a JSON array, or an object with a 'publications' list."""
+    return list(iter_papers(path))
+
+
+def canonical_record(members):
+    """
+    Merge the common-field dicts of one cluster: every field comes from the
+    first member that has it, the abstract from the longest one.
+    """
+    record = {}
+    for field in ('title', 'authors', 'doi', 'year', 'pdf_link'):
+        record[field] = next((m[field] for m in members if m[field]), '')
+    record['abstract'] = max((m['abstract'] for m in members), key=len, default='')
+    record['doi'] = normalize_doi(record['doi']) or record['doi']
+    record['id'] = stable_id(record['doi'], record['title'])
+    record['sources'] = [m['source'] for m in members]
+    return record
+
+
+def build_index(paths, threshold=0.8):
+    """Index every paper of `paths`. Returns (index, common-field dicts in insertion order)."""
+    index = DedupIndex(threshold=threshold)
+    papers = []
+    for path in paths:
+        for i, paper in enumerate(load_papers(path)):
+            common = detect_adapter(paper).common(paper)
+            common['source'] = f"{path}#{i}"
+            index.add(common['title'], common['doi'])
+            papers.append(common)
+    return index, papers
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge paper collections into one record per paper.")
+    parser.add_argument("inputs", nargs="+", help="paper JSON files (any source layout)")
+    parser.add_argument("-o", "--output", default="canonical_papers.json")
+    parser.add_argument("--threshold", type=float, default=0.8,
+                        help="title shingle Jaccard similarity that counts as the same paper")
+    args = parser.parse_args(argv)
+
+    index, papers = build_index(args.inputs, args.threshold)
+    clusters = index.clusters()
+    records = []
+    for members in clusters.values():
+        record = canonical_record([papers[i] for i in members])
+        # Keep the field order of the other collections, then the merge metadata
+        records.append({field: record[field] for field in
+                        ('id', 'title', 'authors', 'abstract', 'doi', 'year', 'pdf_link', 'sources')})
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(records, f, ensure_ascii=False, indent=4)
+
+    duplicates = len(papers) - len(clusters)
+    print(f"{len(papers)} papers -> {len(clusters)} unique ({duplicates} duplicates; "
+          f"{index.doi_matches} DOI matches, {index.title_matches} title matches)")
+    print(f"Canonical records saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
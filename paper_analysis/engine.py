@@ -0,0 +1,528 @@
+# Concurrent labeling engine.
+#
+# Papers are labeled with `chain.ainvoke` under a concurrency limit and a
+# token-bucket rate limiter (DashScope enforces both a QPS/RPM and a TPM
+# quota). Results are returned in input order so the callers can keep
+# building `papers_data` / `papers_keywords_only` exactly as before.
+# With streaming=True answers are read with `chain.astream` and closed as
+# soon as the keyword lines and the label are in, or at max_output_tokens.
+# Every label is resolved against the taxonomy; one that is not in it gets
+# a label-only re-ask (reask_chain) instead of being stored as written.
+# Behind a Router with an escalation tier, an unparseable or low-confidence
+# single-shot answer is first asked again of the bigger model.
+
+import asyncio
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tqdm import tqdm
+
+from .cache import CacheMiss
+from .llm import LABEL_PROMPT_TEMPLATE, MAX_OUTPUT_TOKENS, ROUTE_SERVED_KEY, ROUTE_TIER_KEY
+from .metrics import NULL_METRICS
+from .parsing import FAILED_EMPTY, StreamingLabelParser, first_line, keyword_terms, split_label_response
+from .retry import classify_error, retry_after
+from .taxonomy import cached_taxonomy
+
+MISSING_ABSTRACT = 'No Abstract Provided'
+FAILED_NO_ABSTRACT = "关键词提取失败 (无摘要)"
+FAILED_API = "关键词提取失败 (API错误)"
+FAILED_UNKNOWN = "关键词提取失败 (未知错误)"
+
+# Rough output size of one answer (3 keyword lines + label), used when
+# reserving TPM budget before the call is made.
+OUTPUT_TOKEN_ESTIMATE = 200
+
+_CJK_RE = re.compile(r'[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]')
+
+
+def estimate_tokens(text):
+    """
+    Cheap token estimate: one token per CJK character, ~4 characters per
+    token for everything else. Good enough for quota accounting.
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def cache_key(cache, template, inputs, labels, tier=None, model=None):
+    """
+    Response cache key of one call. The full labels.txt is already part of
+    the cache's own key. Routed calls add the tier and the model that
+    answered, so tiers never share answers and a route change invalidates them.
+    """
+    parts = [inputs[k] for k in sorted(inputs) if not (k == "labels" and inputs[k] == labels)]
+    if model is not None:
+        parts += [f"{ROUTE_TIER_KEY}={tier}", f"model={model}"]
+    return cache.make_key(template, *parts)
+
+
+async def finish_asyncgen_closes(timeout=5.0):
+    """
+    Wait for the loop's pending async generator finalizers. A stream closed
+    early leaves langchain's inner generators to the loop, which closes each
+    in a task of its own; finishing them here keeps them from racing
+    asyncio.run's teardown ("aclose(): asynchronous generator is already running").
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        # One closed generator can release the next, so look again after every round
+        await asyncio.sleep(0)
+        closing = [task for task in asyncio.all_tasks()
+                   if type(task.get_coro()).__name__ == 'async_generator_athrow']
+        if not closing:
+            return
+        await asyncio.wait(closing, timeout=max(0.0, deadline - time.monotonic()))
+
+
+class TokenBucket:
+    """
+    Async token bucket. `rate` tokens are added per second up to `capacity`;
+    `acquire(n)` waits until n tokens are available. Waiters are served in
+    FIFO order because the lock is held while sleeping.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount=1.0):
+        # A request larger than the bucket could otherwise never be served
+        amount = min(float(amount), self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+
+
+class RateLimiter:
+    """
+    Combined request-rate (QPS) and token-rate (TPM) limiter. Either limit
+    may be None to disable it.
+    """
+
+    def __init__(self, qps=None, tpm=None):
+        # One second of burst for requests, ten seconds for tokens
+        self.requests = TokenBucket(qps, capacity=max(1.0, qps)) if qps else None
+        self.tokens = TokenBucket(tpm / 60.0, capacity=tpm / 6.0) if tpm else None
+
+    async def acquire(self, tokens):
+        if self.requests is not None:
+            await self.requests.acquire(1)
+        if self.tokens is not None:
+            await self.tokens.acquire(tokens)
+
+
+class LabelingEngine:
+    """
+    Labels papers concurrently with an LCEL chain
+    (`prompt | llm | StrOutputParser()`).
+
+    Each result is a dict with 'keywords' and 'theme_label', using the same
+    failure markers as the original sequential loop.
+    """
+
+    def __init__(self, chain, labels, default_label, concurrency=8, qps=None, tpm=None,
+                 prompt_template=None, cache=None, two_stage=None, batcher=None,
+                 preclassifier=None, preclassifier_threshold=0.5, cache_only=False, metrics=None,
+                 retry_policy=None, breaker=None, streaming=False, max_output_tokens=MAX_OUTPUT_TOKENS,
+                 reask_chain=None, router=None):
+        self.chain = chain
+        self.labels = labels
+        self.default_label = default_label
+        self.concurrency = max(1, int(concurrency))
+        self.limiter = RateLimiter(qps, tpm)
+        self.prompt_template = prompt_template or ""
+        # Optional ResponseCache consulted before every API call
+        self.cache = cache
+        # Optional TwoStageClassifier used instead of the single-shot chain
+        self.two_stage = two_stage
+        # Optional BatchLabeler packing several papers into one request
+        self.batcher = batcher
+        # Optional local PreClassifier; confident papers never reach the LLM
+        self.preclassifier = preclassifier
+        self.preclassifier_threshold = preclassifier_threshold
+        # Never call the API; papers without cached answers are left unlabeled (None)
+        self.cache_only = cache_only
+        # Stage timings, outcomes and errors (see metrics.py); a no-op unless enabled
+        self.metrics = metrics or NULL_METRICS
+        # Optional RetryPolicy and CircuitBreaker (retry.py) around every API call
+        self.retry_policy = retry_policy
+        self.breaker = breaker
+        # Stream answers and stop at the label; a streamed answer is cut at max_output_tokens
+        self.streaming = streaming
+        self.max_output_tokens = max_output_tokens
+        # Optional label-only chain (LABEL_PROMPT_TEMPLATE) for answers with an unknown label
+        self.reask_chain = reask_chain
+        self.taxonomy = cached_taxonomy(labels)
+        # Optional Router (router.py); with an escalate_to tier weak answers are re-sent there
+        self.router = router
+
+    def _result(self, keywords_output, theme_label, usage, error=None):
+        result = {'keywords': keywords_output, 'theme_label': theme_label, 'usage': usage}
+        if error is not None:
+            # Why the API call failed after its retries, for the failure queue
+            result['error'] = error
+        return result
+
+    @staticmethod
+    def _error_info(exc):
+        return {'class': classify_error(exc), 'message': str(exc)[:500],
+                'attempts': getattr(exc, 'attempts', 1)}
+
+    @staticmethod
+    def _new_usage(baseline_input_tokens=0):
+        # Estimated prompt/answer tokens, API latency and call counts for one
+        # paper; baseline_input_tokens is what the single-shot prompt costs.
+        return {
+            'input_tokens': 0,
+            'output_tokens': 0,
+            'baseline_input_tokens': baseline_input_tokens,
+            'api_calls': 0,
+            'cached_calls': 0,
+            'local_labels': 0,
+            'escalations': 0,
+            'latency': 0.0,
+            # Streamed calls only: seconds to the first answer token and to the complete label
+            'streamed_calls': 0,
+            'ttft': 0.0,
+            'time_to_label': 0.0,
+        }
+
+    def _baseline_tokens(self, title, abstract):
+        return self._prompt_tokens(
+            self.prompt_template, {"title": title, "abstract": abstract, "labels": self.labels})
+
+    def _local_label(self, title, abstract):
+        """Result from the local pre-classifier, or None if it is not confident."""
+        if self.preclassifier is None:
+            return None
+        theme_label, confidence = self.preclassifier.predict(title, abstract)
+        if confidence < self.preclassifier_threshold:
+            return None
+        usage = self._new_usage(self._baseline_tokens(title, abstract))
+        usage['local_labels'] = 1
+        return self._result(self.preclassifier.keywords(title, abstract), theme_label, usage)
+
+    async def _label_one(self, semaphore, title, abstract):
+        usage = self._new_usage(self._baseline_tokens(title, abstract))
+        if not abstract or abstract == MISSING_ABSTRACT:
+            print(f"Skipping paper '{title}' due to missing abstract.")
+            return self._result(FAILED_NO_ABSTRACT, self.default_label, usage)
+
+        local = self._local_label(title, abstract)
+        if local is not None:
+            return local
+
+        try:
+            if self.two_stage is not None:
+                keywords_output, theme_label = await self.two_stage.classify(
+                    self, semaphore, title, abstract, usage)
+            else:
+                response = await self._invoke(
+                    semaphore, self.chain, self.prompt_template,
+                    {"title": title, "abstract": abstract, "labels": self.labels}, usage,
+                    answer_parser=lambda: StreamingLabelParser(self.labels))
+                with self.metrics.stage("parse"):
+                    keywords_output, label_line = split_label_response(response, self.labels, title)
+                reason = self._escalation_reason(keywords_output, label_line)
+                if reason is not None:
+                    self.metrics.count("escalations", reason)
+                    usage['escalations'] += 1
+                    response = await self._invoke(
+                        semaphore, self.chain, self.prompt_template,
+                        {"title": title, "abstract": abstract, "labels": self.labels}, usage,
+                        answer_parser=lambda: StreamingLabelParser(self.labels), tier=self.router.escalate_to)
+                    with self.metrics.stage("parse"):
+                        keywords_output, label_line = split_label_response(response, self.labels, title)
+                theme_label = await self._theme_label(semaphore, title, keywords_output, label_line, usage)
+        except CacheMiss:
+            return None
+        except ValueError as ve:  # Catch the specific ValueError from the API if it happens here
+            self.metrics.count("exceptions", type(ve).__name__)
+            print(f"API Error for paper '{title}': {ve}")
+            print("This might indicate the streaming requirement is still not met.")
+            return self._result(FAILED_API, self.default_label, usage, self._error_info(ve))
+        except Exception as e:
+            self.metrics.count("exceptions", type(e).__name__)
+            print(f"An unexpected error occurred processing paper '{title}': {e}")
+            return self._result(FAILED_UNKNOWN, self.default_label, usage, self._error_info(e))
+        return self._result(keywords_output, theme_label, usage)
+
+    def _escalation_reason(self, keywords_output, label_line):
+        """
+        Why a single-shot answer should go to the router's escalation tier:
+        'empty', 'format' (fewer than three keyword lines), 'unknown_label',
+        'fuzzy_label' or 'coarse_label' (a domain instead of a sub-item);
+        None when it is fine or there is nothing to escalate to.
+        """
+        if self.router is None or self.router.escalate_to is None:
+            return None
+        if keywords_output == FAILED_EMPTY:
+            return 'empty'
+        if sum(1 for line in keywords_output.splitlines() if keyword_terms(line)) < 3:
+            return 'format'
+        label = self.taxonomy.resolve(label_line, fuzzy=False)
+        if label is None:
+            return 'unknown_label' if self.taxonomy.resolve(label_line) is None else 'fuzzy_label'
+        return 'coarse_label' if label.is_domain else None
+
+    async def _theme_label(self, semaphore, title, keywords_output, label_line, usage):
+        """
+        The canonical form of the label the model chose. An answer that names
+        no taxonomy label is re-asked for the label alone, with the keywords
+        already extracted and, when the answer points at a domain, only that
+        domain's subtree. Falls back to the domain, then to default_label.
+        """
+        with self.metrics.stage("parse"):
+            label = self.taxonomy.resolve(label_line)
+        if label is not None:
+            return label.text
+        if not label_line and keywords_output == FAILED_EMPTY:
+            return self.default_label
+        domain = self.taxonomy.domain_of_label(label_line) if label_line else None
+        if self.reask_chain is not None:
+            scope = domain.subtree_text() if domain else self.labels
+            response = await self._invoke(
+                semaphore, self.reask_chain, LABEL_PROMPT_TEMPLATE,
+                {"title": title, "keywords": keywords_output, "labels": scope}, usage,
+                answer_parser=lambda: StreamingLabelParser(scope, keyword_lines=0))
+            with self.metrics.stage("parse"):
+                label = self.taxonomy.resolve(first_line(response))
+            self.metrics.count("reask", "resolved" if label is not None else "unresolved")
+            if label is not None:
+                return label.text
+        print(f"Warning: Unknown label '{label_line}' for paper '{title}'.")
+        return domain.name if domain else self.default_label
+
+    @staticmethod
+    def _prompt_tokens(template, inputs):
+        return estimate_tokens(template) + sum(estimate_tokens(value) for value in inputs.values())
+
+    def _route_tier(self, tier=None):
+        return (tier or self.router.default_tier) if self.router is not None else None
+
+    def _cached(self, template, inputs, route_tier, usage):
+        """The cached answer for `inputs` from any model the router may send `route_tier` to, or None."""
+        if self.cache is None:
+            return None
+        for model in self.router.models(route_tier) if self.router is not None else [None]:
+            response = self.cache.get(cache_key(self.cache, template, inputs, self.labels, route_tier, model))
+            if response is not None:
+                usage['cached_calls'] += 1
+                usage['output_tokens'] += estimate_tokens(response)
+                return response
+        return None
+
+    def _store(self, template, inputs, route_tier, served, response):
+        """Cache `response` under the model that served it (`served`, filled by the router)."""
+        if self.cache is not None and response.strip():
+            model = served.get('model') if served is not None else None
+            key = cache_key(self.cache, template, inputs, self.labels, route_tier, model)
+            self.cache.put(key, response, model)
+
+    async def _invoke(self, semaphore, chain, template, inputs, usage, answer_parser=None, tier=None,
+                      use_cache=True, retry=True, served=None):
+        """
+        One cached, rate-limited `chain.ainvoke` call, retried according to
+        the retry policy. Token counts are recorded in `usage` whether or
+        not the answer came from the cache. `answer_parser` builds the
+        StreamingLabelParser that tells when a streamed answer is complete;
+        without one the call is not streamed. `tier` selects a router tier.
+        Callers that cache the answer themselves pass use_cache=False and a
+        `served` dict to learn the model; retry=False makes a single attempt.
+        """
+        input_tokens = self._prompt_tokens(template, inputs)
+        usage['input_tokens'] += input_tokens
+
+        route_tier = self._route_tier(tier)
+        if use_cache:
+            response = self._cached(template, inputs, route_tier, usage)
+            if response is not None:
+                return response
+        if self.cache_only:
+            raise CacheMiss()
+        if self.router is None:
+            served = None
+        elif served is None:
+            served = {}
+
+        attempt = 0
+        while True:
+            if self.breaker is not None:
+                await self.breaker.before_call()
+            try:
+                answer = answer_parser() if self.streaming and answer_parser else None
+                response = await self._call(semaphore, chain, inputs, input_tokens, usage, answer, tier,
+                                            served)
+                break
+            except Exception as e:
+                error_class = classify_error(e)
+                if self.breaker is not None:
+                    self.breaker.record_failure(error_class)
+                delay = (self.retry_policy.delay(error_class, attempt, retry_after(e))
+                         if self.retry_policy is not None and retry else None)
+                if delay is None:
+                    e.attempts = attempt + 1
+                    raise
+                self.metrics.count("retries", error_class)
+                attempt += 1
+                # Backing off outside the semaphore lets other papers use the slot
+                await asyncio.sleep(delay)
+        if self.breaker is not None:
+            self.breaker.record_success()
+        usage['api_calls'] += 1
+        usage['output_tokens'] += estimate_tokens(response)
+        if use_cache:
+            self._store(template, inputs, route_tier, served, response)
+        return response
+
+    async def _call(self, semaphore, chain, inputs, input_tokens, usage, answer=None, tier=None, served=None):
+        queued = time.monotonic()
+        async with semaphore:
+            started = time.monotonic()
+            self.metrics.observe("queue", started - queued)
+            await self.limiter.acquire(input_tokens + OUTPUT_TOKEN_ESTIMATE)
+            self.metrics.observe("rate_limit", time.monotonic() - started)
+            started = time.monotonic()
+            config = self.metrics.chain_config()
+            if tier is not None or served is not None:
+                # `served` is filled in by the router with the route that answered
+                config = dict(config or {}, metadata={ROUTE_TIER_KEY: tier, ROUTE_SERVED_KEY: served})
+            try:
+                if answer is None:
+                    return await chain.ainvoke(inputs, config)
+                return await self._stream(chain, inputs, answer, started, usage, config)
+            finally:
+                latency = time.monotonic() - started
+                usage['latency'] += latency
+                self.metrics.observe("invoke", latency)
+
+    async def _stream(self, chain, inputs, answer, started, usage, config):
+        """
+        Feed `chain.astream` into the StreamingLabelParser `answer` and close
+        the stream once it is done or the answer reaches max_output_tokens.
+        """
+        outcome, first = 'complete', True
+        stream = chain.astream(inputs, config)
+        try:
+            async for chunk in stream:
+                if first and chunk:
+                    first = False
+                    ttft = time.monotonic() - started
+                    usage['ttft'] += ttft
+                    self.metrics.observe("ttft", ttft)
+                if answer.feed(chunk, estimate_tokens(chunk)):
+                    outcome = 'early_stop'
+                    break
+                if self.max_output_tokens and answer.tokens >= self.max_output_tokens:
+                    outcome = 'truncated'
+                    break
+        finally:
+            await stream.aclose()
+        elapsed = time.monotonic() - started
+        usage['streamed_calls'] += 1
+        usage['time_to_label'] += elapsed
+        self.metrics.observe("time_to_label", elapsed)
+        self.metrics.count("stream", outcome)
+        return answer.answer()
+
+    async def _label_batch(self, semaphore, batch, fields):
+        """Label a list of (index, paper) pairs; returns (index, paper, result) triples."""
+        if self.batcher is None or len(batch) == 1:
+            return [(index, paper, await self._label_one(semaphore, *fields(paper)))
+                    for index, paper in batch]
+
+        results, to_send = {}, []
+        for index, paper in batch:
+            title, abstract = fields(paper)
+            if not abstract or abstract == MISSING_ABSTRACT:
+                results[index] = await self._label_one(semaphore, title, abstract)
+            elif (local := self._local_label(title, abstract)) is not None:
+                results[index] = local
+            else:
+                to_send.append((index, title, abstract))
+        if to_send:
+            results.update(await self.batcher.label(self, semaphore, to_send))
+        return [(index, paper, results[index]) for index, paper in batch]
+
+    async def alabel_stream(self, items, fields, on_result, total=None):
+        """
+        Label papers from the iterable `items` of (index, paper) pairs and
+        call `on_result(index, paper, result)` as each one completes. At most
+        a few times `concurrency` batches are held in memory at once, so the
+        input can be streamed.
+        """
+        loop = asyncio.get_running_loop()
+        # Sync LLM clients are run through the default executor by
+        # `ainvoke`; size it so the executor is not the bottleneck.
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        loop.set_default_executor(executor)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        window = self.concurrency * 4
+        batch_size = self.batcher.batch_size if self.batcher is not None else 1
+
+        pending = set()
+        try:
+            with tqdm(total=total, desc="Extracting Keywords and Labels") as bar:
+                async def drain():
+                    nonlocal pending
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        for index, paper, result in task.result():
+                            self.metrics.record_result(result)
+                            with self.metrics.stage("store"):
+                                on_result(index, paper, result)
+                            bar.update(1)
+
+                batch = []
+                for index, paper in items:
+                    batch.append((index, paper))
+                    if len(batch) < batch_size:
+                        continue
+                    pending.add(asyncio.ensure_future(self._label_batch(semaphore, batch, fields)))
+                    batch = []
+                    if len(pending) >= window:
+                        await drain()
+                if batch:
+                    pending.add(asyncio.ensure_future(self._label_batch(semaphore, batch, fields)))
+                while pending:
+                    await drain()
+        finally:
+            for task in pending:
+                task.cancel()
+            await finish_asyncgen_closes()
+            executor.shutdown(wait=False)
+
+    async def alabel_papers(self, papers, fields):
+        """
+        Label `papers` and return one result per paper, in input order.
+        `fields(paper)` must return the (title, abstract) pair to send.
+        """
+        results = [None] * len(papers)
+
+        def store(index, paper, result):
+            results[index] = result
+
+        await self.alabel_stream(enumerate(papers), fields, store, total=len(papers))
+        return results
+
+    def label_papers(self, papers, fields):
+        return asyncio.run(self.alabel_papers(papers, fields))
+
+    def label_stream(self, items, fields, on_result, total=None):
+        asyncio.run(self.alabel_stream(items, fields, on_result, total))
@@ -0,0 +1,645 @@
+# Full text of the papers' PDFs.
+#
+# Every crawled record carries a PDF link (pdf_link; pdf_url for AAAI).
+# `fetch` downloads them concurrently through one pooled aiohttp session,
+# with a global and a per-host connection limit and retries by error class
+# (retry.py). The PDFs go into a content-addressed store, and their text is
+# extracted in a process pool while the downloads continue:
+#
+#   <store>/objects/ab/<sha256>.pdf    the PDFs, named by content hash
+#   <store>/text/ab/<sha256>.json      extracted text: introduction, conclusion, head
+#   <store>/urls.jsonl                 url -> sha256 or error; the last record of a url wins
+#
+# A URL that was downloaded before is not fetched again, and a PDF reached
+# through two URLs is stored and extracted once. `label --fulltext <store>`
+# adds the introduction and conclusion excerpts to the abstract in the
+# prompt, and uses them in place of a missing abstract.
+#
+#   python -m paper_analysis.fulltext fetch datas/usenix_papers.json datas/ndss24_papers.json --store pdf_store
+#   python -m paper_analysis.fulltext extract --store pdf_store --workers 4
+#   python -m paper_analysis.fulltext show --store pdf_store https://www.usenix.org/system/files/sec24-x.pdf
+#
+# Text is extracted with pypdf when it is installed (pip install pypdf).
+# The built-in fallback reads only uncompressed and Flate-compressed content
+# streams and maps bytes through Latin-1, so CID fonts and fonts with custom
+# encodings come out garbled. Text that does not look like prose (too short,
+# too few words, control or accented-byte soup) is stored as a failed
+# extraction, which `label --fulltext` skips; `extract --redo-failed` tries
+# those PDFs again, e.g. after installing pypdf.
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from .journal import iter_papers
+from .retry import RetryPolicy, classify_error, retry_after
+from .sources import detect_adapter
+
+USER_AGENT = "paper-analysis-fulltext/1.0"
+MAX_PDF_BYTES = 50 * 1024 * 1024
+PDF_MAGIC = b"%PDF-"
+# Characters kept per section in the store; the prompt excerpt is cut further
+SECTION_CHARS = 8000
+FULLTEXT_CHARS = 3000
+# Client errors (404, not a PDF, too large) are not retried on later runs either
+PERMANENT_CLASSES = {'client'}
+# Extracted text shorter than this, or with fewer word-like tokens or plain
+# characters than these shares, is recorded as a failed extraction
+MIN_TEXT_CHARS = 200
+MIN_WORD_SHARE = 0.5
+MIN_PLAIN_SHARE = 0.85
+
+_HEADING_RE = re.compile(
+    r'^\s*(?:(?:\d{1,2}|[IVX]{1,5}|[A-H])(?:\.\d{1,2})*\.?\s+)?'
+    r'(abstract|introduction|background|related\s+work|discussion|conclusions?|concluding\s+remarks|'
+    r'summary|future\s+work|limitations|references|bibliography|acknowledge?ments?|appendix|appendices)'
+    r'\b(?:\s+and\s+future\s+work)?[\s.:]*$', re.IGNORECASE)
+# Any other numbered heading ("3 Design", "4.1 Threat Model") ends the section before it
+_NUMBERED_HEADING_RE = re.compile(
+    r'^\s*(?:\d{1,2}|[IVX]{1,5})(?:\.\d{1,2})*\.?\s+([A-Z][A-Za-z][\w ,:&/-]{1,50})$')
+_END_SECTIONS = {'references', 'bibliography', 'acknowledgments', 'acknowledgements', 'appendix', 'appendices'}
+_CONCLUSION_SECTIONS = ('conclusion', 'conclusions', 'concluding remarks', 'summary', 'discussion')
+
+
+class FetchError(Exception):
+    """A PDF download that failed; `status` and `retry_after` are read by retry.classify_error."""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class PdfStore:
+    """The content-addressed PDF and text store described above."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "text"), exist_ok=True)
+        self.index_path = os.path.join(root, "urls.jsonl")
+        self.urls = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.urls[record['url']] = record
+        self._index = None
+
+    def pdf_path(self, sha256):
+        return os.path.join(self.root, "objects", sha256[:2], sha256 + ".pdf")
+
+    def text_path(self, sha256):
+        return os.path.join(self.root, "text", sha256[:2], sha256 + ".json")
+
+    def sha256(self, url):
+        """Content hash of the stored PDF of `url`, or None."""
+        record = self.urls.get(url)
+        sha256 = record.get('sha256') if record else None
+        return sha256 if sha256 and os.path.exists(self.pdf_path(sha256)) else None
+
+    def needs_fetch(self, url, retry_failed=False):
+        if self.sha256(url):
+            return False
+        record = self.urls.get(url)
+        return retry_failed or not record or record.get('error_class') not in PERMANENT_CLASSES
+
+    def record(self, url, **fields):
+        record = dict(fields, url=url, time=round(time.time(), 3))
+        self.urls[url] = record
+        if self._index is None:
+            self._index = open(self.index_path, "a", encoding="utf-8")
+        self._index.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._index.flush()
+
+    def temp_file(self):
+        return tempfile.NamedTemporaryFile(dir=self.root, prefix=".download-", delete=False)
+
+    def commit(self, temp_path, sha256):
+        """Move a finished download to its content address (dropping it when already stored)."""
+        path = self.pdf_path(sha256)
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+        return path
+
+    def text(self, sha256):
+        path = self.text_path(sha256)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def write_text(self, sha256, data):
+        path = self.text_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    def unextracted(self, redo_failed=False):
+        """Content hashes of stored PDFs without extracted text (or with a failed extraction)."""
+        hashes = {record.get('sha256') for record in self.urls.values() if record.get('sha256')}
+        pending = []
+        for sha256 in sorted(hashes):
+            if not os.path.exists(self.pdf_path(sha256)):
+                continue
+            if not os.path.exists(self.text_path(sha256)) or (redo_failed and 'error' in self.text(sha256)):
+                pending.append(sha256)
+        return pending
+
+    def close(self):
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+
+
+# Downloading
+
+def pdf_urls(paths):
+    """The distinct http(s) PDF links of the papers in `paths`, in file order."""
+    urls = {}
+    for path in paths:
+        adapter = None
+        for paper in iter_papers(path):
+            adapter = adapter or detect_adapter(paper)
+            url = (adapter.common(paper)['pdf_link'] or '').strip()
+            if url.startswith(("http://", "https://")):
+                urls.setdefault(url, None)
+    return list(urls)
+
+
+async def _download(session, store, url, max_bytes):
+    async with session.get(url) as response:
+        if response.status != 200:
+            raise FetchError(f"HTTP {response.status} from {url}", response.status,
+                             response.headers.get("Retry-After"))
+        digest = hashlib.sha256()
+        size = 0
+        # The magic is checked once 5 bytes are in, however the body happens to be chunked
+        head = b""
+        temp = store.temp_file()
+        try:
+            with temp:
+                async for chunk in response.content.iter_chunked(1 << 16):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise FetchError(f"larger than {max_bytes} bytes: {url}", 413)
+                    digest.update(chunk)
+                    if head is not None:
+                        head += chunk
+                        if len(head) < len(PDF_MAGIC):
+                            continue
+                        if not head.startswith(PDF_MAGIC):
+                            raise FetchError(f"not a PDF ({response.content_type}): {url}", 415)
+                        chunk, head = head, None
+                    temp.write(chunk)
+            if head is not None:
+                raise FetchError(f"{'empty' if not head else 'truncated'} response: {url}", 415)
+            sha256 = digest.hexdigest()
+            store.commit(temp.name, sha256)
+            return sha256, size
+        except BaseException:
+            if os.path.exists(temp.name):
+                os.remove(temp.name)
+            raise
+
+
+async def fetch_pdfs(urls, store, concurrency=16, per_host=4, timeout=120, max_bytes=MAX_PDF_BYTES,
+                     retry_policy=None, on_stored=None):
+    """
+    Download `urls` into `store`; `on_stored(url, sha256)` is awaited for
+    each stored PDF (extraction hooks in there). Returns counters.
+    """
+    import aiohttp
+
+    policy = retry_policy or RetryPolicy()
+    stats = {'downloaded': 0, 'deduplicated': 0, 'failed': 0, 'bytes': 0, 'retries': 0}
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host)
+    session = aiohttp.ClientSession(connector=connector, headers={"User-Agent": USER_AGENT},
+                                    timeout=aiohttp.ClientTimeout(total=timeout))
+
+    async def fetch(url):
+        async with semaphore:
+            attempt = 0
+            while True:
+                try:
+                    sha256, size = await _download(session, store, url, max_bytes)
+                    break
+                except Exception as e:
+                    error_class = classify_error(e)
+                    delay = policy.delay(error_class, attempt, retry_after(e))
+                    if delay is None:
+                        stats['failed'] += 1
+                        store.record(url, error=str(e)[:300] or type(e).__name__, error_class=error_class)
+                        print(f"Failed: {url}: {e or type(e).__name__}")
+                        return
+                    stats['retries'] += 1
+                    attempt += 1
+                    await asyncio.sleep(delay)
+        known = any(record.get('sha256') == sha256 for record in store.urls.values())
+        stats['deduplicated' if known else 'downloaded'] += 1
+        stats['bytes'] += size
+        store.record(url, sha256=sha256, size=size)
+        if on_stored is not None:
+            await on_stored(url, sha256)
+
+    async with session:
+        await asyncio.gather(*(fetch(url) for url in urls))
+    return stats
+
+
+# Text extraction
+
+def extract_text(path):
+    """(text, page count, extractor name) of a PDF file."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        with open(path, "rb") as file:
+            pages = _basic_page_texts(file.read())
+        return "\n".join(pages), len(pages), "basic"
+    reader = PdfReader(path)
+    pages = [page.extract_text() or "" for page in reader.pages]
+    return "\n".join(pages), len(pages), "pypdf"
+
+
+_STREAM_RE = re.compile(rb'(<<(?:[^<>]|<<(?:[^<>]|<<[^<>]*>>)*>>)*>>)\s*stream\r?\n')
+_CONTENT_TOKEN_RE = re.compile(
+    rb'\((?:\\.|[^\\()]|\((?:\\.|[^\\()])*\))*\)'     # literal string, one level of nested parentheses
+    rb'|<[0-9A-Fa-f\s]*>'                              # hex string
+    rb'|[\[\]]'
+    rb'|/[^\s/\[\]()<>{}%]*'                           # name
+    rb'|[-+]?(?:\d+\.?\d*|\.\d+)'                      # number
+    rb"|[A-Za-z'\"*][A-Za-z0-9*]*"                     # operator
+    rb'|%[^\r\n]*', re.DOTALL)
+_ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f'}
+
+
+def _basic_page_texts(data):
+    """Text of the content streams of a PDF, one entry per stream that draws text."""
+    texts = []
+    for match in _STREAM_RE.finditer(data):
+        header = match.group(1)
+        if any(key in header for key in (b'/Subtype', b'/Length1', b'/Type /XRef', b'/Type/XRef',
+                                         b'/Type /ObjStm', b'/Type/ObjStm')):
+            continue
+        start = match.end()
+        end = data.find(b'endstream', start)
+        if end < 0:
+            continue
+        stream = data[start:end]
+        if b'/FlateDecode' in header:
+            try:
+                stream = zlib.decompressobj().decompress(stream)
+            except zlib.error:
+                continue
+        elif b'/Filter' in header:
+            continue
+        text = _content_text(stream)
+        if text.strip():
+            texts.append(text)
+    return texts
+
+
+def _literal(token):
+    body, out, i = token[1:-1], bytearray(), 0
+    while i < len(body):
+        c = body[i:i + 1]
+        if c == b'\\' and i + 1 < len(body):
+            nxt = body[i + 1:i + 2]
+            if nxt in _ESCAPES:
+                out += _ESCAPES[nxt]
+                i += 2
+            elif nxt.isdigit():
+                octal = re.match(rb'[0-7]{1,3}', body[i + 1:i + 4]).group()
+                out.append(int(octal, 8) & 0xFF)
+                i += 1 + len(octal)
+            elif nxt in b'\r\n':
+                i += 2
+            else:
+                out += nxt
+                i += 2
+        else:
+            out += c
+            i += 1
+    return out.decode("latin-1")
+
+
+def _string(token):
+    if token.startswith(b'('):
+        return _literal(token)
+    digits = re.sub(rb'\s', b'', token[1:-1])
+    if len(digits) % 2:
+        digits += b'0'
+    raw = bytes.fromhex(digits.decode("ascii"))
+    # Two-byte hex strings are usually glyph ids of CID fonts, which need the font's ToUnicode map
+    return raw.decode("utf-16-be", "ignore") if raw.startswith(b'\xfe\xff') else raw.decode("latin-1")
+
+
+def _content_text(stream):
+    """Text shown by the Tj/TJ/'/" operators of a content stream, with line breaks from moves."""
+    parts, operands, array = [], [], None
+    for token in _CONTENT_TOKEN_RE.findall(stream):
+        if token.startswith(b'%'):
+            continue
+        if token == b'[':
+            array = []
+        elif token == b']':
+            operands.append(array or [])
+            array = None
+        elif array is not None:
+            array.append(token)
+        elif token[:1] in b'(<' or token[:1] in b'/+-.0123456789':
+            operands.append(token)
+        else:
+            if token == b'Tj' and operands:
+                parts.append(_string(operands[-1]))
+            elif token in (b"'", b'"') and operands:
+                parts.append("\n" + _string(operands[-1]))
+            elif token == b'TJ' and operands and isinstance(operands[-1], list):
+                for item in operands[-1]:
+                    if item[:1] in b'(<':
+                        parts.append(_string(item))
+                    elif float(item) < -200:
+                        # A large negative kern is a word space in most generators
+                        parts.append(" ")
+            elif token in (b'Td', b'TD') and len(operands) >= 2:
+                parts.append("\n" if abs(float(operands[-1])) > 0.01 else " ")
+            elif token in (b'T*', b'ET'):
+                parts.append("\n")
+            elif token == b'Tm':
+                parts.append("\n")
+            operands = []
+    return "".join(parts)
+
+
+def clean_text(text):
+    """Join hyphenated line breaks and collapse runs of spaces."""
+    text = text.replace("\r", "\n").replace("­", "")
+    text = re.sub(r'(\w)-\n(\w)', r'\1\2', text)
+    text = re.sub(r'[ \t\f\v]+', ' ', text)
+    return re.sub(r'\n\s*\n+', '\n\n', text).strip()
+
+
+def split_sections(text):
+    """[(heading, body)] by the standard section headings; text before the first is ('', ...)."""
+    sections, heading, start = [], '', 0
+    lines = text.split("\n")
+    offsets, position = [], 0
+    for line in lines:
+        offsets.append(position)
+        position += len(line) + 1
+    for line, offset in zip(lines, offsets):
+        match = (_HEADING_RE.match(line) or _NUMBERED_HEADING_RE.match(line)) if len(line) <= 60 else None
+        if match:
+            sections.append((heading, text[start:offset].strip()))
+            heading = re.sub(r'\s+', ' ', match.group(1).strip().lower())
+            start = offset + len(line) + 1
+    sections.append((heading, text[start:].strip()))
+    return [(name, body) for name, body in sections if body or name]
+
+
+def _cut(text, limit):
+    """At most `limit` characters, ending at a sentence or word boundary."""
+    text = re.sub(r'\s+', ' ', text).strip()
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    for boundary in (". ", " "):
+        position = cut.rfind(boundary)
+        if position > limit * 0.6:
+            return cut[:position + 1].strip()
+    return cut
+
+
+def section_excerpts(text, limit=SECTION_CHARS):
+    """Introduction and conclusion of a paper's text (or its head when there are no headings)."""
+    introduction, conclusion, head = '', '', ''
+    for name, body in split_sections(clean_text(text)):
+        if name in _END_SECTIONS:
+            break
+        if name == 'introduction' and not introduction:
+            introduction = _cut(body, limit)
+        elif name in _CONCLUSION_SECTIONS or name.startswith('conclusion'):
+            # The last of them wins: "Discussion" usually comes before "Conclusion"
+            conclusion = _cut(body, limit)
+    if not introduction and not conclusion:
+        head = _cut(clean_text(text), limit)
+    return {'introduction': introduction, 'conclusion': conclusion, 'head': head}
+
+
+_WORD_RE = re.compile(r"^[(\[\"']?[A-Za-z][a-z]*[aeiouy][a-z]*(?:[-'][a-z]+)*[)\]\"',.;:?!]*$", re.IGNORECASE)
+
+
+def text_problem(text):
+    """Why extracted text is not usable as prose, or '' when it is."""
+    stripped = text.strip()
+    if len(stripped) < MIN_TEXT_CHARS:
+        return f"{len(stripped)} characters"
+    plain = sum(1 for c in stripped if c.isspace() or ' ' <= c <= '~')
+    if plain / len(stripped) < MIN_PLAIN_SHARE:
+        return f"{plain / len(stripped):.0%} plain characters"
+    tokens = stripped.split()
+    words = sum(1 for token in tokens if _WORD_RE.match(token))
+    if words / len(tokens) < MIN_WORD_SHARE:
+        return f"{words / len(tokens):.0%} word-like tokens"
+    return ''
+
+
+def extract_file(path, limit=SECTION_CHARS):
+    """Process-pool job: the text record of one stored PDF."""
+    started = time.process_time()
+    try:
+        text, pages, extractor = extract_text(path)
+    except Exception as e:
+        return {'error': f"{type(e).__name__}: {e}"[:300]}
+    record = {'pages': pages, 'chars': len(text), 'extractor': extractor}
+    problem = text_problem(text)
+    if problem:
+        record['error'] = f"unusable text ({problem})"
+        return record
+    record.update(section_excerpts(text, limit))
+    record['cpu_seconds'] = round(time.process_time() - started, 3)
+    return record
+
+
+async def _extract_into(store, pool, sha256, stats):
+    loop = asyncio.get_running_loop()
+    record = await loop.run_in_executor(pool, extract_file, store.pdf_path(sha256))
+    store.write_text(sha256, record)
+    if 'error' in record:
+        print(f"Extraction failed: {store.pdf_path(sha256)}: {record['error']}")
+    stats['failed' if 'error' in record else 'extracted'] += 1
+
+
+def extract_pending(store, workers=None, redo_failed=False):
+    """Extract every stored PDF that has no text yet."""
+    pending = store.unextracted(redo_failed)
+    stats = {'extracted': 0, 'failed': 0}
+    if not pending:
+        return stats
+
+    async def run():
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            await asyncio.gather(*(_extract_into(store, pool, sha256, stats) for sha256 in pending))
+
+    asyncio.run(run())
+    return stats
+
+
+def fetch_and_extract(urls, store, workers=None, extract=True, **fetch_options):
+    """Download `urls` and extract each new PDF in a process pool while the others download."""
+    stats = {}
+
+    async def run():
+        pool = ProcessPoolExecutor(max_workers=workers) if extract else None
+        extraction = {'extracted': 0, 'failed': 0}
+        jobs, submitted = [], set()
+
+        async def on_stored(url, sha256):
+            if pool is not None and sha256 not in submitted and store.text(sha256) is None:
+                submitted.add(sha256)
+                jobs.append(asyncio.ensure_future(_extract_into(store, pool, sha256, extraction)))
+
+        try:
+            stats.update(await fetch_pdfs(urls, store, on_stored=on_stored, **fetch_options))
+            if jobs:
+                await asyncio.gather(*jobs)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        stats['extracted'] = extraction['extracted']
+        stats['extract_failed'] = extraction['failed']
+
+    asyncio.run(run())
+    return stats
+
+
+# Use in labeling
+
+class FullTextSource:
+    """Prompt excerpts of the stored papers, for `label --fulltext`."""
+
+    def __init__(self, store, max_chars=FULLTEXT_CHARS):
+        self.store = store if isinstance(store, PdfStore) else PdfStore(store)
+        self.max_chars = max_chars
+        # PDF links with and without extracted text, for the run summary
+        self.found = set()
+        self.missing = set()
+
+    def excerpt(self, url):
+        """'[Introduction] ...\n[Conclusion] ...' for a PDF link, '' when it has no extracted text."""
+        url = (url or '').strip()
+        sha256 = self.store.sha256(url)
+        record = self.store.text(sha256) if sha256 else None
+        if not record or 'error' in record:
+            if url:
+                self.missing.add(url)
+            return ''
+        self.found.add(url)
+        parts = [(name, record.get(key) or '') for name, key in
+                 (("Introduction", 'introduction'), ("Conclusion", 'conclusion'), ("Text", 'head'))]
+        parts = [(name, body) for name, body in parts if body]
+        share = self.max_chars // max(1, len(parts))
+        return "\n".join(f"[{name}] {_cut(body, share)}" for name, body in parts)
+
+    def fields(self, adapter):
+        """adapter.fields with the excerpt appended to the abstract (or replacing a missing one)."""
+        from .engine import MISSING_ABSTRACT
+
+        def fields(paper):
+            title, abstract = adapter.fields(paper)
+            excerpt = self.excerpt(adapter.common(paper)['pdf_link'])
+            if not excerpt:
+                return title, abstract
+            if not abstract or abstract == MISSING_ABSTRACT:
+                return title, excerpt
+            return title, f"{abstract}\n\nFull-text excerpts:\n{excerpt}"
+
+        return fields
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download the papers' PDFs and extract their text.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fetch_parser = commands.add_parser("fetch", help="download the PDFs of paper collections and extract them")
+    fetch_parser.add_argument("inputs", nargs="+", help="crawled papers JSON files")
+    fetch_parser.add_argument("--store", default="pdf_store", help="content-addressed PDF store directory")
+    fetch_parser.add_argument("--concurrency", type=int, default=16, help="simultaneous downloads")
+    fetch_parser.add_argument("--per-host", type=int, default=4, help="simultaneous connections per host")
+    fetch_parser.add_argument("--timeout", type=float, default=120, help="seconds per download")
+    fetch_parser.add_argument("--max-mb", type=float, default=MAX_PDF_BYTES / 1024 / 1024)
+    fetch_parser.add_argument("--max-retries", type=int, help="cap on retries per PDF")
+    fetch_parser.add_argument("--retry-failed", action="store_true",
+                              help="also retry URLs that failed permanently before (404, not a PDF)")
+    fetch_parser.add_argument("--workers", type=int, help="text extraction processes (default: CPUs)")
+    fetch_parser.add_argument("--no-extract", action="store_true", help="download only")
+
+    extract_parser = commands.add_parser("extract", help="extract stored PDFs that have no text yet")
+    extract_parser.add_argument("--store", default="pdf_store")
+    extract_parser.add_argument("--workers", type=int)
+    extract_parser.add_argument("--redo-failed", action="store_true",
+                                help="also re-extract PDFs whose earlier extraction failed or was unusable")
+
+    show_parser = commands.add_parser("show", help="print the prompt excerpt of a PDF link")
+    show_parser.add_argument("url")
+    show_parser.add_argument("--store", default="pdf_store")
+    show_parser.add_argument("--chars", type=int, default=FULLTEXT_CHARS)
+    args = parser.parse_args(argv)
+
+    store = PdfStore(args.store)
+    try:
+        if args.command == "show":
+            print(FullTextSource(store, args.chars).excerpt(args.url) or "No extracted text for this URL.")
+            return
+        if args.command == "extract":
+            started = time.monotonic()
+            stats = extract_pending(store, args.workers, args.redo_failed)
+            print(f"Extracted {stats['extracted']} PDFs ({stats['failed']} failed) "
+                  f"in {time.monotonic() - started:.1f}s")
+            return
+
+        urls = pdf_urls(args.inputs)
+        todo = [url for url in urls if store.needs_fetch(url, args.retry_failed)]
+        print(f"{len(urls)} PDF links, {len(urls) - len(todo)} already stored or failed permanently, "
+              f"fetching {len(todo)}")
+        if not todo:
+            if not args.no_extract:
+                stats = extract_pending(store, args.workers)
+                print(f"Extracted {stats['extracted']} PDFs ({stats['failed']} failed)")
+            return
+        started = time.monotonic()
+        stats = fetch_and_extract(todo, store, args.workers, not args.no_extract,
+                                  concurrency=args.concurrency, per_host=args.per_host, timeout=args.timeout,
+                                  max_bytes=int(args.max_mb * 1024 * 1024),
+                                  retry_policy=RetryPolicy(max_retries=args.max_retries))
+        elapsed = time.monotonic() - started
+        print(f"Downloaded {stats['downloaded']} PDFs ({stats['bytes'] / 1024 / 1024:.1f} MB, "
+              f"{stats['deduplicated']} duplicates of stored ones), {stats['failed']} failed, "
+              f"{stats['retries']} retries in {elapsed:.1f}s")
+        if not args.no_extract:
+            # PDFs stored by an earlier --no-extract or interrupted run
+            leftover = extract_pending(store, args.workers)
+            print(f"Extracted {stats['extracted'] + leftover['extracted']} PDFs "
+                  f"({stats['extract_failed'] + leftover['failed']} failed)")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
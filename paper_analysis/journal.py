@@ -0,0 +1,222 @@
+# Checkpointed labeling output.
+#
+# Every labeled paper is appended to a JSONL journal as soon as it completes,
+# so a crash loses at most the papers still in flight. On restart the papers
+# already in the journal are skipped, and the final *_keywords.json /
+# *_keywords_only.json files are written from the journal at the end, one
+# record at a time, in input order.
+
+import hashlib
+import json
+import os
+import time
+
+
+def iter_json_array(path, chunk_size=1 << 16):
+    """
+    Yield the elements of a top-level JSON array one at a time without
+    loading the whole file.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as file:
+        buf = file.read(chunk_size)
+        pos = 0
+        eof = not buf
+        started = False
+        while True:
+            # Skip whitespace, refilling the buffer as needed
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n":
+                    pos += 1
+                if pos < len(buf) or eof:
+                    break
+                buf, pos = buf[pos:] + file.read(chunk_size), 0
+                eof = len(buf) == 0
+            if pos >= len(buf):
+                raise json.JSONDecodeError("Unterminated array", buf, pos)
+
+            char = buf[pos]
+            if not started:
+                if char != "[":
+                    raise json.JSONDecodeError("Expected a JSON array", buf, pos)
+                started = True
+                pos += 1
+                continue
+            if char == "]":
+                return
+            if char == ",":
+                pos += 1
+                continue
+
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                more = file.read(chunk_size)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                continue
+            if end == len(buf) and not eof:
+                # A scalar cut at the chunk boundary may be incomplete
+                more = file.read(chunk_size)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                continue
+            yield obj
+            pos = end
+            if pos > chunk_size:
+                buf, pos = buf[pos:], 0
+
+
+# Keys of the paper list in collections stored as an object, e.g. ccs2023_publications.json
+PAPER_LIST_KEYS = ('publications', 'papers')
+
+
+def iter_papers(path):
+    """
+    Yield the papers of one collection: the elements of a top-level JSON
+    array, streamed, or of the 'publications' / 'papers' list of a
+    top-level object (loaded whole, as such files are small).
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        first = file.read(64).lstrip()[:1]
+        if first == "{":
+            file.seek(0)
+            data = json.load(file)
+            yield from next((data[key] for key in PAPER_LIST_KEYS if isinstance(data.get(key), list)), [])
+            return
+    yield from iter_json_array(path)
+
+
+def paper_key(index, title, abstract):
+    """Journal key of one input paper: its position plus a content hash."""
+    digest = hashlib.sha1(f"{title}\n{abstract}".encode("utf-8")).hexdigest()[:16]
+    return f"{index}:{digest}"
+
+
+def iter_journal(journal_path):
+    """Yield the records of a journal, skipping a torn last line."""
+    with open(journal_path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+class LabelJournal:
+    """
+    Append-only JSONL journal of labeled papers.
+
+    Writes are flushed immediately and fsync'ed every `fsync_every` records
+    or `fsync_interval` seconds, whichever comes first.
+    """
+
+    def __init__(self, path, fsync_every=32, fsync_interval=1.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._keys = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        self._keys.add(json.loads(line)["key"])
+                    except (ValueError, KeyError):
+                        # Torn last line from a crash; it will be redone
+                        continue
+        self._file = open(path, "a", encoding="utf-8")
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def append(self, key, index, full, keywords_only, usage=None):
+        record = {'key': key, 'index': index, 'full': full, 'keywords_only': keywords_only}
+        if usage is not None:
+            record['usage'] = usage
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._keys.add(key)
+        self._unsynced += 1
+        if (self._unsynced >= self.fsync_every
+                or time.monotonic() - self._last_sync >= self.fsync_interval):
+            self.sync()
+
+    def sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+
+def _write_array_item(file, first, obj):
+    # Same layout as json.dump(list, indent=4)
+    text = json.dumps(obj, ensure_ascii=False, indent=4)
+    file.write("\n    " if first else ",\n    ")
+    file.write(text.replace("\n", "\n    "))
+
+
+def materialize_journal(journal_path, output_full, output_keywords_only):
+    """
+    Write the journal out as the two JSON array files, ordered by input
+    index. Only line offsets are kept in memory; when a paper was journaled
+    more than once the last record wins. Returns the number of papers written.
+    """
+    offsets = {}
+    with open(journal_path, "rb") as file:
+        offset = 0
+        for line in file:
+            try:
+                offsets[json.loads(line)["index"]] = offset
+            except (ValueError, KeyError):
+                pass
+            offset += len(line)
+
+    with open(journal_path, "rb") as journal, \
+            open(output_full, "w", encoding="utf-8") as full_file, \
+            open(output_keywords_only, "w", encoding="utf-8") as keywords_file:
+        full_file.write("[")
+        keywords_file.write("[")
+        for n, index in enumerate(sorted(offsets)):
+            journal.seek(offsets[index])
+            record = json.loads(journal.readline())
+            _write_array_item(full_file, n == 0, record["full"])
+            _write_array_item(keywords_file, n == 0, record["keywords_only"])
+        closing = "\n]" if offsets else "]"
+        full_file.write(closing)
+        keywords_file.write(closing)
+    return len(offsets)
+
+
+def usage_totals(journal_path):
+    """
+    Sum the per-paper token/latency usage recorded in the journal. Returns
+    the totals plus 'papers', the number of papers that were labeled by the
+    LLM (from the API or the cache) or by the local pre-classifier.
+    """
+    totals = {}
+    papers = 0
+    with open(journal_path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                usage = json.loads(line).get("usage")
+            except ValueError:
+                continue
+            if not usage or not (usage.get("api_calls") or usage.get("cached_calls")
+                                 or usage.get("local_labels")):
+                continue
+            papers += 1
+            for name, value in usage.items():
+                totals[name] = totals.get(name, 0) + value
+    totals["papers"] = papers
+    return totals
@@ -0,0 +1,248 @@
+# LLM client and prompt chains.
+#
+# langchain and the Tongyi client are imported only when a chain is
+# actually built, so commands that never call the API start instantly.
+# CompatibleModeClient talks to the OpenAI-compatible endpoint directly
+# (BASE_URL, or a local stand-in such as paper_analysis.mock_server).
+# With stream=True both clients deliver the answer as it is generated, so
+# LabelingEngine can stop reading once the label has arrived.
+
+import asyncio
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+
+DEFAULT_MODEL = "qwen-plus-2025-04-28"
+BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+DEFAULT_LABEL = "未分类"
+# Default cap on a streamed answer; a well-formed one is about half of this
+MAX_OUTPUT_TOKENS = 512
+# Runnable config metadata key naming the router tier a call should go to (router.py)
+ROUTE_TIER_KEY = "route_tier"
+# Metadata key of a dict the router fills with the route and model that served the call
+ROUTE_SERVED_KEY = "route_served"
+DEFAULT_TIER = "default"
+
+# Single-shot prompt: three keyword lines followed by one theme label
+PROMPT_TEMPLATE = """
+你是一个网络安全领域的科研导师。给定以下论文的标题和摘要：
+
+Title: {title}
+Abstract: {abstract}
+
+请执行以下任务：
+1.  提取三个最能代表论文研究方向的核心关键词。
+2.  每个关键词要求简洁、准确。
+3.  在每个关键词后，提供其对应的中文翻译，格式为：`关键词 (中文翻译)`。
+4.  在每个关键词及其翻译后，附上一句对该研究方向或关键词含义的简短归纳（15字以内）。
+5.  将三个关键词及其相关信息按顺序列出，每个占一行。
+6.  在关键词列表之后，另起一行，并根据论文内容从以下主题标签中选择一个最适合的主题标签：
+
+{labels}
+
+7.  请确保最后一行**只包含**所选主题标签的名称，不要有任何其他文字或格式。
+
+输出格式示例：
+Keyword1 (翻译1) - 简短归纳1
+Keyword2 (翻译2) - 简短归纳2
+Keyword3 (翻译3) - 简短归纳3
+
+选定的主题标签名称
+"""
+
+# Label-only prompt: the second call of --two-stage (with one domain's
+# subtree) and the re-ask for an answer whose label is not in the taxonomy
+LABEL_PROMPT_TEMPLATE = """
+你是一个网络安全领域的科研导师。论文标题和核心关键词如下：
+
+Title: {title}
+Keywords:
+{keywords}
+
+请从以下主题标签中选择一个最适合该论文的主题标签：
+
+{labels}
+
+请只输出所选主题标签（包含编号，例如 3.8.1 漏洞挖掘与逆向分析），不要有任何其他文字或格式。
+"""
+
+
+# HTTP statuses worth retrying: rate limited, or a transient server error
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class APIError(ValueError):
+    """Non-200 answer of the compatible-mode endpoint; `status` and `retry_after` drive retry.py."""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class CompatibleModeClient:
+    """
+    Minimal chat-completions client for DashScope's OpenAI-compatible mode,
+    using only the standard library. Calling it with a prompt (a string or
+    a langchain PromptValue) returns the answer text, so it can stand in for
+    the llm of a `prompt | llm | StrOutputParser()` chain.
+
+    With `stream=True` the chain step is a generator over the server-sent
+    events instead (see `as_runnable`).
+    """
+
+    def __init__(self, model, api_key, base_url=BASE_URL, timeout=60, max_retries=3, backoff=1.0,
+                 stream=False):
+        self.model = model
+        self.api_key = api_key
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.streaming = stream
+        self._lock = threading.Lock()
+        # 'cancelled': streams closed before the server finished them
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'cancelled': 0}
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def __call__(self, prompt):
+        text = prompt.to_string() if hasattr(prompt, "to_string") else str(prompt)
+        return self.complete(text)
+
+    def _request(self, text, stream=False):
+        payload = {"model": self.model, "messages": [{"role": "user", "content": text}]}
+        if stream:
+            payload["stream"] = True
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        return urllib.request.Request(self.url, data=body, method="POST", headers={
+            "Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"})
+
+    def complete(self, text):
+        request = self._request(text)
+        for attempt in range(self.max_retries + 1):
+            self._count('requests')
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    answer = json.loads(response.read().decode("utf-8"))
+                return answer["choices"][0]["message"]["content"] or ""
+            except urllib.error.HTTPError as e:
+                retry_after = e.headers.get("Retry-After")
+                if e.code not in RETRY_STATUSES or attempt == self.max_retries:
+                    self._count('failures')
+                    raise APIError(f"HTTP {e.code} from {self.url}: {e.read()[:200]!r}", e.code,
+                                   retry_after) from e
+            except (urllib.error.URLError, TimeoutError) as e:
+                if attempt == self.max_retries:
+                    self._count('failures')
+                    raise
+                retry_after = None
+            self._count('retries')
+            # Honor Retry-After, otherwise exponential backoff with jitter
+            delay = float(retry_after) if retry_after else self.backoff * 2 ** attempt
+            time.sleep(delay * random.uniform(1.0, 1.5))
+
+    def stream(self, text):
+        """
+        Yield the answer text chunk by chunk from a streamed request. Closing
+        the generator early closes the connection, which stops generation
+        (and billing) on the server. Not retried here: LabelingEngine
+        retries the whole call.
+        """
+        self._count('requests')
+        try:
+            response = urllib.request.urlopen(self._request(text, stream=True), timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            self._count('failures')
+            raise APIError(f"HTTP {e.code} from {self.url}: {e.read()[:200]!r}", e.code,
+                           e.headers.get("Retry-After")) from e
+        except (urllib.error.URLError, TimeoutError):
+            self._count('failures')
+            raise
+        finished = False
+        try:
+            for raw in response:
+                line = raw.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    finished = True
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                # Reasoning models send "reasoning_content" deltas first; only the answer is returned
+                delta = choices[0].get("delta") or {}
+                if delta.get("content"):
+                    yield delta["content"]
+        finally:
+            if not finished:
+                self._count('cancelled')
+            response.close()
+
+    def _transform(self, prompts):
+        for prompt in prompts:
+            yield from self.stream(prompt.to_string() if hasattr(prompt, "to_string") else str(prompt))
+
+    async def _atransform(self, prompts):
+        # The blocking reads run in the default executor, one chunk at a time
+        loop = asyncio.get_running_loop()
+        async for prompt in prompts:
+            chunks = self.stream(prompt.to_string() if hasattr(prompt, "to_string") else str(prompt))
+            read = None
+            try:
+                while True:
+                    # Shielded, so a cancelled caller does not leave a read running on a closed stream
+                    read = loop.run_in_executor(None, next, chunks, None)
+                    chunk = await asyncio.shield(read)
+                    if chunk is None:
+                        break
+                    yield chunk
+            finally:
+                # Closed here rather than in the executor: when an early-stopped stream is
+                # finalized at loop teardown, LabelingEngine has already shut the executor down
+                if read is not None and not read.done():
+                    read.add_done_callback(lambda _: chunks.close())
+                else:
+                    chunks.close()
+
+    def as_runnable(self):
+        """The chain step: the client itself, or a streaming RunnableGenerator with stream=True."""
+        if not self.streaming:
+            return self
+        from langchain_core.runnables import RunnableGenerator
+
+        return RunnableGenerator(self._transform, self._atransform, name="CompatibleModeClient")
+
+
+def build_llm(model, api_key, base_url=BASE_URL, client="tongyi", max_retries=0, stream=False):
+    """
+    Tongyi client for DashScope, or the compatible-mode HTTP client for
+    `base_url`. `max_retries` is the client's own retrying; LabelingEngine
+    retries by error class (retry.py), so by default the clients do not.
+    With `stream` the chains deliver the answer incrementally (`chain.astream`).
+    """
+    if client == "compatible":
+        return CompatibleModeClient(model, api_key, base_url, max_retries=max_retries, stream=stream)
+    from langchain_community.llms import Tongyi
+
+    # Based on an earlier error the *API endpoint* may require stream mode;
+    # langchain handles this for invoke/ainvoke. Tongyi counts attempts, not retries.
+    return Tongyi(model=model, api_key=api_key, base_url=base_url, max_retries=max_retries + 1,
+                  streaming=stream)
+
+
+def build_chain(llm, template, input_variables):
+    """`prompt | llm | StrOutputParser()`, or None when there is no client (cache-only runs)."""
+    if llm is None:
+        return None
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import PromptTemplate
+
+    prompt = PromptTemplate(input_variables=input_variables, template=template)
+    step = llm.as_runnable() if isinstance(llm, CompatibleModeClient) else llm
+    return prompt | step | StrOutputParser()
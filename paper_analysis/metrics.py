@@ -0,0 +1,330 @@
+# Instrumentation of the labeling loop.
+#
+# Metrics keeps latency histograms per stage (load, queue, rate_limit,
+# prompt, invoke, parse, store), per-paper token histograms, paper
+# outcomes, failure categories (the reason in "关键词提取失败 (…)"),
+# exception types and retries. At the end of a run it is written as a JSON
+# summary and as a Prometheus textfile for node_exporter's textfile
+# collector. Without --metrics/--prometheus the engine gets NULL_METRICS,
+# whose hooks do nothing, so the loop pays one no-op call per stage.
+#
+#   python -m paper_analysis label datas/CCS24.json --labels web_of_science/labels.txt \
+#       --metrics label_metrics.json --prometheus /var/lib/node_exporter/paper_labeling.prom
+
+import bisect
+import json
+import os
+import re
+import threading
+import time
+from contextlib import nullcontext
+
+FAILED_PREFIX = "关键词提取失败"
+# Upper bounds in seconds; the stages range from microseconds (store) to minutes (invoke)
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (50, 100, 200, 400, 800, 1600, 3200, 6400, 12800, 25600)
+PROMETHEUS_PREFIX = "paper_labeling"
+
+_REASON_RE = re.compile(r'^关键词提取失败\s*[(（]([^)）]*)[)）]')
+
+
+def failure_category(keywords):
+    """'API错误' for "关键词提取失败 (API错误)", None for a successful answer."""
+    if not isinstance(keywords, str) or not keywords.startswith(FAILED_PREFIX):
+        return None
+    match = _REASON_RE.match(keywords)
+    return match.group(1).strip() if match else "其他"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with Prometheus `le` semantics."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Estimate by linear interpolation inside the bucket, like histogram_quantile()."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+    def summary(self, digits=6):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, digits),
+            'mean': round(self.sum / self.count, digits) if self.count else 0.0,
+            'p50': round(self.quantile(0.50), digits),
+            'p95': round(self.quantile(0.95), digits),
+            'p99': round(self.quantile(0.99), digits),
+            'max': round(self.max, digits),
+        }
+
+
+class _Stage:
+    __slots__ = ('metrics', 'name', 'started')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class Metrics:
+    """Collected measurements of one labeling run. Safe to update from executor threads."""
+
+    enabled = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.stages = {}
+        self.tokens = {}
+        # (name, label) -> value, e.g. ('failures', 'API错误') -> 3
+        self.counters = {}
+        self._callbacks = None
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+
+    def stage(self, name):
+        """Context manager timing one pass through stage `name`."""
+        return _Stage(self, name)
+
+    def timed_iter(self, iterable, stage):
+        """Yield from `iterable`, timing each step as `stage` (e.g. reading the input)."""
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.observe(stage, time.perf_counter() - started)
+            yield item
+
+    def count(self, name, label="", amount=1):
+        with self._lock:
+            self.counters[name, label] = self.counters.get((name, label), 0) + amount
+
+    def record_result(self, result):
+        """Outcome, failure category and token usage of one labeled paper."""
+        if result is None:
+            self.count('papers', 'not_cached')
+            return
+        category = failure_category(result.get('keywords'))
+        usage = result.get('usage') or {}
+        if category is not None:
+            self.count('papers', 'failed')
+            self.count('failures', category)
+        elif usage.get('local_labels'):
+            self.count('papers', 'local')
+        elif usage.get('api_calls'):
+            self.count('papers', 'api')
+        elif usage.get('cached_calls'):
+            self.count('papers', 'cached')
+        else:
+            self.count('papers', 'reused')
+        with self._lock:
+            for kind in ('input_tokens', 'output_tokens'):
+                if usage.get(kind):
+                    histogram = self.tokens.get(kind)
+                    if histogram is None:
+                        histogram = self.tokens[kind] = Histogram(TOKEN_BUCKETS)
+                    histogram.observe(usage[kind])
+
+    def chain_config(self):
+        """Runnable config whose callbacks time prompt formatting and count reported API tokens."""
+        if self._callbacks is None:
+            self._callbacks = {'callbacks': [_chain_callback_handler(self)]}
+        return self._callbacks
+
+    def _grouped_counters(self, client_stats=None):
+        """{name: {label: value}}, with the HTTP client's own retries counted as reason 'http'."""
+        with self._lock:
+            counters = dict(self.counters)
+        if client_stats and client_stats.get('retries'):
+            counters['retries', 'http'] = counters.get(('retries', 'http'), 0) + client_stats['retries']
+        grouped = {}
+        for (name, label), value in sorted(counters.items()):
+            grouped.setdefault(name, {})[label or 'total'] = value
+        return grouped
+
+    def summary(self, client_stats=None, router=None):
+        counters = self._grouped_counters(client_stats)
+        summary = {
+            'started': self.started,
+            'seconds': round(time.time() - self.started, 3),
+            'stages': {name: h.summary() for name, h in sorted(self.stages.items())},
+            'tokens_per_paper': {name: h.summary(1) for name, h in sorted(self.tokens.items())},
+            'papers': counters.pop('papers', {}),
+            'failures': counters.pop('failures', {}),
+            'exceptions': counters.pop('exceptions', {}),
+            'retries': counters.pop('retries', {}),
+        }
+        summary.update(counters)
+        if client_stats:
+            summary['client'] = dict(client_stats)
+        if router is not None:
+            summary['routing'] = router.report()
+        return summary
+
+    def prometheus(self, client_stats=None, router=None):
+        """The metrics in the Prometheus text exposition format."""
+        p = PROMETHEUS_PREFIX
+        lines = []
+
+        def histogram(name, help_text, label, histograms):
+            lines.extend([f"# HELP {p}_{name} {help_text}", f"# TYPE {p}_{name} histogram"])
+            for key, h in sorted(histograms.items()):
+                cumulative = 0
+                for bound, n in zip(list(h.buckets) + ["+Inf"], h.counts):
+                    cumulative += n
+                    lines.append(f'{p}_{name}_bucket{{{label}="{_escape(key)}",le="{bound}"}} {cumulative}')
+                lines.append(f'{p}_{name}_sum{{{label}="{_escape(key)}"}} {h.sum:.6f}')
+                lines.append(f'{p}_{name}_count{{{label}="{_escape(key)}"}} {h.count}')
+
+        def counter(name, help_text, label, values):
+            lines.extend([f"# HELP {p}_{name}_total {help_text}", f"# TYPE {p}_{name}_total counter"])
+            for key, value in sorted(values.items()):
+                lines.append(f'{p}_{name}_total{{{label}="{_escape(key)}"}} {value}')
+
+        histogram("stage_seconds", "Time spent per pass through each labeling stage.", "stage", self.stages)
+        histogram("paper_tokens", "Estimated tokens per labeled paper.", "kind", self.tokens)
+        grouped = self._grouped_counters(client_stats)
+        descriptions = {
+            'papers': ("Labeled papers by outcome.", "outcome"),
+            'failures': ("Papers stored with a 关键词提取失败 placeholder, by reason.", "category"),
+            'exceptions': ("Exceptions raised while labeling, by type.", "type"),
+            'retries': ("Retried requests, by reason.", "reason"),
+            'api_tokens': ("Tokens reported by the API.", "kind"),
+            'escalations': ("Answers re-sent to the router's escalation tier, by reason.", "reason"),
+        }
+        for name, values in sorted(grouped.items()):
+            help_text, label = descriptions.get(name, (f"{name} events.", "label"))
+            counter(name, help_text, label, values)
+        if client_stats:
+            counter("client_requests", "HTTP requests of the compatible-mode client, by result.", "result",
+                    client_stats)
+        if router is not None:
+            histogram("route_latency_seconds", "Latency of the calls sent to each route.", "route",
+                      {route.name: route.latency for route in router.routes})
+            for name in ('requests', 'failures', 'escalated', 'ejections'):
+                counter(f"route_{name}", f"Route {name} by route.", "route",
+                        {route.name: route.counts[name] for route in router.routes})
+        lines.extend([f"# HELP {p}_run_seconds Duration of the last labeling run.",
+                      f"# TYPE {p}_run_seconds gauge", f"{p}_run_seconds {time.time() - self.started:.3f}",
+                      f"# HELP {p}_last_run_timestamp_seconds End time of the last labeling run.",
+                      f"# TYPE {p}_last_run_timestamp_seconds gauge",
+                      f"{p}_last_run_timestamp_seconds {time.time():.0f}"])
+        return "\n".join(lines) + "\n"
+
+    def write(self, json_path=None, prometheus_path=None, client_stats=None, router=None):
+        if json_path:
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(self.summary(client_stats, router), f, ensure_ascii=False, indent=2)
+            print(f"Metrics summary saved to {json_path}")
+        if prometheus_path:
+            # The textfile collector may read at any time; only ever expose a complete file
+            with open(prometheus_path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(self.prometheus(client_stats, router))
+            os.replace(prometheus_path + ".tmp", prometheus_path)
+            print(f"Prometheus metrics saved to {prometheus_path}")
+
+
+class NullMetrics:
+    """Disabled metrics: every hook is a no-op."""
+
+    enabled = False
+    _stage = nullcontext()
+
+    def observe(self, stage, seconds):
+        pass
+
+    def stage(self, name):
+        return self._stage
+
+    def timed_iter(self, iterable, stage):
+        return iterable
+
+    def count(self, name, label="", amount=1):
+        pass
+
+    def record_result(self, result):
+        pass
+
+    def chain_config(self):
+        return None
+
+    def write(self, json_path=None, prometheus_path=None, client_stats=None, router=None):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _chain_callback_handler(metrics):
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class ChainStageHandler(BaseCallbackHandler):
+        """Times the prompt template step of a chain and counts token usage reported by the LLM."""
+
+        def __init__(self):
+            self._started = {}
+
+        def on_chain_start(self, serialized, inputs, *, run_id, **kwargs):
+            if kwargs.get('run_type') == 'prompt' or str(kwargs.get('name', '')).endswith('PromptTemplate'):
+                self._started[run_id] = time.perf_counter()
+
+        def on_chain_end(self, outputs, *, run_id, **kwargs):
+            started = self._started.pop(run_id, None)
+            if started is not None:
+                metrics.observe('prompt', time.perf_counter() - started)
+
+        def on_chain_error(self, error, *, run_id, **kwargs):
+            self._started.pop(run_id, None)
+
+        def on_llm_end(self, response, **kwargs):
+            usage = (response.llm_output or {}).get('token_usage') or {}
+            for kind, names in (('input', ('input_tokens', 'prompt_tokens')),
+                                ('output', ('output_tokens', 'completion_tokens'))):
+                for name in names:
+                    if usage.get(name):
+                        metrics.count('api_tokens', kind, usage[name])
+                        break
+
+    return ChainStageHandler()
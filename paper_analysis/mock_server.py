@@ -0,0 +1,322 @@
+# Local stand-in for DashScope's OpenAI-compatible chat completions API.
+#
+# Answers POST .../chat/completions with canned but well-formed responses
+# for every prompt the labeling pipeline sends (single-shot keywords +
+# label, two-stage domain and subtree prompts, batched JSON prompts), so
+# concurrency, caching and batching changes can be measured offline.
+# Latency follows a configurable distribution, and 429 / 500 responses can
+# be injected at random or when a QPS limit is exceeded. Requests with
+# "stream": true are answered as server-sent events, optionally preceded by
+# reasoning deltas and followed by chatter after the label, as verbose or
+# thinking models do. A fraction of the labels can be made invalid to
+# exercise label validation and re-asking. GET /stats returns the request
+# counters.
+#
+#   python -m paper_analysis.mock_server --port 8000 --latency 0.8 --latency-dist lognormal \
+#       --rate-limit-rate 0.02 --error-rate 0.01
+#   python -m paper_analysis label datas/CCS24.json --labels web_of_science/labels.txt \
+#       --client compatible --base-url http://127.0.0.1:8000/v1 --api-key test
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .engine import estimate_tokens
+
+# Taxonomy lines of a prompt: "3、网络与系统安全", "3.8.1 漏洞挖掘与逆向分析"
+_LABEL_LINE_RE = re.compile(r'^(?:\d+、\S.*|\d+(?:\.\d+)+ \S.*)$')
+_BATCH_ID_RE = re.compile(r'^\[(P\d+)\]$', re.MULTILINE)
+_TITLE_RE = re.compile(r'^Title: (.*)$', re.MULTILINE)
+_WORD_RE = re.compile(r'[A-Za-z][A-Za-z\-]{3,}')
+# Label line of a --bad-label-rate answer: in no taxonomy
+BAD_LABEL = "该论文属于网络安全相关方向"
+
+
+def _keywords(title):
+    words = sorted(set(_WORD_RE.findall(title or "")), key=lambda w: (-len(w), w))[:3]
+    words += ["Security", "Privacy", "Systems"][:3 - len(words)]
+    return [f"{word} (模拟关键词) - 本地模拟服务返回" for word in words]
+
+
+def trailing_text(lines):
+    """Explanation a verbose model appends after the label, `lines` lines of it."""
+    return "".join(f"\n说明{i + 1}：该论文的研究内容与所选主题标签最为契合，这是本地模拟服务追加的解释。"
+                   for i in range(lines))
+
+
+def canned_answer(prompt):
+    """A deterministic answer in the format the prompt asks for."""
+    candidates = [line.strip() for line in prompt.splitlines() if _LABEL_LINE_RE.match(line.strip())]
+    leaves = [line for line in candidates if "." in line.split(" ")[0]] or candidates or ["未分类"]
+
+    def pick(text, options):
+        return options[zlib.crc32(text.encode("utf-8")) % len(options)]
+
+    ids = _BATCH_ID_RE.findall(prompt)
+    titles = _TITLE_RE.findall(prompt)
+    if ids:
+        return json.dumps([{"id": paper_id, "keywords": _keywords(title),
+                            "theme_label": pick(title, leaves)}
+                           for paper_id, title in zip(ids, titles)], ensure_ascii=False)
+    title = titles[0] if titles else prompt[:100]
+    if "Abstract:" not in prompt:
+        # Second stage of --two-stage: the label line only
+        return pick(title, leaves)
+    # Single-shot prompts get a leaf label, the two-stage domain prompt a domain
+    return "\n".join(_keywords(title) + ["", pick(title, leaves)])
+
+
+class MockBehavior:
+    """Latency distribution and fault injection of the mock server."""
+
+    def __init__(self, latency=0.5, latency_dist="lognormal", latency_sigma=0.5, error_rate=0.0,
+                 rate_limit_rate=0.0, max_qps=None, retry_after=1.0, seed=None, trailing_lines=0,
+                 reasoning_tokens=0, bad_label_rate=0.0):
+        self.latency = latency
+        self.latency_dist = latency_dist
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.max_qps = max_qps
+        self.retry_after = retry_after
+        self.trailing_lines = trailing_lines
+        self.reasoning_tokens = reasoning_tokens
+        self.bad_label_rate = bad_label_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = []  # request times of the last second, for max_qps
+        self.stats = {'requests': 0, 'completed': 0, 'rate_limited': 0, 'errors': 0, 'streamed': 0,
+                      'cancelled': 0, 'bad_labels': 0}
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def sample_latency(self):
+        with self._lock:
+            if self.latency_dist == "fixed":
+                return self.latency
+            if self.latency_dist == "exponential":
+                return self._random.expovariate(1 / self.latency) if self.latency else 0.0
+            # lognormal with the given mean
+            mu = math.log(self.latency or 1e-6) - self.latency_sigma ** 2 / 2
+            return self._random.lognormvariate(mu, self.latency_sigma)
+
+    def bad_label(self):
+        with self._lock:
+            return self.bad_label_rate and self._random.random() < self.bad_label_rate
+
+    def fault(self):
+        """429, 500 or None for the next request."""
+        with self._lock:
+            if self.max_qps:
+                now = time.monotonic()
+                self._window = [t for t in self._window if now - t < 1.0]
+                if len(self._window) >= self.max_qps:
+                    return 429
+                self._window.append(now)
+            draw = self._random.random()
+        if draw < self.rate_limit_rate:
+            return 429
+        if draw < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    behavior = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            self._send_json(200, self.behavior.stats)
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        behavior = self.behavior
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        behavior.count('requests')
+        try:
+            request = json.loads(body)
+            prompt = "\n".join(str(m.get("content", "")) for m in request["messages"])
+        except (ValueError, KeyError, TypeError):
+            self._send_json(400, {"error": {"message": "invalid request body"}})
+            return
+
+        fault = behavior.fault()
+        if fault == 429:
+            behavior.count('rate_limited')
+            self._send_json(429, {"error": {"code": "Throttling.RateQuota",
+                                            "message": "Requests rate limit exceeded"}},
+                            {"Retry-After": f"{behavior.retry_after:g}"})
+            return
+        if fault == 500:
+            behavior.count('errors')
+            self._send_json(500, {"error": {"code": "InternalError", "message": "Injected server error"}})
+            return
+
+        answer = canned_answer(prompt)
+        if "Abstract:" in prompt and not answer.startswith("[") and behavior.bad_label():
+            behavior.count('bad_labels')
+            answer = answer.rsplit("\n", 1)[0] + "\n" + BAD_LABEL
+        if not answer.startswith("["):
+            answer += trailing_text(behavior.trailing_lines)
+        latency = behavior.sample_latency()
+        usage = {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": estimate_tokens(answer)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        model = request.get("model", "mock")
+        if request.get("stream"):
+            behavior.count('streamed')
+            try:
+                self._stream(answer, latency, model)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client closed the stream early
+                behavior.count('cancelled')
+                return
+        else:
+            # As long as streaming the same answer would take
+            time.sleep(latency / 2 + self._step(answer, latency) * (len(self._deltas(answer)) - 1))
+            self._send_json(200, {
+                "id": f"chatcmpl-mock-{behavior.stats['requests']}", "object": "chat.completion",
+                "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+        behavior.count('completed')
+
+    def _deltas(self, answer):
+        """(delta field, text) of each streamed chunk: reasoning first, then one line per chunk."""
+        thinking = "分析标题与摘要，" * 2
+        deltas = [("reasoning_content", thinking)] * (self.behavior.reasoning_tokens // len(thinking))
+        return deltas + [("content", piece) for piece in answer.splitlines(keepends=True) or [""]]
+
+    def _step(self, answer, latency):
+        """Time between chunks: the answer proper takes the second half of the latency."""
+        lines = len(answer.splitlines()) - self.behavior.trailing_lines
+        return latency / 2 / max(1, lines)
+
+    def _stream(self, answer, latency, model):
+        """
+        Server-sent events: the first chunk after half the latency, then one
+        line per chunk, with the answer's lines spread over the other half.
+        Reasoning deltas and trailing chatter take extra time at that pace.
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        step = self._step(answer, latency)
+        time.sleep(latency / 2)
+        for i, (kind, piece) in enumerate(self._deltas(answer)):
+            if i:
+                time.sleep(step)
+            chunk = {"object": "chat.completion.chunk", "model": model,
+                     "choices": [{"index": 0, "delta": {kind: piece}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        done = {"object": "chat.completion.chunk", "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        self.wfile.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+
+
+class MockServer:
+    """The mock server running in a background thread (port 0 picks a free port)."""
+
+    def __init__(self, behavior=None, host="127.0.0.1", port=0):
+        self.behavior = behavior or MockBehavior()
+        handler = type("Handler", (_Handler,), {"behavior": self.behavior})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def add_behavior_arguments(parser):
+    parser.add_argument("--latency", type=float, default=0.5, help="mean response latency in seconds")
+    parser.add_argument("--latency-dist", default="lognormal", choices=["fixed", "exponential", "lognormal"])
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal shape")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                        help="fraction of requests answered with 429")
+    parser.add_argument("--max-qps", type=float, help="answer 429 above this many requests per second")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of 429 answers")
+    parser.add_argument("--seed", type=int, help="random seed for latencies and faults")
+    parser.add_argument("--trailing-lines", type=int, default=0,
+                        help="explanation lines appended after the label, like a verbose model")
+    parser.add_argument("--reasoning-tokens", type=int, default=0,
+                        help="reasoning tokens streamed before the answer, like a thinking model")
+    parser.add_argument("--bad-label-rate", type=float, default=0.0,
+                        help="fraction of keyword answers whose label is not in the taxonomy")
+
+
+def behavior_from_args(args):
+    return MockBehavior(args.latency, args.latency_dist, args.latency_sigma, args.error_rate,
+                        args.rate_limit_rate, args.max_qps, args.retry_after, args.seed, args.trailing_lines,
+                        args.reasoning_tokens, args.bad_label_rate)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local mock of the DashScope compatible-mode API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    add_behavior_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = MockServer(behavior_from_args(args), args.host, args.port)
+    print(f"Mock compatible-mode API at {server.base_url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(f"Stats: {server.behavior.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# Parsing of the free-text "keywords + theme label" answer returned by the LLM.
+
+import re
+from functools import lru_cache
+
+from .taxonomy import cached_taxonomy
+
+FAILED_FORMAT = "关键词提取失败 (格式错误)"
+FAILED_EMPTY = "关键词提取失败 (空响应)"
+
+_KEYWORD_MARK_RE = re.compile(r'[(（:：]|\s[-—–]\s')
+_CODE_PREFIX_RE = re.compile(r'^\d+(?:\.\d+)*[、.\s]*')
+_KEYWORD_LINE_RE = re.compile(r'^\s*(?:[-*•]\s*|\d+[.)、]\s*)?([^(（:：]+?)\s*(?:[(（]([^)）]*)[)）])?\s*(?:(?:(?<=[\s)）])[-—–]|[:：]).*)?$')
+
+
+def split_label_response(response, labels, title=""):
+    """
+    Split a model response into (keywords_output, label_line).
+
+    The prompt asks for three keyword lines followed by a single label line;
+    `labels` is the raw labels.txt text (or a domain list / subtree) the
+    label must come from. label_line is the answer's label line as written,
+    "" when there is none; use Taxonomy.resolve to validate it.
+    """
+    # Improved parsing: Handle potential variations in line breaks and content
+    lines = [line.strip() for line in response.strip().split('\n') if line.strip()]
+    taxonomy = cached_taxonomy(labels)
+
+    if len(lines) >= 4:
+        # Assume first 3 lines are keywords, the label follows. A verbose model may add
+        # explanations after the label, so take the last line that is one.
+        for i in range(len(lines) - 1, 2, -1):
+            if taxonomy.resolve(lines[i], fuzzy=False) is not None:
+                return "\n".join(lines[:i]), lines[i]
+        return "\n".join(lines[:-1]), lines[-1]
+
+    if lines:
+        # Fallback: Maybe only keywords or only label returned, or format mismatch
+        print(f"Warning: Unexpected response format for paper '{title}'. Attempting fallback parsing.")
+        # Heuristic: Assume the last line is the label if it is one, else all is keywords
+        potential_label = lines[-1]
+        if taxonomy.resolve(potential_label) is not None:
+            keywords_output = "\n".join(lines[:-1]) if len(lines) > 1 else FAILED_FORMAT
+            return keywords_output, potential_label
+        return "\n".join(lines), ""  # Assume all lines are keyword related
+
+    # Empty response
+    print(f"Warning: Empty response received for paper '{title}'.")
+    return FAILED_EMPTY, ""
+
+
+def parse_label_response(response, labels, default_label, title=""):
+    """
+    (keywords_output, theme_label) with the label resolved to its canonical
+    form in `labels`; default_label when the answer names no valid label.
+    """
+    keywords_output, label_line = split_label_response(response, labels, title)
+    label = cached_taxonomy(labels).resolve(label_line)
+    if label is None and label_line:
+        print(f"Warning: Unknown label '{label_line}' for paper '{title}'.")
+    return keywords_output, label.text if label else default_label
+
+
+def first_line(response):
+    """The first non-empty line of an answer, without quotes or markdown emphasis."""
+    for line in response.strip().split('\n'):
+        if line.strip():
+            return line.strip().strip('`*"\'“”「」 ')
+    return ""
+
+
+def keyword_terms(keywords):
+    """
+    The keyword names of a keywords answer, lowercased: the line
+    "Fuzz Testing (模糊测试) - 自动化漏洞挖掘技术" gives "fuzz testing" and "模糊测试".
+    Failure placeholders ("关键词提取失败 ...") and bare lines such as an
+    echoed "选定的主题标签名称" give nothing.
+    """
+    terms = []
+    for line in (keywords or "").splitlines():
+        if line.startswith("关键词提取失败") or not _KEYWORD_MARK_RE.search(line):
+            continue
+        match = _KEYWORD_LINE_RE.match(line)
+        if not match:
+            continue
+        for term in match.groups():
+            term = (term or "").strip().lower()
+            if term and term not in terms:
+                terms.append(term)
+    return terms
+
+
+@lru_cache(maxsize=32)
+def _label_lines(labels):
+    """
+    (every option line with and without its code, those that are not a
+    prefix of a longer option): a streamed partial line may only be taken
+    as the finished label when it cannot still grow into another one.
+    """
+    options = set()
+    for line in labels.splitlines():
+        line = line.strip()
+        if line:
+            options.update((line, _CODE_PREFIX_RE.sub('', line)))
+    options.discard('')
+    unambiguous = {option for option in options
+                   if not any(other != option and other.startswith(option) for other in options)}
+    return frozenset(options), frozenset(unambiguous)
+
+
+class StreamingLabelParser:
+    """
+    Incremental reader of a streamed "keywords + label" answer. Chunks are
+    fed as they arrive; `done` becomes true as soon as `keyword_lines`
+    keyword lines and the label line after them are complete, so the caller
+    can close the stream instead of paying for whatever the model adds after
+    the label. The label line is complete at its newline, or earlier when
+    the partial line already is an option of `labels` that is not the start
+    of a longer option. `answer()` is the text up to the label, for
+    parse_label_response.
+    """
+
+    def __init__(self, labels, keyword_lines=3):
+        self.options, self.complete_options = _label_lines(labels)
+        self.keyword_lines = keyword_lines
+        self.text = ""
+        self.tokens = 0
+        self.keywords = 0
+        self.label = None
+        self._end = None  # length of the answer once the label is known
+        self._line_start = 0
+
+    @property
+    def done(self):
+        return self.label is not None
+
+    def feed(self, chunk, tokens=0):
+        """Add a chunk (and its estimated tokens); returns `done`."""
+        if self.done or not chunk:
+            return self.done
+        self.text += chunk
+        self.tokens += tokens
+        while not self.done:
+            newline = self.text.find("\n", self._line_start)
+            if newline < 0:
+                break
+            self._line(self.text[self._line_start:newline].strip(), newline)
+            self._line_start = newline + 1
+        if not self.done and self.keywords >= self.keyword_lines:
+            partial = self.text[self._line_start:].strip()
+            if partial in self.complete_options:
+                self.label, self._end = partial, len(self.text)
+        return self.done
+
+    def _line(self, line, end):
+        if not line:
+            return
+        if self.keywords >= self.keyword_lines and (line in self.options or not _KEYWORD_MARK_RE.search(line)):
+            self.label, self._end = line, end
+        elif _KEYWORD_MARK_RE.search(line):
+            self.keywords += 1
+
+    def answer(self):
+        """The answer so far, cut after the label line once it is known."""
+        return self.text[:self._end] if self._end is not None else self.text
@@ -0,0 +1,237 @@
+# Local, offline pre-classifier.
+#
+# A hashed TF-IDF + softmax-regression model trained on the labels we
+# already have in datas/*_keywords.json. It runs before the LLM: when its
+# confidence is above the threshold the theme_label is assigned locally
+# (with TF-IDF keywords), and only the remaining papers are sent to Qwen.
+#
+#   python -m paper_analysis.preclassifier train datas/*_keywords.json \
+#       --labels web_of_science/labels.txt -o preclassifier.npz
+#   python -m paper_analysis.preclassifier evaluate datas/*_keywords.json \
+#       --labels web_of_science/labels.txt --threshold 0.5
+
+import argparse
+import json
+import re
+import zlib
+
+import numpy as np
+
+from .taxonomy import Taxonomy
+
+N_FEATURES = 1 << 16
+LOCAL_KEYWORDS_NOTE = "本地分类"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:['\-][a-z0-9]+)*")
+_STOPWORDS = frozenset("""
+a an and are as at be been but by can do does for from has have how however in into is it its
+may more most not of on or our over such than that the their these this those through to under
+up use used using via was we were what when where which while who will with within without
+paper propose proposed present show shows results approach method methods new novel work
+""".split())
+
+
+def _tokens(text):
+    words = [w for w in _TOKEN_RE.findall((text or "").lower()) if w not in _STOPWORDS and len(w) > 1]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def _bucket(term):
+    return zlib.crc32(term.encode("utf-8")) % N_FEATURES
+
+
+def _term_counts(title, abstract):
+    counts = {}
+    # The title is short but the most informative part, so it counts twice
+    for term in _tokens(title) * 2 + _tokens(abstract):
+        counts[term] = counts.get(term, 0) + 1
+    return counts
+
+
+def canonical_label(taxonomy, theme_label):
+    """
+    The canonical form of a stored theme_label ("code name" for sub-items,
+    the name for domains), resolved exactly as the labeling engine does, or
+    None when it names no label.
+    """
+    label = taxonomy.resolve(theme_label, fuzzy=False)
+    return label.text if label is not None else None
+
+
+class _Sparse:
+    """Minimal CSR matrix: enough for X @ W and X.T @ G."""
+
+    def __init__(self, rows):
+        lengths = np.array([len(r) for r in rows], dtype=np.int64)
+        self.n_rows = len(rows)
+        self.indices = np.fromiter((i for r in rows for i in r), dtype=np.int64, count=lengths.sum())
+        self.data = np.fromiter((v for r in rows for v in r.values()), dtype=np.float32, count=lengths.sum())
+        self.row_of = np.repeat(np.arange(self.n_rows), lengths)
+        self.row_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        self.non_empty = lengths > 0
+        # Column-sorted view for the transposed product
+        self.by_column = np.argsort(self.indices, kind="stable")
+        sorted_columns = self.indices[self.by_column]
+        self.columns, self.column_starts = np.unique(sorted_columns, return_index=True)
+
+    def dot(self, weights):
+        out = np.zeros((self.n_rows, weights.shape[1]), dtype=np.float32)
+        if len(self.indices):
+            products = weights[self.indices] * self.data[:, None]
+            starts = self.row_starts[self.non_empty]
+            out[self.non_empty] = np.add.reduceat(products, starts, axis=0)
+        return out
+
+    def t_dot(self, grad, n_features):
+        out = np.zeros((n_features, grad.shape[1]), dtype=np.float32)
+        if len(self.indices):
+            order = self.by_column
+            products = grad[self.row_of[order]] * self.data[order, None]
+            out[self.columns] = np.add.reduceat(products, self.column_starts, axis=0)
+        return out
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class PreClassifier:
+    def __init__(self, weights, bias, idf, classes):
+        self.weights = weights
+        self.bias = bias
+        self.idf = idf
+        self.classes = list(classes)
+
+    # --- Features ---
+    def _row(self, title, abstract, idf):
+        row = {}
+        for term, count in _term_counts(title, abstract).items():
+            bucket = _bucket(term)
+            row[bucket] = row.get(bucket, 0.0) + (1.0 + np.log(count)) * idf[bucket]
+        norm = np.sqrt(sum(v * v for v in row.values())) or 1.0
+        return {k: v / norm for k, v in row.items()}
+
+    @staticmethod
+    def _fit_idf(docs):
+        df = np.zeros(N_FEATURES, dtype=np.float32)
+        for title, abstract in docs:
+            for bucket in {_bucket(term) for term in _term_counts(title, abstract)}:
+                df[bucket] += 1
+        return np.log((1.0 + len(docs)) / (1.0 + df)).astype(np.float32) + 1.0
+
+    # --- Training ---
+    @classmethod
+    def train(cls, docs, labels, epochs=300, learning_rate=10.0, l2=1e-4, min_examples=3):
+        """docs: (title, abstract) pairs; labels: one theme_label per doc."""
+        counts = {}
+        for label in labels:
+            counts[label] = counts.get(label, 0) + 1
+        keep = [i for i, label in enumerate(labels) if counts[label] >= min_examples]
+        docs = [docs[i] for i in keep]
+        labels = [labels[i] for i in keep]
+        classes = sorted(set(labels))
+        class_index = {label: i for i, label in enumerate(classes)}
+
+        idf = cls._fit_idf(docs)
+        model = cls(None, None, idf, classes)
+        x = _Sparse([model._row(title, abstract, idf) for title, abstract in docs])
+        y = np.zeros((len(docs), len(classes)), dtype=np.float32)
+        y[np.arange(len(docs)), [class_index[label] for label in labels]] = 1.0
+
+        weights = np.zeros((N_FEATURES, len(classes)), dtype=np.float32)
+        bias = np.zeros(len(classes), dtype=np.float32)
+        for _ in range(epochs):
+            grad = (_softmax(x.dot(weights) + bias) - y) / len(docs)
+            weights -= learning_rate * (x.t_dot(grad, N_FEATURES) + l2 * weights)
+            bias -= learning_rate * grad.sum(axis=0)
+        model.weights, model.bias = weights, bias
+        return model
+
+    # --- Inference ---
+    def predict(self, title, abstract):
+        """Return (theme_label, confidence)."""
+        row = self._row(title, abstract, self.idf)
+        buckets = np.fromiter(row.keys(), dtype=np.int64, count=len(row))
+        values = np.fromiter(row.values(), dtype=np.float32, count=len(row))
+        probs = _softmax((values @ self.weights[buckets] + self.bias)[None, :])[0]
+        best = int(probs.argmax())
+        return self.classes[best], float(probs[best])
+
+    def keywords(self, title, abstract, count=3):
+        """Top TF-IDF terms of the paper, used when the LLM is skipped."""
+        scored = sorted(
+            ((1.0 + np.log(n)) * self.idf[_bucket(term)], term)
+            for term, n in _term_counts(title, abstract).items())
+        picked = []
+        for _, term in reversed(scored):
+            if not any(term in other or other in term for other in picked):
+                picked.append(term)
+            if len(picked) == count:
+                break
+        return "\n".join(f"{term} ({LOCAL_KEYWORDS_NOTE})" for term in picked)
+
+    # --- Persistence ---
+    def save(self, path):
+        np.savez_compressed(path, weights=self.weights, bias=self.bias, idf=self.idf,
+                            classes=np.array(self.classes))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=False)
+        return cls(data["weights"], data["bias"], data["idf"], [str(c) for c in data["classes"]])
+
+
+def load_training_data(paths, taxonomy):
+    """Collect (title, abstract) docs and labels from labeled *_keywords.json files."""
+    docs, labels = [], []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as file:
+            for paper in json.load(file):
+                label = canonical_label(taxonomy, paper.get("theme_label"))
+                if label and paper.get("abstract"):
+                    docs.append((paper.get("title", ""), paper["abstract"]))
+                    labels.append(label)
+    return docs, labels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train or evaluate the local pre-classifier.")
+    parser.add_argument("command", choices=["train", "evaluate"])
+    parser.add_argument("inputs", nargs="+", help="labeled *_keywords.json files")
+    parser.add_argument("--labels", required=True, help="labels.txt used to validate training labels")
+    parser.add_argument("-o", "--output", default="preclassifier.npz")
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--holdout", type=float, default=0.2, help="fraction held out by evaluate")
+    args = parser.parse_args(argv)
+
+    with open(args.labels, "r", encoding="utf-8") as file:
+        taxonomy = Taxonomy.parse(file.read())
+    docs, labels = load_training_data(args.inputs, taxonomy)
+    print(f"Loaded {len(docs)} labeled papers ({len(set(labels))} distinct labels)")
+
+    if args.command == "train":
+        model = PreClassifier.train(docs, labels)
+        model.save(args.output)
+        print(f"Model with {len(model.classes)} classes saved to {args.output}")
+        return
+
+    order = np.random.default_rng(0).permutation(len(docs))
+    split = int(len(docs) * (1 - args.holdout))
+    train_ids, test_ids = order[:split], order[split:]
+    model = PreClassifier.train([docs[i] for i in train_ids], [labels[i] for i in train_ids])
+    confident = correct = 0
+    for i in test_ids:
+        label, confidence = model.predict(*docs[i])
+        if confidence >= args.threshold:
+            confident += 1
+            correct += label == labels[i]
+    total = len(test_ids)
+    print(f"Threshold {args.threshold}: {confident}/{total} papers labeled locally "
+          f"({confident / max(total, 1):.1%} of LLM calls avoided), "
+          f"accuracy on those {correct / max(confident, 1):.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+# Retries, circuit breaker and the persisted failure queue.
+#
+# Errors from `chain.ainvoke` are classified (rate_limit, server, timeout,
+# connection, client, unknown) and retried with exponential backoff and
+# jitter according to the class: throttling waits longest and honors
+# Retry-After, a 400/401 is never retried. A CircuitBreaker shared by all
+# requests pauses the run when the endpoint keeps failing and lets a single
+# probe through after the cooldown. Papers that still fail are stored with
+# the usual "关键词提取失败" marker and also appended to a failure queue next
+# to the journal, which `label --retry-failures` re-processes.
+
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import time
+import urllib.error
+
+# error class -> (retries, base delay in seconds, maximum delay)
+DEFAULT_RETRY_RULES = {
+    'rate_limit': (6, 2.0, 60.0),
+    'server': (4, 1.0, 30.0),
+    'timeout': (3, 2.0, 30.0),
+    'connection': (4, 1.0, 30.0),
+    'unknown': (1, 1.0, 10.0),
+    'client': (0, 0.0, 0.0),
+}
+# Classes that say something about the endpoint rather than the request
+TRANSIENT_CLASSES = {'rate_limit', 'server', 'timeout', 'connection'}
+
+_STATUS_RE = re.compile(r'(?:status_code:\s*|HTTP\s+)(\d{3})\b')
+
+
+def error_status(exc):
+    """HTTP status carried by an exception of either client, or None."""
+    status = getattr(exc, 'status', None)
+    if status is None:
+        response = getattr(exc, 'response', None)
+        # Tongyi attaches the DashScope response dict, requests a Response
+        if isinstance(response, dict):
+            status = response.get('status_code')
+        else:
+            status = getattr(response, 'status_code', None)
+    if status is None:
+        match = _STATUS_RE.search(str(exc))
+        status = match.group(1) if match else None
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_error(exc):
+    status = error_status(exc)
+    if status == 429 or 'Throttling' in str(exc):
+        return 'rate_limit'
+    if status is not None and status >= 500:
+        return 'server'
+    if status is not None and 400 <= status < 500:
+        return 'client'
+    if (isinstance(exc, (TimeoutError, asyncio.TimeoutError, socket.timeout))
+            or 'Timeout' in type(exc).__name__ or 'timed out' in str(exc)):
+        return 'timeout'
+    if isinstance(exc, (ConnectionError, urllib.error.URLError, OSError)):
+        return 'connection'
+    return 'unknown'
+
+
+def retry_after(exc):
+    value = getattr(exc, 'retry_after', None)
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Per-class retry limits with exponential backoff and "equal jitter":
+    half of the backoff is fixed, the other half random, so concurrent
+    requests that failed together do not retry together.
+    `max_retries` caps the retries of every class (0 disables retrying).
+    """
+
+    def __init__(self, rules=None, max_retries=None):
+        self.rules = dict(DEFAULT_RETRY_RULES)
+        self.rules.update(rules or {})
+        self.max_retries = max_retries
+
+    def retries(self, error_class):
+        retries = self.rules.get(error_class, self.rules['unknown'])[0]
+        return retries if self.max_retries is None else min(retries, self.max_retries)
+
+    def delay(self, error_class, attempt, retry_after=None):
+        """Seconds to wait before retry number `attempt + 1`, or None when retries are exhausted."""
+        if attempt >= self.retries(error_class):
+            return None
+        _, base, cap = self.rules.get(error_class, self.rules['unknown'])
+        backoff = min(cap, base * 2 ** attempt)
+        delay = backoff / 2 + random.uniform(0, backoff / 2)
+        if retry_after:
+            delay = max(delay, min(retry_after, cap))
+        return delay
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive transient failures across all
+    requests. While open every request waits; after the cooldown one probe
+    request is let through (half-open). Success closes the circuit, failure
+    reopens it with twice the cooldown, up to `max_cooldown`.
+    """
+
+    def __init__(self, threshold=10, cooldown=30.0, max_cooldown=600.0, metrics=None):
+        self.threshold = max(1, int(threshold))
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.metrics = metrics
+        self.state = 'closed'
+        self.failures = 0
+        self.cooldown = cooldown
+        self.open_until = 0.0
+        self.probing = False
+        self.opened = 0
+
+    async def before_call(self):
+        """Wait until a request may be sent. Polls, so it works across event loops."""
+        if self.state == 'closed':
+            return
+        started = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if self.state == 'closed':
+                break
+            if self.state == 'open' and now >= self.open_until:
+                self.state = 'half_open'
+                self.probing = False
+            if self.state == 'half_open' and not self.probing:
+                self.probing = True
+                break
+            await asyncio.sleep(min(max(self.open_until - now, 0.05), 0.5))
+        if self.metrics is not None:
+            self.metrics.observe('circuit_wait', time.monotonic() - started)
+
+    def record_success(self):
+        self.failures = 0
+        if self.state != 'closed':
+            print("Endpoint recovered; resuming requests.")
+            self.state = 'closed'
+            self.probing = False
+            self.cooldown = self.base_cooldown
+
+    def record_failure(self, error_class):
+        if error_class not in TRANSIENT_CLASSES:
+            # A rejected request says nothing about the endpoint; let a waiting probe go on
+            if self.state == 'half_open':
+                self.probing = False
+            return
+        self.failures += 1
+        if self.state == 'half_open':
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            self._open(f"probe failed ({error_class})")
+        elif self.state == 'closed' and self.failures >= self.threshold:
+            self._open(f"{self.failures} consecutive failures, last: {error_class}")
+
+    def _open(self, reason):
+        self.state = 'open'
+        self.probing = False
+        self.open_until = time.monotonic() + self.cooldown
+        self.opened += 1
+        if self.metrics is not None:
+            self.metrics.count('circuit_open')
+        print(f"Endpoint failing ({reason}); pausing requests for {self.cooldown:.0f}s.")
+
+
+def failure_queue_path(output_full):
+    return output_full + ".failures.jsonl"
+
+
+class FailureQueue:
+    """
+    Append-only JSONL queue of papers that exhausted their retries, keyed
+    by journal key. A later record for the same key replaces the earlier
+    one; a record with "resolved": true removes the paper from the queue.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pending = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get('resolved'):
+                        self.pending.pop(record['key'], None)
+                    else:
+                        self.pending[record['key']] = record
+        self._file = None
+
+    def __len__(self):
+        return len(self.pending)
+
+    def __contains__(self, key):
+        return key in self.pending
+
+    def _append(self, record):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def add(self, key, index, title, error):
+        previous = self.pending.get(key, {})
+        record = {'key': key, 'index': index, 'title': title, 'error_class': error.get('class'),
+                  'error': error.get('message'), 'attempts': previous.get('attempts', 0) + error.get('attempts', 1),
+                  'time': round(time.time(), 3)}
+        self.pending[key] = record
+        self._append(record)
+
+    def resolve(self, key):
+        if self.pending.pop(key, None) is not None:
+            self._append({'key': key, 'resolved': True})
+
+    def close(self):
+        """Close the file, rewriting it with only the pending papers (or removing it when empty)."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if not os.path.exists(self.path):
+            return
+        if not self.pending:
+            os.remove(self.path)
+            return
+        with open(self.path + ".tmp", "w", encoding="utf-8") as file:
+            for record in self.pending.values():
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(self.path + ".tmp", self.path)
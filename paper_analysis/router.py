@@ -0,0 +1,275 @@
+# Routing of LLM calls over several API keys, endpoints and models.
+#
+# A Router stands in for the llm of the `prompt | llm | StrOutputParser()`
+# chains. Every call goes to one route (a key + endpoint + model), chosen by
+# weighted least-outstanding-requests among the healthy routes of the
+# requested tier. A route that keeps failing, or is throttled, is ejected
+# for a cooldown that doubles while it keeps failing; LabelingEngine's
+# retries then land on the other routes. Routes are grouped in tiers: calls
+# go to `default_tier`, and LabelingEngine re-sends a paper to
+# `escalate_to` when the cheap answer is unparseable or low-confidence.
+#
+#   {
+#     "default_tier": "cheap",
+#     "escalate_to": "big",
+#     "routes": [
+#       {"name": "plus-1", "model": "qwen-plus-2025-04-28", "api_key_env": "DASHSCOPE_KEY_1", "weight": 2,
+#        "tier": "cheap"},
+#       {"name": "plus-2", "model": "qwen-plus-2025-04-28", "api_key_env": "DASHSCOPE_KEY_2", "tier": "cheap",
+#        "client": "compatible", "qps": 5},
+#       {"name": "qwen3", "model": "qwen3-235b-a22b", "api_key_env": "DASHSCOPE_KEY_1", "tier": "big"}
+#     ]
+#   }
+#
+#   python -m paper_analysis label datas/CCS24.json --labels web_of_science/labels.txt --routes routes.json
+
+import json
+import os
+import random
+import threading
+import time
+
+from langchain_core.runnables import Runnable
+from langchain_core.runnables.base import coerce_to_runnable
+
+from .engine import RateLimiter
+from .llm import (BASE_URL, DEFAULT_MODEL, DEFAULT_TIER, ROUTE_SERVED_KEY, ROUTE_TIER_KEY,
+                  CompatibleModeClient, build_llm)
+from .metrics import LATENCY_BUCKETS, Histogram
+from .retry import TRANSIENT_CLASSES, classify_error, retry_after
+
+
+def load_config(config):
+    """A router config dict, read from its JSON file when `config` is a path."""
+    if isinstance(config, str):
+        with open(config, "r", encoding="utf-8") as file:
+            return json.load(file)
+    return config
+
+
+def tier_models(routes, tier):
+    """Distinct models of the (tier, model) pairs `routes` serving `tier`; all of them when none is in it."""
+    models = {model for route_tier, model in routes if route_tier == tier}
+    return sorted(models or {model for _, model in routes})
+
+
+def config_models(config):
+    """(default tier, the models serving it) of a router config, without building its clients."""
+    config = load_config(config)
+    routes = [(spec.get("tier", DEFAULT_TIER), spec.get("model", DEFAULT_MODEL))
+              for spec in config.get("routes") or []]
+    default_tier = config.get("default_tier") or (routes[0][0] if routes else DEFAULT_TIER)
+    return default_tier, tier_models(routes, default_tier)
+
+
+class Route:
+    """One API key + endpoint + model, with its load, health and statistics."""
+
+    def __init__(self, name, llm, model, tier=DEFAULT_TIER, weight=1.0, qps=None, eject_after=3,
+                 cooldown=10.0, max_cooldown=300.0):
+        self.name = name
+        self.llm = llm
+        step = llm.as_runnable() if isinstance(llm, CompatibleModeClient) else llm
+        self.runnable = coerce_to_runnable(step)
+        self.model = model
+        self.tier = tier
+        self.weight = max(float(weight), 1e-6)
+        self.limiter = RateLimiter(qps) if qps else None
+        self.eject_after = max(1, int(eject_after))
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.counts = {'requests': 0, 'successes': 0, 'failures': 0, 'escalated': 0, 'ejections': 0}
+        self.latency = Histogram(LATENCY_BUCKETS)
+
+    def healthy(self, now):
+        return now >= self.ejected_until
+
+    def load(self):
+        return (self.outstanding + 1) / self.weight
+
+    def report(self, seconds):
+        return dict(self.counts, name=self.name, model=self.model, tier=self.tier, weight=self.weight,
+                    healthy=self.healthy(time.monotonic()), outstanding=self.outstanding,
+                    requests_per_second=round(self.counts['successes'] / seconds, 3) if seconds else 0.0,
+                    latency=self.latency.summary(3))
+
+
+class Router(Runnable):
+    """Runnable that sends each call to one of `routes`; see the module comment."""
+
+    name = "Router"
+
+    def __init__(self, routes, default_tier=None, escalate_to=None):
+        if not routes:
+            raise ValueError("a router needs at least one route")
+        self.routes = routes
+        self.default_tier = default_tier or routes[0].tier
+        self.escalate_to = escalate_to
+        if escalate_to is not None and not any(route.tier == escalate_to for route in routes):
+            raise ValueError(f"no route in escalation tier {escalate_to!r}")
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, api_key=None, stream=False):
+        """Build the routes of a config dict (or JSON file); `api_key` is the default key."""
+        config = load_config(config)
+        routes = []
+        for i, spec in enumerate(config.get("routes") or []):
+            key = spec.get("api_key") or (os.getenv(spec["api_key_env"]) if spec.get("api_key_env")
+                                          else api_key)
+            name = spec.get("name") or f"route{i}"
+            if not key:
+                raise ValueError(f"route {name!r}: no API key (api_key, api_key_env or --api-key)")
+            model = spec.get("model", DEFAULT_MODEL)
+            llm = build_llm(model, key, spec.get("base_url", BASE_URL), spec.get("client", "tongyi"),
+                            stream=stream)
+            routes.append(Route(name, llm, model, spec.get("tier", DEFAULT_TIER), spec.get("weight", 1.0),
+                                spec.get("qps"), spec.get("eject_after", 3), spec.get("cooldown", 10.0)))
+        return cls(routes, config.get("default_tier"), config.get("escalate_to"))
+
+    # Route selection and health
+
+    def _candidates(self, tier):
+        return [route for route in self.routes if route.tier == tier] or self.routes
+
+    def models(self, tier=None):
+        """The distinct models that may serve a call to `tier` (the default tier when None)."""
+        return tier_models([(route.tier, route.model) for route in self.routes], tier or self.default_tier)
+
+    def pick(self, tier):
+        """Weighted least-outstanding healthy route of `tier` (any tier when it has none)."""
+        now = time.monotonic()
+        candidates = self._candidates(tier)
+        healthy = [route for route in candidates if route.healthy(now)]
+        if not healthy:
+            # All ejected: try the one whose cooldown ends first
+            return min(candidates, key=lambda route: route.ejected_until)
+        lowest = min(route.load() for route in healthy)
+        return random.choice([route for route in healthy if route.load() == lowest])
+
+    def _start(self, config):
+        metadata = (config or {}).get("metadata") or {}
+        tier = metadata.get(ROUTE_TIER_KEY) or self.default_tier
+        with self._lock:
+            route = self.pick(tier)
+            route.outstanding += 1
+            route.counts['requests'] += 1
+            if tier == self.escalate_to and tier != self.default_tier:
+                route.counts['escalated'] += 1
+        served = metadata.get(ROUTE_SERVED_KEY)
+        if isinstance(served, dict):
+            # Read back by LabelingEngine to cache the answer under the model that gave it
+            served.update(route=route.name, model=route.model, tier=route.tier)
+        return route, time.monotonic()
+
+    def _finish(self, route, started, error=None):
+        with self._lock:
+            route.outstanding -= 1
+            route.latency.observe(time.monotonic() - started)
+            if error is None:
+                route.counts['successes'] += 1
+                route.consecutive_failures = 0
+                route.cooldown = route.base_cooldown
+                return
+            route.counts['failures'] += 1
+            error_class = classify_error(error)
+            if error_class not in TRANSIENT_CLASSES:
+                return
+            route.consecutive_failures += 1
+            if error_class == 'rate_limit':
+                # This key's quota is used up for now; the others may still have some
+                self._eject(route, retry_after(error) or route.cooldown)
+            elif route.consecutive_failures >= route.eject_after:
+                self._eject(route, route.cooldown)
+                route.cooldown = min(route.cooldown * 2, route.max_cooldown)
+
+    def _eject(self, route, seconds):
+        route.ejected_until = max(route.ejected_until, time.monotonic() + seconds)
+        route.counts['ejections'] += 1
+
+    # Runnable interface
+
+    def invoke(self, input, config=None, **kwargs):
+        route, started = self._start(config)
+        try:
+            output = route.runnable.invoke(input, config, **kwargs)
+        except Exception as e:
+            self._finish(route, started, e)
+            raise
+        self._finish(route, started)
+        return output
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        route, started = self._start(config)
+        try:
+            if route.limiter is not None:
+                await route.limiter.acquire(0)
+            output = await route.runnable.ainvoke(input, config, **kwargs)
+        except Exception as e:
+            self._finish(route, started, e)
+            raise
+        self._finish(route, started)
+        return output
+
+    def stream(self, input, config=None, **kwargs):
+        route, started = self._start(config)
+        error = None
+        try:
+            yield from route.runnable.stream(input, config, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # Closed early by the reader counts as a success
+            self._finish(route, started, error)
+
+    async def astream(self, input, config=None, **kwargs):
+        route, started = self._start(config)
+        error = None
+        try:
+            if route.limiter is not None:
+                await route.limiter.acquire(0)
+            async for chunk in route.runnable.astream(input, config, **kwargs):
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._finish(route, started, error)
+
+    # Statistics
+
+    @property
+    def stats(self):
+        """HTTP counters of the compatible-mode clients, summed over the routes."""
+        totals = {}
+        for route in self.routes:
+            for key, value in (getattr(route.llm, "stats", None) or {}).items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def report(self):
+        seconds = time.monotonic() - self.started
+        routes = [route.report(seconds) for route in self.routes]
+        first = sum(r['requests'] - r['escalated'] for r in routes)
+        escalated = sum(r['escalated'] for r in routes)
+        return {
+            'default_tier': self.default_tier,
+            'escalate_to': self.escalate_to,
+            'escalation_rate': round(escalated / first, 4) if first else 0.0,
+            'routes': routes,
+        }
+
+    def print_report(self):
+        report = self.report()
+        print(f"Routes (escalation rate {report['escalation_rate']:.1%}):")
+        for r in report['routes']:
+            print(f"  {r['name']} [{r['tier']}, {r['model']}]: {r['requests']} requests, "
+                  f"{r['failures']} failed, {r['escalated']} escalated, {r['ejections']} ejections, "
+                  f"{r['requests_per_second']:.2f} req/s, latency p50 {r['latency']['p50']:.3f}s "
+                  f"p95 {r['latency']['p95']:.3f}s")
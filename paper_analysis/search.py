@@ -0,0 +1,329 @@
+# Full-text search over the labeled outputs.
+#
+# An inverted index over title, abstract and LLM keywords of the
+# *_keywords.json files, ranked with BM25 (title and keyword matches count
+# more than abstract matches). Each input file becomes one or more
+# segments of up to SEGMENT_SIZE papers:
+#
+#   <index>/<file stem>.<n>/
+#       meta.json                  source, vocabulary, theme_label dictionary
+#       postings.offsets.npy       int64, postings range of each term
+#       postings.docs.npy          int32 document numbers
+#       postings.tf.npy            float32 field-weighted term frequencies
+#       docs.length.npy / docs.year.npy / docs.label.npy
+#       docs.offsets.npy + docs.jsonl   title, theme_label, year per paper for display
+#
+# Arrays are memory-mapped when the index is opened; a query only touches
+# the postings of its terms. Adding files re-indexes only new or changed
+# inputs, and BM25 statistics are summed over all segments at open time.
+#
+#   python -m paper_analysis.search index datas/*_keywords*.json --year 2024
+#   python -m paper_analysis.search query "fuzzing" --year 2024
+#   python -m paper_analysis.search query "membership inference" --source ccs --label 隐私 -k 5
+
+import argparse
+import heapq
+import itertools
+import json
+import os
+import re
+import shutil
+import time
+from array import array
+
+import numpy as np
+
+from .columnar import covered_by_full_output, input_year, paper_rows, parse_year_options, venue_and_year
+
+# Term frequency weight of each field (BM25F-style)
+FIELD_WEIGHTS = {'title': 3.0, 'keywords': 2.0, 'abstract': 1.0}
+K1 = 1.2
+B = 0.75
+# Large files are split into segments of at most this many papers to bound memory
+SEGMENT_SIZE = 50_000
+# Bump when tokenization or layout changes so segments are rebuilt
+FORMAT_VERSION = 1
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:['\-][a-z0-9]+)*|[一-鿿]+")
+_CJK_RE = re.compile(r"[一-鿿]")
+_STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the their this to
+was were we which with our these those via using based can not but also than such into
+""".split())
+
+
+def _stem(word):
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text):
+    """Lowercased, lightly stemmed words; Chinese runs become character bigrams."""
+    tokens = []
+    for word in _WORD_RE.findall((text or "").lower()):
+        if _CJK_RE.match(word):
+            tokens.extend(word[i:i + 2] for i in range(max(len(word) - 1, 1)))
+        elif word not in _STOPWORDS:
+            tokens.append(_stem(word))
+    return tokens
+
+
+def _year_number(year):
+    return int(year) if str(year).isdigit() else 0
+
+
+def build_segment(segment_dir, rows, meta):
+    """Write one segment for the source-independent `rows` of one input file."""
+    vocabulary = {}
+    term_ids, doc_ids, fields = array('i'), array('i'), array('b')
+    field_weights = np.array(list(FIELD_WEIGHTS.values()))
+    lengths = np.zeros(len(rows), dtype=np.float32)
+    for doc, row in enumerate(rows):
+        for field_number, (field, weight) in enumerate(FIELD_WEIGHTS.items()):
+            ids = [vocabulary.setdefault(token, len(vocabulary)) for token in tokenize(row.get(field))]
+            term_ids.extend(ids)
+            doc_ids.extend([doc] * len(ids))
+            fields.extend([field_number] * len(ids))
+            lengths[doc] += weight * len(ids)
+
+    # Renumber terms in sorted order, then sum the weights of each (term, doc) pair
+    terms = sorted(vocabulary)
+    rank = np.empty(len(terms), dtype=np.int64)
+    rank[[vocabulary[term] for term in terms]] = np.arange(len(terms))
+    keys = rank[np.frombuffer(term_ids, dtype=np.int32)] * max(len(rows), 1)
+    keys += np.frombuffer(doc_ids, dtype=np.int32)
+    del term_ids, doc_ids
+    pairs, inverse = np.unique(keys, return_inverse=True)
+    weights = field_weights[np.frombuffer(fields, dtype=np.int8)]
+    tfs = np.bincount(inverse, weights=weights, minlength=len(pairs)).astype(np.float32)
+    docs = (pairs % max(len(rows), 1)).astype(np.int32)
+    offsets = np.searchsorted(pairs // max(len(rows), 1), np.arange(len(terms) + 1)).astype(np.int64)
+
+    labels = sorted({row['theme_label'] or '' for row in rows})
+    label_codes = {label: i for i, label in enumerate(labels)}
+
+    tmp_dir = segment_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    arrays = {
+        "postings.offsets": offsets, "postings.docs": docs, "postings.tf": tfs,
+        "docs.length": lengths,
+        "docs.year": np.array([_year_number(row['year']) for row in rows], dtype=np.int32),
+        "docs.label": np.array([label_codes[row['theme_label'] or ''] for row in rows], dtype=np.int32),
+    }
+    for name, values in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), values)
+    # One JSON line per paper, read back by offset so results never load the whole file
+    lines = [json.dumps([row['title'], row['theme_label'] or '', row['year']], ensure_ascii=False)
+             .encode('utf-8') + b"\n" for row in rows]
+    line_offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+    np.cumsum([len(line) for line in lines], out=line_offsets[1:])
+    np.save(os.path.join(tmp_dir, "docs.offsets.npy"), line_offsets)
+    with open(os.path.join(tmp_dir, "docs.jsonl"), 'wb') as file:
+        file.write(b"".join(lines))
+    meta.update(docs=len(rows), format_version=FORMAT_VERSION, vocabulary=terms, labels=labels)
+    with open(os.path.join(tmp_dir, "meta.json"), 'w', encoding='utf-8') as file:
+        json.dump(meta, file, ensure_ascii=False)
+    shutil.rmtree(segment_dir, ignore_errors=True)
+    os.replace(tmp_dir, segment_dir)
+
+
+def add_files(paths, index_dir, source=None, year=None, file_years=None):
+    """
+    Index new or changed files into `index_dir`. Papers without a year get
+    input_year(path, year, file_years). Yields (path, document count, or None
+    when unchanged, or 0 when covered by another output).
+    """
+    from .wos import file_hash  # pulls in pandas, which queries do not need
+
+    os.makedirs(index_dir, exist_ok=True)
+    manifest_path = os.path.join(index_dir, "manifest.json")
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+    except FileNotFoundError:
+        manifest = {}
+
+    for path in paths:
+        if covered_by_full_output(path):
+            yield path, 0
+            continue
+        key = os.path.abspath(path)
+        digest = file_hash(path)
+        default_year = input_year(path, year, file_years)
+        entry = manifest.get(key)
+        if (entry and entry['sha256'] == digest and entry['format_version'] == FORMAT_VERSION
+                and entry.get('default_year') == default_year):
+            yield path, None
+            continue
+        for segment in (entry or {}).get('segments', []):
+            shutil.rmtree(os.path.join(index_dir, segment), ignore_errors=True)
+        file_source = venue_and_year(path)[0]
+        stem = os.path.splitext(os.path.basename(path))[0]
+        rows_left = paper_rows(path, default_year=default_year)
+        segments, count = [], 0
+        while True:
+            rows = list(itertools.islice(rows_left, SEGMENT_SIZE))
+            if not rows and segments:
+                break
+            segment = f"{stem}.{len(segments)}"
+            build_segment(os.path.join(index_dir, segment), rows,
+                          {'source_file': os.path.basename(path), 'source': source or file_source})
+            segments.append(segment)
+            count += len(rows)
+        manifest[key] = {'sha256': digest, 'format_version': FORMAT_VERSION, 'default_year': default_year,
+                         'segments': segments}
+        with open(manifest_path + ".tmp", 'w', encoding='utf-8') as file:
+            json.dump(manifest, file, ensure_ascii=False, indent=2)
+        os.replace(manifest_path + ".tmp", manifest_path)
+        yield path, count
+
+
+class Segment:
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json"), 'r', encoding='utf-8') as file:
+            self.meta = json.load(file)
+        self.path = path
+        self.source = self.meta['source']
+        self.labels = self.meta['labels']
+        self.terms = {term: i for i, term in enumerate(self.meta['vocabulary'])}
+        self.offsets = self._load("postings.offsets")
+        self.docs = self._load("postings.docs")
+        self.tf = self._load("postings.tf")
+        self.lengths = self._load("docs.length")
+        self.years = self._load("docs.year")
+        self.label_codes = self._load("docs.label")
+
+    def _load(self, name):
+        return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode='r')
+
+    def postings(self, token):
+        term = self.terms.get(token)
+        if term is None:
+            return None, None
+        start, end = self.offsets[term], self.offsets[term + 1]
+        return self.docs[start:end], self.tf[start:end]
+
+    def display(self, doc):
+        offsets = self._load("docs.offsets")
+        with open(os.path.join(self.path, "docs.jsonl"), 'rb') as file:
+            file.seek(offsets[doc])
+            title, label, year = json.loads(file.read(offsets[doc + 1] - offsets[doc]))
+        return {'title': title, 'theme_label': label, 'year': year, 'source': self.source,
+                'file': self.meta['source_file']}
+
+
+class Searcher:
+    """All segments of an index, with BM25 statistics over the whole collection."""
+
+    def __init__(self, index_dir):
+        self.segments = [Segment(os.path.join(index_dir, name)) for name in sorted(os.listdir(index_dir))
+                         if os.path.isfile(os.path.join(index_dir, name, "meta.json"))]
+        self.total_docs = sum(len(segment.lengths) for segment in self.segments)
+        total_length = sum(float(segment.lengths.sum()) for segment in self.segments)
+        self.avg_length = total_length / max(self.total_docs, 1)
+
+    def _idf(self, token):
+        df = 0
+        for segment in self.segments:
+            term = segment.terms.get(token)
+            if term is not None:
+                df += int(segment.offsets[term + 1] - segment.offsets[term])
+        return np.log(1 + (self.total_docs - df + 0.5) / (df + 0.5)), df
+
+    def search(self, query, k=10, source=None, year=None, label=None):
+        """Top `k` (score, hit dict) for `query` within the filters, best first."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        idfs = {token: self._idf(token) for token in tokens}
+        tokens = [token for token in tokens if idfs[token][1]]
+        hits = []
+        for segment in self.segments:
+            if source and segment.source != source.lower():
+                continue
+            allowed = None
+            if label:
+                codes = [i for i, name in enumerate(segment.labels) if label.lower() in name.lower()]
+                if not codes:
+                    continue
+                allowed = np.isin(segment.label_codes, codes)
+            if year:
+                by_year = np.asarray(segment.years) == int(year)
+                allowed = by_year if allowed is None else allowed & by_year
+                if not allowed.any():
+                    continue
+
+            scores = None
+            for token in tokens:
+                docs, tf = segment.postings(token)
+                if docs is None:
+                    continue
+                norm = K1 * (1 - B + B * segment.lengths[docs] / self.avg_length)
+                contribution = idfs[token][0] * tf * (K1 + 1) / (tf + norm)
+                if scores is None:
+                    scores = np.zeros(len(segment.lengths), dtype=np.float64)
+                scores[docs] += contribution
+            if scores is None:
+                continue
+            if allowed is not None:
+                scores[~allowed] = 0
+            candidates = np.flatnonzero(scores)
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            hits.extend((float(scores[doc]), segment, int(doc)) for doc in candidates)
+
+        best = heapq.nlargest(k, hits, key=lambda hit: hit[0])
+        return [(score, segment.display(doc)) for score, segment, doc in best]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="BM25 search over the labeled paper outputs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = commands.add_parser("index", help="add new or changed *_keywords.json files")
+    index_parser.add_argument("inputs", nargs="+")
+    index_parser.add_argument("-d", "--index-dir", default="datas/search_index")
+    index_parser.add_argument("--source", help="source for all inputs (default: from the file name)")
+    index_parser.add_argument("--year", action="append",
+                              help="YEAR of papers without one in inputs whose file names carry none, "
+                                   "or FILE=YEAR for one input (repeatable)")
+
+    query_parser = commands.add_parser("query", help="search the index")
+    query_parser.add_argument("query")
+    query_parser.add_argument("-d", "--index-dir", default="datas/search_index")
+    query_parser.add_argument("-k", type=int, default=10, help="number of results")
+    query_parser.add_argument("--source", help="e.g. usenix, ndss, ccs, sp")
+    query_parser.add_argument("--year", type=int)
+    query_parser.add_argument("--label", help="theme_label substring, e.g. 漏洞挖掘 or 3.8.1")
+    query_parser.add_argument("--json", action="store_true", help="print JSON lines")
+    args = parser.parse_args(argv)
+
+    if args.command == "index":
+        try:
+            year, file_years = parse_year_options(args.year)
+        except ValueError as error:
+            parser.error(str(error))
+        for path, count in add_files(args.inputs, args.index_dir, args.source, year, file_years):
+            if count is None:
+                print(f"{path}: unchanged")
+            elif count == 0:
+                print(f"{path}: skipped, covered by the full *_keywords output")
+            else:
+                print(f"{path}: {count} papers indexed")
+        return
+
+    searcher = Searcher(args.index_dir)
+    started = time.perf_counter()
+    results = searcher.search(args.query, args.k, args.source, args.year, args.label)
+    elapsed = (time.perf_counter() - started) * 1000
+    for score, hit in results:
+        if args.json:
+            print(json.dumps(dict(hit, score=round(score, 3)), ensure_ascii=False))
+        else:
+            print(f"{score:6.2f}  {hit['source']} {hit['year']}  [{hit['theme_label']}]  {hit['title']}")
+    print(f"{len(results)} results from {searcher.total_docs} papers in {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
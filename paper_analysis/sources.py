@@ -0,0 +1,141 @@
+# Per-source field adapters.
+#
+# Each collection names its fields differently (Web of Science exports use
+# "Article Title"/"Abstract"/"DOI", the Scrapy spiders "title"/"abstract"/
+# "pdf_link", AAAI "paper_title"/"pdf_url") and the labeled outputs keep a
+# slightly different shape per source. An adapter knows how to read the
+# title/abstract of one paper and how to build its two output records.
+# The paper ID helpers at the end are shared by dedup.py and the Scrapy
+# project's PaperItem, so both derive the same ID for a paper.
+
+import hashlib
+import re
+import unicodedata
+
+_DOI_RE = re.compile(r'10\.\d{4,9}/\S+')
+_NON_ALNUM_RE = re.compile(r'[^0-9a-z]+')
+
+
+class SourceAdapter:
+    name = ""
+    title_field = 'title'
+    abstract_field = 'abstract'
+    authors_field = 'authors'
+    doi_field = 'doi'
+    year_field = 'year'
+    pdf_field = 'pdf_link'
+
+    def fields(self, paper):
+        """(title, abstract) sent to the LLM."""
+        return (paper.get(self.title_field, 'No Title Provided'),
+                paper.get(self.abstract_field, 'No Abstract Provided'))
+
+    def common(self, paper):
+        """The paper under source-independent field names ('' when missing)."""
+        return {
+            'title': paper.get(self.title_field) or '',
+            'authors': paper.get(self.authors_field) or '',
+            'abstract': paper.get(self.abstract_field) or '',
+            'doi': paper.get(self.doi_field) or '',
+            'year': str(paper.get(self.year_field) or ''),
+            'pdf_link': paper.get(self.pdf_field) or '',
+        }
+
+    def records(self, paper, result):
+        """(full record, keywords-only record) for *_keywords.json / *_keywords_only.json."""
+        raise NotImplementedError
+
+
+class WosAdapter(SourceAdapter):
+    """Web of Science exports converted by webofscience_paper_extract_*.py."""
+
+    name = "wos"
+    title_field = 'Article Title'
+    abstract_field = 'Abstract'
+    authors_field = 'Authors'
+    doi_field = 'DOI'
+    year_field = 'Publication Year'
+
+    def records(self, paper, result):
+        title, abstract = self.fields(paper)
+        pub_year = paper.get('Publication Year', '')
+        paper_data = {
+            'title': title,
+            'authors': paper.get('Authors', []),
+            'keywords': result['keywords'],
+            'abstract': abstract,
+            'doi': 'https://dl.acm.org/doi/' + paper.get('DOI', ''),
+            'pub_year': pub_year,
+            'theme_label': result['theme_label']
+        }
+        paper_keywords_data = {
+            'title': title,
+            'keywords': result['keywords'],
+            'pub_year': pub_year,
+            'theme_label': result['theme_label']
+        }
+        return paper_data, paper_keywords_data
+
+
+class ConferenceAdapter(SourceAdapter):
+    """Papers crawled by the usenix / ndss spiders."""
+
+    name = "conference"
+
+    def records(self, paper, result):
+        title, abstract = self.fields(paper)
+        paper_data = {
+            'title': title,
+            'authors': paper.get('authors', []),
+            'keywords': result['keywords'],
+            'abstract': abstract,
+            'pdf_link': paper.get(self.pdf_field, ''),
+            'theme_label': result['theme_label']
+        }
+        paper_keywords_data = {
+            'title': title,
+            'keywords': result['keywords'],
+            'theme_label': result['theme_label']
+        }
+        # The spiders record the year; without it search and analytics file the paper under "unknown"
+        year = self.common(paper)['year']
+        if year:
+            paper_data['year'] = paper_keywords_data['year'] = year
+        return paper_data, paper_keywords_data
+
+
+class AaaiAdapter(ConferenceAdapter):
+    """Papers crawled by the aaai spider."""
+
+    name = "aaai"
+    title_field = 'paper_title'
+    pdf_field = 'pdf_url'
+
+
+ADAPTERS = {adapter.name: adapter for adapter in (WosAdapter(), ConferenceAdapter(), AaaiAdapter())}
+
+
+def detect_adapter(paper):
+    """Pick an adapter from the field names of a sample paper."""
+    if 'Article Title' in paper:
+        return ADAPTERS['wos']
+    if 'paper_title' in paper:
+        return ADAPTERS['aaai']
+    return ADAPTERS['conference']
+
+
+def normalize_doi(doi):
+    """'https://dl.acm.org/doi/10.1145/X' / 'doi:10.1145/X' / '10.1145/X' -> '10.1145/x'."""
+    match = _DOI_RE.search(str(doi or '').strip().lower())
+    return match.group(0).rstrip('.') if match else ''
+
+
+def normalize_title(title):
+    text = unicodedata.normalize('NFKD', str(title or '')).encode('ascii', 'ignore').decode('ascii')
+    return _NON_ALNUM_RE.sub(' ', text.lower()).strip()
+
+
+def stable_id(doi='', title=''):
+    """Paper ID that stays the same across runs and sources: from the DOI when known."""
+    key = f"doi:{normalize_doi(doi)}" if normalize_doi(doi) else f"title:{normalize_title(title)}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
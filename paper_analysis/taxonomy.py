@@ -0,0 +1,225 @@
+# Structured view of labels.txt.
+#
+# labels.txt is a numbered, multi-level taxonomy ("3、网络与系统安全",
+# "3.8 系统安全测评", "3.8.1 漏洞挖掘与逆向分析", ...) wrapped in a short
+# instruction preamble. This module splits it into its top-level domains so
+# prompts can send either the domain list or a single domain's subtree, and
+# indexes every node by code and normalized name so a model's answer can be
+# resolved to its canonical label with dict lookups (plus a fuzzy fallback).
+
+import difflib
+import re
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+
+_DOMAIN_RE = re.compile(r'^(\d+)[、.．]\s*(\S.*)$')
+_ITEM_RE = re.compile(r'^(\d+(?:\.\d+)+)\s*(\S.*)$')
+_CODE_RE = re.compile(r'^(\d+(?:\.\d+)*)(?:[、.．:：\s]+|$)(.*)$')
+# "主题标签：3.8.1 漏洞挖掘与逆向分析", "**选定的主题标签**: ..."
+_ANSWER_PREFIX_RE = re.compile(r'^(?:选定的)?(?:主题)?(?:标签|领域)(?:名称)?\s*[:：]\s*')
+_QUOTES = '`*"\'“”‘’「」『』《》【】 '
+# Lowest difflib ratio accepted by the fuzzy fallback ("漏洞挖掘与逆向" -> "漏洞挖掘与逆向分析" is 0.88)
+FUZZY_CUTOFF = 0.75
+
+
+def normalize_label(text):
+    """Lookup key of a label: NFKC (full-width to ASCII), lowercase, no whitespace or quotes."""
+    text = unicodedata.normalize("NFKC", text or "").strip().strip(_QUOTES).rstrip("。.")
+    return re.sub(r'\s+', '', text).lower()
+
+
+class Label(namedtuple('Label', 'code name')):
+    """A taxonomy node: Label('3.8.1', '漏洞挖掘与逆向分析') or the domain Label('3', '网络与系统安全')."""
+
+    __slots__ = ()
+
+    @property
+    def is_domain(self):
+        return '.' not in self.code
+
+    @property
+    def text(self):
+        """The canonical theme_label: "3.8.1 漏洞挖掘与逆向分析", domains by name only."""
+        return self.name if self.is_domain else f"{self.code} {self.name}"
+
+    def contains(self, other):
+        return other.code.startswith(self.code + '.')
+
+
+class Domain:
+    """One top-level domain ("3、网络与系统安全") and its sub-items."""
+
+    def __init__(self, code, name):
+        self.code = code
+        self.name = name
+        self.items = []  # (code, name) pairs, in file order
+
+    @property
+    def header(self):
+        return f"{self.code}、{self.name}"
+
+    def subtree_text(self):
+        """The domain and its sub-items, formatted as in labels.txt."""
+        return "\n".join([self.header] + [f"{code} {name}" for code, name in self.items])
+
+    def __repr__(self):
+        return f"Domain({self.code!r}, {self.name!r}, {len(self.items)} items)"
+
+
+class Taxonomy:
+    def __init__(self, domains, aliases=None):
+        self.domains = domains
+        self.nodes = {}  # code -> Label
+        # normalized name, "code name" or alias -> Label; None where a name is ambiguous
+        self._index = {}
+        for domain in domains:
+            self._add(Label(domain.code, domain.name), domain.header)
+            for code, name in domain.items:
+                self._add(Label(code, name), f"{code} {name}")
+        for alias, target in (aliases or {}).items():
+            self.add_alias(alias, target)
+        self._fuzzy_keys = None
+
+    def _add(self, label, line):
+        self.nodes[label.code] = label
+        for key in (line, f"{label.code} {label.name}"):
+            self._index[normalize_label(key)] = label
+        # "人的安全行为与管理 等" and "网络通信安全 (含 5/6G)" also go by their short names
+        short = re.sub(r'\s*(?:[(（][^)）]*[)）]|等)$', '', label.name)
+        for name in {label.name, short}:
+            self._add_name(normalize_label(name), label)
+
+    def _add_name(self, key, label):
+        if key not in self._index:
+            self._index[key] = label
+            return
+        other = self._index[key]
+        if other is None or other == label:
+            return
+        # "人工智能安全" is both domain 7 and 7.1: the name means the more specific node.
+        # "数学理论" (1.1 and 2.1) and "其他" resolve only together with their code.
+        if other.contains(label):
+            self._index[key] = label
+        elif not label.contains(other):
+            self._index[key] = None
+
+    def add_alias(self, alias, target):
+        """Make `alias` resolve to `target` (a code, name or label line)."""
+        label = self.resolve(target, fuzzy=False)
+        if label is None:
+            raise ValueError(f"alias {alias!r}: unknown label {target!r}")
+        self._index[normalize_label(alias)] = label
+        self._fuzzy_keys = None
+
+    def resolve(self, answer, fuzzy=True):
+        """
+        The Label a model answer names, or None. Exact forms ("3.8.1 漏洞挖掘与逆向分析",
+        "3.8.1", "漏洞挖掘与逆向分析", an alias, with any width, spacing or quoting) are
+        dict lookups; `fuzzy` also accepts a close misspelling of a unique name.
+        """
+        text = unicodedata.normalize("NFKC", answer or "").strip().strip(_QUOTES)
+        text = _ANSWER_PREFIX_RE.sub('', text).strip(_QUOTES)
+        if not text:
+            return None
+        label = self._index.get(normalize_label(text))
+        if label is not None:
+            return label
+        match = _CODE_RE.match(text)
+        if match and match.group(1) in self.nodes:
+            # The code wins over a name that does not fit it ("3.8.1 人工智能安全" is 3.8.1):
+            # a name alone may be ambiguous and models copy codes more reliably than names
+            return self.nodes[match.group(1)]
+        # "密码协议设计与分析 (2.3.2)"
+        for part in re.split(r'[()]', text):
+            if part.strip() and part.strip() != text:
+                label = self._index.get(normalize_label(part)) or self.nodes.get(part.strip())
+                if label is not None:
+                    return label
+        return self._fuzzy(text) if fuzzy else None
+
+    def _fuzzy(self, text):
+        if self._fuzzy_keys is None:
+            self._fuzzy_keys = [key for key, label in self._index.items()
+                                if label is not None and not key[:1].isdigit()]
+        key = normalize_label(_CODE_RE.sub(r'\2', text) if _CODE_RE.match(text) else text)
+        if len(key) < 4:
+            # Short fragments such as "安全" are close to too many names
+            return None
+        matches = difflib.get_close_matches(key, self._fuzzy_keys, n=2, cutoff=FUZZY_CUTOFF)
+        if not matches:
+            return None
+        best = self._index[matches[0]]
+        # Two different labels that are equally close: better to ask again than to guess
+        if len(matches) > 1 and self._index[matches[1]] != best and (
+                difflib.SequenceMatcher(None, key, matches[0]).ratio()
+                == difflib.SequenceMatcher(None, key, matches[1]).ratio()):
+            return None
+        return best
+
+    @classmethod
+    def parse(cls, text, aliases=None):
+        domains = []
+        for raw in text.splitlines():
+            line = raw.strip()
+            item = _ITEM_RE.match(line)
+            if item and domains:
+                domains[-1].items.append((item.group(1), item.group(2).strip()))
+                continue
+            domain = _DOMAIN_RE.match(line)
+            if domain:
+                domains.append(Domain(domain.group(1), domain.group(2).strip()))
+        return cls(domains, aliases)
+
+    def domain_of(self, label):
+        """The Domain of a resolved Label."""
+        code = label.code.split('.')[0]
+        for domain in self.domains:
+            if domain.code == code:
+                return domain
+        return None
+
+    def domain_list_text(self):
+        """Compact prompt text listing only the top-level domains."""
+        return "\n".join(domain.header for domain in self.domains)
+
+    def find_domain(self, answer):
+        """
+        Resolve a model answer such as "3、网络与系统安全", "网络与系统安全" or
+        "3" to a Domain, or None.
+        """
+        text = answer.strip().strip('`*"\'“”「」 ')
+        match = re.match(r'^(\d+)', text)
+        if match:
+            for domain in self.domains:
+                if domain.code == match.group(1):
+                    return domain
+        for domain in self.domains:
+            # Short fragments such as "安全" occur in every domain name
+            if domain.name in text or (len(text) >= 4 and text in domain.name):
+                return domain
+        return None
+
+    def domain_of_label(self, label):
+        """
+        The Domain a theme_label belongs to: "3.8.1 漏洞挖掘与逆向分析", "系统安全测评"
+        (a sub-item name) and "人工智能安全" all resolve; None when nothing matches.
+        """
+        text = (label or "").strip()
+        # "密码协议设计与分析 (2.3.2)", "Data Privacy Protection (数据隐私保护)": try each part too
+        candidates = [text] + [part.strip() for part in re.split(r'[(（)）]', text) if part.strip()]
+        for candidate in dict.fromkeys(candidates):
+            domain = self.find_domain(candidate)
+            if domain:
+                return domain
+            for domain in self.domains:
+                if any(name == candidate or (len(candidate) >= 4 and candidate in name)
+                       for _, name in domain.items):
+                    return domain
+        return None
+
+
+@lru_cache(maxsize=16)
+def cached_taxonomy(text):
+    """Taxonomy.parse(text), parsed once per distinct labels text (labels.txt, domain lists, subtrees)."""
+    return Taxonomy.parse(text)
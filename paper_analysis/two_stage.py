@@ -0,0 +1,86 @@
+# Two-stage (hierarchical) classification.
+#
+# The single-shot prompt inlines the whole of labels.txt for every paper.
+# In two-stage mode the first call extracts the keywords and picks one of
+# the top-level domains from a compact list; the second call sends only the
+# title, those keywords and the chosen domain's subtree to pick the
+# fine-grained label (the same label-only prompt LabelingEngine re-asks with).
+
+from .llm import LABEL_PROMPT_TEMPLATE, build_chain
+from .parsing import StreamingLabelParser, first_line, parse_label_response
+
+DOMAIN_PROMPT_TEMPLATE = """
+你是一个网络安全领域的科研导师。给定以下论文的标题和摘要：
+
+Title: {title}
+Abstract: {abstract}
+
+请执行以下任务：
+1.  提取三个最能代表论文研究方向的核心关键词。
+2.  每个关键词要求简洁、准确。
+3.  在每个关键词后，提供其对应的中文翻译，格式为：`关键词 (中文翻译)`。
+4.  在每个关键词及其翻译后，附上一句对该研究方向或关键词含义的简短归纳（15字以内）。
+5.  将三个关键词及其相关信息按顺序列出，每个占一行。
+6.  在关键词列表之后，另起一行，从以下一级领域中选择一个最适合的领域：
+
+{labels}
+
+7.  请确保最后一行**只包含**所选领域，不要有任何其他文字或格式。
+
+输出格式示例：
+Keyword1 (翻译1) - 简短归纳1
+Keyword2 (翻译2) - 简短归纳2
+Keyword3 (翻译3) - 简短归纳3
+
+选定的领域
+"""
+
+SUBTREE_PROMPT_TEMPLATE = LABEL_PROMPT_TEMPLATE
+
+
+class TwoStageClassifier:
+    """
+    Runs the domain and subtree calls through a LabelingEngine, so both
+    stages share its cache, rate limiter and token accounting.
+    """
+
+    def __init__(self, taxonomy, domain_chain, subtree_chain, labels, default_label):
+        self.taxonomy = taxonomy
+        self.domain_chain = domain_chain
+        self.subtree_chain = subtree_chain
+        self.labels = labels
+        self.default_label = default_label
+        self.domain_list = taxonomy.domain_list_text()
+
+    @classmethod
+    def from_llm(cls, llm, taxonomy, labels, default_label):
+        """Build both chains on `llm` (None for cache-only runs)."""
+        return cls(taxonomy,
+                   build_chain(llm, DOMAIN_PROMPT_TEMPLATE, ["title", "abstract", "labels"]),
+                   build_chain(llm, SUBTREE_PROMPT_TEMPLATE, ["title", "keywords", "labels"]),
+                   labels, default_label)
+
+    async def classify(self, engine, semaphore, title, abstract, usage):
+        """Return (keywords_output, theme_label) for one paper."""
+        response = await engine._invoke(
+            semaphore, self.domain_chain, DOMAIN_PROMPT_TEMPLATE,
+            {"title": title, "abstract": abstract, "labels": self.domain_list}, usage,
+            answer_parser=lambda: StreamingLabelParser(self.domain_list))
+        with engine.metrics.stage("parse"):
+            keywords_output, domain_answer = parse_label_response(
+                response, self.domain_list, self.default_label, title)
+
+        domain = self.taxonomy.find_domain(domain_answer)
+        # An unrecognised domain falls back to the full taxonomy
+        subtree = domain.subtree_text() if domain else self.labels
+        response = await engine._invoke(
+            semaphore, self.subtree_chain, SUBTREE_PROMPT_TEMPLATE,
+            {"title": title, "keywords": keywords_output, "labels": subtree}, usage,
+            answer_parser=lambda: StreamingLabelParser(subtree, keyword_lines=0))
+
+        with engine.metrics.stage("parse"):
+            label = self.taxonomy.resolve(first_line(response))
+        if label is None:
+            # Keep the coarse domain rather than an unvalidated answer
+            return keywords_output, domain.name if domain else self.default_label
+        return keywords_output, label.text
@@ -0,0 +1,156 @@
+# Web of Science export ingester.
+#
+# Converts WoS exports (.xls, .xlsx or tab-delimited text) into the JSON
+# arrays the labeling step reads. Only the needed columns are loaded and
+# they are converted column-wise; missing values become "" instead of the
+# string "nan". Several exports are converted in parallel, and the parsed
+# output is cached by file content hash so unchanged exports are skipped.
+#
+#   python -m paper_analysis.wos datas/CCS24.xls datas/SP24.xls
+#   python -m paper_analysis.wos exports/*.txt -o datas --jobs 4
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+# Output field -> tab-delimited field tag
+FIELDS = {
+    "Article Title": "TI",
+    "Authors": "AU",
+    "Abstract": "AB",
+    "Publication Year": "PY",
+    "DOI": "DI",
+}
+YEAR_FIELD = "Publication Year"
+# Bump when the output format changes so cached conversions are not reused
+FORMAT_VERSION = 1
+
+_OLE_MAGIC = b"\xd0\xcf\x11\xe0"
+_ZIP_MAGIC = b"PK\x03\x04"
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _wanted_column(name):
+    name = str(name).strip().lstrip("\ufeff")
+    return name in FIELDS or name in FIELDS.values()
+
+
+def read_export(path):
+    """Read the needed columns of one export, whatever its format."""
+    with open(path, "rb") as file:
+        magic = file.read(4)
+    if magic == _OLE_MAGIC or magic == _ZIP_MAGIC:
+        df = pd.read_excel(path, usecols=_wanted_column, dtype=object)
+    else:
+        # Tab-delimited exports are UTF-8 (older ones UTF-16) and unquoted
+        encoding = "utf-16" if magic[:2] in (b"\xff\xfe", b"\xfe\xff") else "utf-8-sig"
+        df = pd.read_csv(path, sep="\t", usecols=_wanted_column, dtype=object, encoding=encoding,
+                         quoting=csv.QUOTE_NONE, index_col=False)
+    tags = {tag: field for field, tag in FIELDS.items()}
+    return df.rename(columns=lambda c: tags.get(str(c).strip().lstrip("\ufeff"), str(c).strip()))
+
+
+def to_records(df):
+    """Column-wise conversion to the extractor's JSON records (all values strings)."""
+    out = pd.DataFrame(index=df.index)
+    for field in FIELDS:
+        if field not in df:
+            out[field] = ""
+            continue
+        column = df[field]
+        if field == YEAR_FIELD:
+            # Years may come back as floats (2024.0) when some rows are empty
+            column = pd.to_numeric(column, errors="coerce").astype("Int64")
+        out[field] = column.astype("string").fillna("")
+    return out.to_dict("records")
+
+
+def convert(path, output_path, cache_dir=None, digest=None):
+    """
+    Convert one export to `output_path`. Returns (record count or None when
+    reused from the cache, output_path).
+    """
+    cached = None
+    if cache_dir:
+        digest = digest or file_hash(path)
+        cached = os.path.join(cache_dir, f"{digest}-v{FORMAT_VERSION}.json")
+        if os.path.exists(cached):
+            if os.path.abspath(cached) != os.path.abspath(output_path):
+                shutil.copyfile(cached, output_path)
+            return None, output_path
+
+    records = to_records(read_export(path))
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(records, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, output_path)
+    if cached:
+        os.makedirs(cache_dir, exist_ok=True)
+        shutil.copyfile(output_path, cached + ".tmp")
+        os.replace(cached + ".tmp", cached)
+    return len(records), output_path
+
+
+def _convert_job(job):
+    return convert(*job)
+
+
+def output_path_for(path, output_dir=None):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(output_dir or os.path.dirname(path) or ".", stem + ".json")
+
+
+def convert_all(paths, output_dir=None, cache_dir=".wos_cache", jobs=None):
+    """Convert many exports, in a process pool when there is more than one to parse."""
+    jobs_left = []
+    for path in paths:
+        output_path = output_path_for(path, output_dir)
+        digest = file_hash(path) if cache_dir else None
+        cached = cache_dir and os.path.exists(os.path.join(cache_dir, f"{digest}-v{FORMAT_VERSION}.json"))
+        if cached:
+            yield convert(path, output_path, cache_dir, digest) + (path,)
+        else:
+            jobs_left.append((path, output_path, cache_dir, digest))
+
+    if len(jobs_left) == 1 or jobs == 1:
+        for job in jobs_left:
+            yield convert(*job) + (job[0],)
+        return
+    if jobs_left:
+        with ProcessPoolExecutor(max_workers=min(jobs or os.cpu_count() or 1, len(jobs_left))) as pool:
+            for job, result in zip(jobs_left, pool.map(_convert_job, jobs_left)):
+                yield result + (job[0],)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert Web of Science exports to JSON.")
+    parser.add_argument("inputs", nargs="+", help=".xls / .xlsx / tab-delimited WoS exports")
+    parser.add_argument("-o", "--output-dir", help="directory for <name>.json (default: next to each input)")
+    parser.add_argument("--cache-dir", default=".wos_cache", help="parsed-output cache ('' disables)")
+    parser.add_argument("--jobs", type=int, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    for count, output_path, path in convert_all(args.inputs, args.output_dir, args.cache_dir or None, args.jobs):
+        if count is None:
+            print(f"{path}: unchanged, reused cached conversion -> {output_path}")
+        else:
+            print(f"{path}: {count} records -> {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The Scrapy project is imported the way `scrapy crawl` sees it, from its own directory
+SCRAPY_PROJECT = os.path.join(ROOT, "4_security_top_conference", "paper_collect")
+if SCRAPY_PROJECT not in sys.path:
+    sys.path.insert(0, SCRAPY_PROJECT)
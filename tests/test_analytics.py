@@ -0,0 +1,40 @@
+import json
+import os
+
+from paper_analysis.analytics import partial_aggregate, render_report, summarize
+from paper_analysis.taxonomy import Taxonomy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write(path, papers):
+    path.write_text(json.dumps(papers, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+def paper(title, label, keywords):
+    return {"title": title, "abstract": "x", "keywords": keywords, "theme_label": label}
+
+
+def test_papers_without_a_year_stay_out_of_per_year_figures(tmp_path):
+    with open(os.path.join(ROOT, "web_of_science", "labels.txt"), "r", encoding="utf-8") as file:
+        taxonomy = Taxonomy.parse(file.read())
+    ccs = write(tmp_path / "CCS24_papers_keywords.json", [
+        paper("A", "3.8.1 漏洞挖掘与逆向分析", "fuzzing (模糊测试)"),
+        paper("B", "人工智能安全", "model stealing (模型窃取)")])
+    usenix = write(tmp_path / "usenix_papers_keywords_v2.json", [
+        paper("C", "人工智能安全", "fuzzing (模糊测试)")] * 3)
+
+    summary = summarize([partial_aggregate(ccs, taxonomy), partial_aggregate(usenix, taxonomy)])
+    assert summary['papers'] == 5
+    assert summary['unknown_year_papers'] == 3
+    assert list(summary['domain_share_by_year']) == ["2024"]
+    assert sum(summary['domain_share_by_year']["2024"].values()) == 1
+    assert summary['top_keywords']['fuzzing'] == 4
+    assert summary['keyword_trends']['fuzzing'] == {"2024": 1}
+    assert "3 of them have no year" in render_report(summary)
+
+    summary = summarize([partial_aggregate(ccs, taxonomy), partial_aggregate(usenix, taxonomy, "2024")])
+    assert summary['unknown_year_papers'] == 0
+    assert summary['keyword_trends']['fuzzing'] == {"2024": 4}
+    assert "no year" not in render_report(summary)
@@ -0,0 +1,70 @@
+import os
+
+from paper_analysis.batching import BATCH_PROMPT_TEMPLATE, BatchLabeler
+from paper_analysis.cache import ResponseCache
+from paper_analysis.engine import LabelingEngine
+from paper_analysis.llm import PROMPT_TEMPLATE, APIError
+from paper_analysis.mock_server import canned_answer
+from paper_analysis.retry import RetryPolicy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+with open(os.path.join(ROOT, "web_of_science", "labels.txt"), "r", encoding="utf-8") as file:
+    LABELS = file.read().strip()
+
+
+class CannedChain:
+    """Answers like the mock server; prompts that mention `poison` fail with a 500."""
+
+    def __init__(self, template, poison=None):
+        self.template = template
+        self.poison = poison
+        self.calls = []
+
+    async def ainvoke(self, inputs, config=None):
+        prompt = self.template.format(**inputs)
+        self.calls.append(prompt)
+        if self.poison and self.poison in prompt:
+            raise APIError("internal error", status=500)
+        return canned_answer(prompt)
+
+
+def engine_for(batch_size, cache=None, poison=None, retry_policy=None):
+    single, batch = CannedChain(PROMPT_TEMPLATE, poison), CannedChain(BATCH_PROMPT_TEMPLATE, poison)
+    engine = LabelingEngine(single, LABELS, "未分类", prompt_template=PROMPT_TEMPLATE, cache=cache,
+                            batcher=BatchLabeler(batch, LABELS, batch_size), retry_policy=retry_policy)
+    return engine, single, batch
+
+
+def fields(paper):
+    return paper["title"], paper["abstract"]
+
+
+PAPERS = [{"title": f"Paper {i} on Fuzzing", "abstract": f"Abstract {i}."} for i in range(6)]
+
+
+def test_batch_answers_are_cached_per_paper(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), labels=LABELS)
+    engine, single, batch = engine_for(3, cache)
+    first = engine.label_papers(PAPERS, fields)
+    assert len(batch.calls) == 2 and not single.calls
+
+    # Other order and other batch boundaries: every paper comes from the cache
+    engine, single, batch = engine_for(4, cache)
+    second = engine.label_papers(PAPERS[::-1], fields)
+    assert not batch.calls and not single.calls
+    assert [result['theme_label'] for result in second[::-1]] == [result['theme_label'] for result in first]
+    assert all(result['usage']['cached_calls'] == 1 for result in second)
+    cache.close()
+
+
+def test_smaller_batches_do_not_rerun_the_retry_policy():
+    papers = [dict(PAPERS[0], title="Poison Paper")] + PAPERS[1:4]
+    policy = RetryPolicy({'server': (2, 0.001, 0.001)})
+    engine, single, batch = engine_for(4, poison="Poison", retry_policy=policy)
+    results = engine.label_papers(papers, fields)
+
+    # 3 attempts of the full batch, then one per halving: [Poison, P1], [P2, P3]
+    assert len(batch.calls) == 3 + 2
+    # P1 alone, then Poison alone with its retries
+    assert len(single.calls) == 1 + 3
+    assert results[0]['error'] and not any(result.get('error') for result in results[1:])
@@ -0,0 +1,140 @@
+import os
+import time
+
+import pytest
+
+from paper_analysis import cache as cache_module
+from paper_analysis.cache import ResponseCache, labels_version, main
+from paper_analysis.engine import LabelingEngine, cache_key
+from paper_analysis.llm import PROMPT_TEMPLATE
+from paper_analysis.mock_server import canned_answer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+with open(os.path.join(ROOT, "web_of_science", "labels.txt"), "r", encoding="utf-8") as file:
+    LABELS = file.read().strip()
+
+PAPERS = [{"title": f"Fuzzing Study {i}", "abstract": f"We fuzz target {i}."} for i in range(3)]
+
+
+class CannedChain:
+    def __init__(self, template):
+        self.template = template
+        self.calls = 0
+
+    async def ainvoke(self, inputs, config=None):
+        self.calls += 1
+        return canned_answer(self.template.format(**inputs))
+
+
+def label(cache_path, model="qwen-plus", labels=LABELS, template=PROMPT_TEMPLATE):
+    cache = ResponseCache(cache_path, model=model, labels=labels)
+    chain = CannedChain(template)
+    engine = LabelingEngine(chain, labels, "未分类", prompt_template=template, cache=cache)
+    engine.label_papers(PAPERS, lambda paper: (paper["title"], paper["abstract"]))
+    cache.close()
+    return chain.calls
+
+
+def test_unchanged_inputs_are_answered_from_the_cache(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    assert label(path) == len(PAPERS)
+    assert label(path) == 0
+
+
+@pytest.mark.parametrize("change", [
+    {"model": "qwen3-235b-a22b"},
+    {"labels": LABELS + "\n9. 新增领域"},
+    {"template": PROMPT_TEMPLATE + "\n请只用中文回答。"},
+])
+def test_model_labels_or_prompt_changes_miss_the_cache(tmp_path, change):
+    path = str(tmp_path / "cache.sqlite3")
+    label(path)
+    assert label(path, **change) == len(PAPERS)
+    # The old entries stay valid for the old configuration
+    assert label(path) == 0
+
+
+def test_keys_cover_the_template_inputs_and_route(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), model="qwen-plus", labels=LABELS)
+    inputs = {"title": "Fuzzing", "abstract": "We fuzz.", "labels": LABELS}
+    key = cache_key(cache, PROMPT_TEMPLATE, inputs, LABELS)
+    assert key == cache_key(cache, PROMPT_TEMPLATE, dict(inputs), LABELS)
+    assert key != cache_key(cache, PROMPT_TEMPLATE, dict(inputs, abstract="We fuzz more."), LABELS)
+    assert key != cache_key(cache, PROMPT_TEMPLATE + " ", inputs, LABELS)
+    cheap = cache_key(cache, PROMPT_TEMPLATE, inputs, LABELS, tier="cheap", model="qwen-turbo")
+    big = cache_key(cache, PROMPT_TEMPLATE, inputs, LABELS, tier="big", model="qwen-turbo")
+    assert len({key, cheap, big}) == 3
+    cache.close()
+
+
+def test_invalidate_by_model_and_labels_version(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    old = ResponseCache(path, model="qwen-plus", labels="old labels")
+    old.put(old.make_key("a"), "answer a")
+    old.put(old.make_key("b"), "answer b", model="qwen-turbo")
+    old.close()
+    new = ResponseCache(path, model="qwen-plus", labels="new labels")
+    new.put(new.make_key("a"), "answer a")
+
+    assert new.invalidate(labels_version=labels_version("old labels")) == 2
+    assert new.stats()['entries'] == 1
+    assert new.invalidate(model="qwen-plus") == 1
+    assert new.invalidate() == 0
+    assert new.stats()['entries'] == 0
+    new.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    return now
+
+
+def fill(cache, clock, count, size=100):
+    for i in range(count):
+        clock[0] += 1
+        cache.put(f"key{i}", "x" * size)
+
+
+def keys(cache):
+    return sorted(row[0] for row in cache._conn.execute("SELECT key FROM responses"))
+
+
+def test_size_limit_evicts_least_recently_used_entries(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), max_bytes=350)
+    fill(cache, clock, 5)
+    clock[0] += 1
+    assert cache.get("key0") is not None  # recently used, survives
+    assert cache.evict() == 2
+    assert keys(cache) == ["key0", "key3", "key4"]
+    assert cache.stats()['bytes'] == 300
+    cache.close()
+
+
+def test_entry_and_age_limits_apply_on_open(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(path)
+    fill(cache, clock, 5)
+    cache.close()
+
+    cache = ResponseCache(path, max_entries=3)
+    assert keys(cache) == ["key2", "key3", "key4"]
+    cache.close()
+    clock[0] += 86400  # exactly one day after key4 was stored
+    cache = ResponseCache(path, max_age_days=1)
+    assert keys(cache) == ["key4"]
+    cache.close()
+
+
+def test_maintenance_command(tmp_path, capsys):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(path, model="qwen-plus")
+    for i in range(4):
+        cache.put(cache.make_key(i), "x" * 1000, model="qwen-turbo" if i % 2 else None)
+    cache.close()
+
+    main([path, "--invalidate-model", "qwen-turbo"])
+    assert "Removed 2 entries for model qwen-turbo" in capsys.readouterr().out
+    main([path, "--max-mb", "0.001", "--stats"])
+    assert '"entries": 1' in capsys.readouterr().out
@@ -0,0 +1,31 @@
+import json
+import os
+
+from paper_analysis.cli import main
+from paper_analysis.journal import iter_papers
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LABELS = os.path.join(ROOT, "web_of_science", "labels.txt")
+
+
+def test_iter_papers_reads_arrays_and_publication_objects(tmp_path):
+    papers = [{"title": "A", "abstract": "x"}, {"title": "B", "abstract": "y"}]
+    array = tmp_path / "array.json"
+    array.write_text(json.dumps(papers), encoding="utf-8")
+    wrapped = tmp_path / "wrapped.json"
+    wrapped.write_text(json.dumps({"conferenceTitle": "CCS 2023", "publications": papers}), encoding="utf-8")
+
+    assert list(iter_papers(str(array))) == papers
+    assert list(iter_papers(str(wrapped))) == papers
+    assert len(list(iter_papers(os.path.join(ROOT, "datas", "ccs2023_publications.json")))) == 293
+
+
+def test_dry_run_reports_publication_objects_and_bad_json(tmp_path, capsys):
+    broken = tmp_path / "broken.json"
+    broken.write_text('[{"title": "A", "abstract": "x"}, {"title": ', encoding="utf-8")
+    main(["label", os.path.join(ROOT, "datas", "ccs2023_publications.json"), str(broken), "--labels", LABELS,
+          "--cache", "", "--output-dir", str(tmp_path), "--dry-run", "--dedup"])
+
+    out = capsys.readouterr().out
+    assert "ccs2023_publications.json [conference]: 293 papers" in out
+    assert f"Error: Could not decode JSON from {broken}" in out
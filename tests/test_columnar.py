@@ -0,0 +1,54 @@
+import json
+
+from paper_analysis.columnar import convert, count_by, iter_parts, main, select
+
+
+def write(path, papers):
+    path.write_text(json.dumps(papers, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+def test_raw_and_labeled_parts_of_a_venue_are_counted_once(tmp_path, capsys):
+    raw = [{"title": f"Paper {i}", "abstract": "x", "year": "2024"} for i in range(3)]
+    labeled = [dict(paper, keywords="fuzzing", theme_label="3.8.1 漏洞挖掘") for paper in raw]
+    paths = [write(tmp_path / "SP24.json", raw), write(tmp_path / "SP24_papers_keywords.json", labeled),
+             write(tmp_path / "usenix24_papers.json", raw[:2])]
+    store = str(tmp_path / "store")
+    list(convert(paths, store))
+
+    def total(kind, venue=None):
+        return sum(part.rows for part in iter_parts(store, venue=venue, kind=kind))
+
+    assert total("raw", "sp") == total("labeled", "sp") == total("all", "sp") == 3
+    assert total("all") == 5
+    assert [part.meta['labeled'] for part in iter_parts(store, venue="sp", kind="all")] == [True]
+    selected = [(part, select(part)) for part in iter_parts(store)]
+    assert count_by(selected, ["venue"]) == {("sp",): 3, ("usenix",): 2}
+
+    main(["query", store, "--venue", "sp", "--count-by", "venue"])
+    assert capsys.readouterr().out.splitlines()[-1] == "3 papers, 1 groups"
+
+
+def test_yearless_labeled_output_takes_the_year_of_its_raw_papers(tmp_path, capsys):
+    raw = [{"title": f"Paper {i}", "abstract": "x", "authors": ["A"], "pdf_link": ""} for i in range(4)]
+    labeled = [dict(paper, keywords="fuzzing", theme_label="3.8.1 漏洞挖掘与逆向分析") for paper in raw[:3]]
+    paths = [write(tmp_path / "ndss24_papers.json", raw), write(tmp_path / "ndss_papers.json", raw),
+             write(tmp_path / "ndss_papers_keywords_v2.json", labeled)]
+    store = str(tmp_path / "store")
+    assert [parts for _, parts in convert(paths, store)] == [1, 1, 1]
+
+    # ndss_papers.json and the _v2 output borrow 2024 from ndss24_papers.json
+    assert {part.meta['year'] for part in iter_parts(store, kind="raw")} == {"2024"}
+    assert [(part.meta['source_file'], len(select(part))) for part in iter_parts(store)] == [
+        ("ndss24_papers.json", 1), ("ndss_papers_keywords_v2.json", 3)]
+    main(["query", store, "--count-by", "venue,year"])
+    assert capsys.readouterr().out.splitlines()[-2:] == ["     4  ndss | 2024", "4 papers, 1 groups"]
+    assert sum(len(select(part)) for part in iter_parts(store, year="2024", kind="labeled")) == 3
+
+    assert [parts for _, parts in convert(paths, store)] == [None, None, None]
+    # Without the dated input the _v2 papers fall back to --year, else "unknown"
+    store = str(tmp_path / "alone")
+    list(convert(paths[2:], store))
+    assert [part.meta['year'] for part in iter_parts(store)] == ["unknown"]
+    list(convert(paths[2:], store, year="2023"))
+    assert [part.meta['year'] for part in iter_parts(store)] == ["2023"]
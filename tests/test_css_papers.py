@@ -0,0 +1,92 @@
+import os
+
+from scrapy.http import HtmlResponse, Request, TextResponse
+from scrapy.spidermiddlewares.httperror import HttpError
+from scrapy.utils.test import get_crawler
+from twisted.python.failure import Failure
+
+from paper_collect.fixtures import callback_name, fixture_id, load_fixtures, replay_response
+from paper_collect.parse_bench import normalize_outputs, strategies_for
+from paper_collect.spiders.css_papers import CssPapersSpider
+
+# DBLP 检索接口和 ACM 摘要页的录制（FIXTURES_RECORD 格式），每页 2 条、共 5 条，
+# 第一条是论文集本身（Editorship）；10.1145/3576915.3623003 的摘要页没有录制，回放时按 403 处理
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "css_papers")
+
+
+def make_spider():
+    return CssPapersSpider.from_crawler(get_crawler(CssPapersSpider), page_size=2)
+
+
+def crawl(spider):
+    """按录制的页面回放整个爬取过程，返回 (请求的 URL, 产出的 item)"""
+    pages = {record["id"]: (record, body) for record, body in load_fixtures(FIXTURES)}
+    queue, requested, items = list(spider.start_requests()), [], []
+    while queue:
+        request = queue.pop(0)
+        requested.append(request.url)
+        page = pages.get(fixture_id(request.url, callback_name(request)))
+        if page is None:
+            # 与 HttpErrorMiddleware 一样把非 200 响应交给 errback
+            failure = Failure(HttpError(TextResponse(request.url, status=403, request=request)))
+            failure.request = request
+            results = request.errback(failure)
+        else:
+            record, body = page
+            response = HtmlResponse(request.url, status=record["status"], headers=record["headers"], body=body,
+                                    request=request)
+            results = request.callback(response, **request.cb_kwargs)
+        for result in results or ():
+            (queue if isinstance(result, Request) else items).append(result)
+    return requested, items
+
+
+def test_dblp_pages_are_followed_until_the_total():
+    spider = make_spider()
+    requested, items = crawl(spider)
+    pages = [url for url in requested if url.startswith(spider.api_url)]
+    assert pages == [spider.page_url(offset) for offset in (0, 2, 4)]
+    assert all("h=2" in url for url in pages)
+    # 论文集本身不输出，也不抓它的摘要页
+    assert len(items) == 4
+    assert "https://dl.acm.org/doi/10.1145/3576915" not in requested
+    assert not any(item["title"].startswith("Proceedings of") for item in items)
+
+
+def test_hits_are_normalized():
+    _, items = crawl(make_spider())
+    by_title = {item["title"]: item for item in items}
+    fuzzing = by_title["Fuzzing the Linux Kernel's eBPF Verifier"]
+    assert fuzzing["authors"] == "Wei Zhang, Lena Müller"
+    assert fuzzing["pdf_link"] == "https://dl.acm.org/doi/pdf/10.1145/3576915.3623001"
+    assert (fuzzing["year"], fuzzing["source"]) == ("2023", "ccs")
+    # 只有一位作者时 DBLP 返回的是对象而不是列表
+    assert by_title["Poisoning Federated Recommender Systems"]["authors"] == "Yu Chen"
+    poster = by_title["Poster: Rowhammer on Mobile GPUs"]
+    assert (poster["doi"], poster["pdf_link"], poster["abstract"]) == (None, "https://example.org/poster.pdf", None)
+
+
+def test_abstracts_from_both_acm_layouts_and_the_errback():
+    _, items = crawl(make_spider())
+    abstracts = {item["doi"]: item["abstract"] for item in items}
+    assert abstracts["10.1145/3576915.3623001"] == (
+        "The eBPF verifier guards the kernel against unsafe programs. We present a grammar-aware fuzzer for it. "
+        "It found 12 bugs, 9 of them confirmed.")
+    assert abstracts["10.1145/3576915.3623002"] == (
+        "Federated recommenders train on user devices. "
+        "We show that a few malicious clients can promote target items.")
+    # 摘要页 403：论文照常输出，摘要留空
+    assert abstracts["10.1145/3576915.3623003"] is None
+
+
+def test_recorded_pages_replay_with_their_cb_kwargs():
+    spider = make_spider()
+    outputs = {}
+    for record, body in load_fixtures(FIXTURES):
+        strategy = strategies_for(spider.name, record["callback"])["spider"]
+        outputs.setdefault(record["callback"], []).extend(
+            normalize_outputs(strategy(replay_response(record, body, spider))))
+    next_pages = [output["cb_kwargs"] for output in outputs["parse"] if output.get("callback") == "parse"]
+    assert next_pages == [{"offset": 2}, {"offset": 4}]
+    abstracts = sorted(output["item"]["abstract"][:20] for output in outputs["parse_abstract"])
+    assert abstracts == ["Federated recommende", "The eBPF verifier gu"]
@@ -0,0 +1,184 @@
+import hashlib
+import http.server
+import os
+import threading
+import time
+import zlib
+
+import pytest
+
+from paper_analysis.fulltext import (FullTextSource, PdfStore, extract_file, extract_pending, fetch_and_extract,
+                                     text_problem)
+from paper_analysis.retry import RetryPolicy
+
+INTRO = ("Kernel drivers are a large attack sur-", "face that is hard to test. We present DriverFuzz, a "
+         "coverage-guided fuzzer for drivers.", "It found many previously unknown bugs in several kernels.")
+CONCLUSION = ("We showed that DriverFuzz finds driver bugs efficiently and with little manual effort "
+              "from the analyst.",)
+
+
+def make_pdf(lines, compress=True):
+    """A one-page PDF drawing `lines` with Tj, TJ and line moves, like real generators do."""
+    content = b"BT /F1 10 Tf 72 720 Td 12 TL\n"
+    for i, line in enumerate(lines):
+        escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").encode("latin-1")
+        if i % 3 == 1:
+            content += b"[" + b" -300 ".join(b"(" + word + b")" for word in escaped.split(b" ")) + b"] TJ T*\n"
+        else:
+            content += b"(" + escaped + b") Tj 0 -12 Td\n"
+    content += b"ET"
+    data = zlib.compress(content) if compress else content
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+               b"<< /Type /Page /Parent 2 0 R /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+               b"<< /Length %d%s >>\nstream\n" % (len(data), b" /Filter /FlateDecode" if compress else b"")
+               + data + b"\nendstream",
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    out, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer << /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return out
+
+
+def paper_pdf(title, compress=True):
+    return make_pdf([title, "Abstract", "We fuzz drivers.", "1 Introduction", *INTRO, "2 Design",
+                     "How it works.", "6 Conclusion", *CONCLUSION, "References", "[1] Someone."], compress)
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    files = {}
+    requests = []
+
+    def do_GET(self):
+        Handler.requests.append(self.path)
+        if self.path == "/slow.pdf":
+            # The first bytes arrive alone, shorter than the PDF magic
+            body = Handler.files["/p0.pdf"]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body[:2])
+            self.wfile.flush()
+            time.sleep(0.2)
+            self.wfile.write(body[2:])
+            return
+        body = Handler.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.files = {
+        "/p0.pdf": paper_pdf("DriverFuzz: Fuzzing Kernel Drivers"),
+        "/p1.pdf": paper_pdf("Another Paper", compress=False),
+        "/copy-of-p0.pdf": paper_pdf("DriverFuzz: Fuzzing Kernel Drivers"),
+        "/html.pdf": b"<html><body>Access denied</body></html>",
+    }
+    Handler.requests = []
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def fetch(urls, store):
+    return fetch_and_extract(urls, store, workers=1, retry_policy=RetryPolicy(max_retries=0))
+
+
+def test_fetch_dedups_records_failures_and_skips_on_rerun(server, tmp_path):
+    urls = [f"{server}/{name}" for name in ("p0.pdf", "p1.pdf", "copy-of-p0.pdf", "html.pdf", "missing.pdf")]
+    store = PdfStore(str(tmp_path))
+    stats = fetch(urls, store)
+    store.close()
+
+    assert stats['downloaded'] == 2
+    assert stats['deduplicated'] == 1
+    assert stats['failed'] == 2
+    assert stats['extracted'] == 2
+    store = PdfStore(str(tmp_path))
+    assert store.sha256(urls[0]) == store.sha256(urls[2])
+    assert len(os.listdir(os.path.join(str(tmp_path), "text", store.sha256(urls[0])[:2]))) == 1
+    assert store.urls[urls[3]]['error_class'] == 'client'
+    assert "not a PDF" in store.urls[urls[3]]['error']
+    assert store.urls[urls[4]]['error_class'] == 'client'
+    assert "404" in store.urls[urls[4]]['error']
+    assert not any(store.needs_fetch(url) for url in urls)
+    assert store.needs_fetch(urls[4], retry_failed=True)
+
+    # A second run downloads nothing
+    Handler.requests = []
+    stats = fetch([url for url in urls if store.needs_fetch(url)], store)
+    store.close()
+    assert stats['downloaded'] == stats['failed'] == 0
+    assert Handler.requests == []
+
+
+def test_short_first_chunk_is_a_pdf(server, tmp_path):
+    store = PdfStore(str(tmp_path))
+    stats = fetch([f"{server}/slow.pdf"], store)
+    store.close()
+    assert stats['downloaded'] == 1
+    with open(store.pdf_path(store.sha256(f"{server}/slow.pdf")), "rb") as file:
+        assert file.read() == Handler.files["/p0.pdf"]
+
+
+def test_excerpts_come_from_introduction_and_conclusion(server, tmp_path):
+    url = f"{server}/p1.pdf"
+    store = PdfStore(str(tmp_path))
+    fetch([url], store)
+    excerpt = FullTextSource(store).excerpt(url)
+    store.close()
+    assert excerpt.startswith("[Introduction] Kernel drivers are a large attack surface that is hard to test.")
+    assert "How it works" not in excerpt
+    assert "[Conclusion] We showed that DriverFuzz" in excerpt
+    assert "Someone" not in excerpt
+
+
+def test_garbled_text_is_a_failed_extraction(tmp_path):
+    # What Latin-1 decoding of a custom-encoded font looks like
+    garbled = ["".join(chr(0xC0 + (i * 7 + j) % 60) for j in range(40)) for i in range(10)]
+    path = tmp_path / "garbled.pdf"
+    path.write_bytes(make_pdf(garbled))
+    record = extract_file(str(path))
+    assert record['error'].startswith("unusable text")
+    assert 'introduction' not in record
+
+    assert text_problem("x" * 10)
+    assert text_problem("a1 b2 c3 d4 e5 f6 " * 20)
+    assert not text_problem(" ".join(INTRO + CONCLUSION) * 2)
+
+
+def test_failed_extraction_is_skipped_when_labeling(tmp_path):
+    store = PdfStore(str(tmp_path))
+    garbled = make_pdf(["\x01\x02\x03\x04" * 30] * 5)
+    temp = store.temp_file()
+    with temp:
+        temp.write(garbled)
+    sha256 = hashlib.sha256(garbled).hexdigest()
+    store.commit(temp.name, sha256)
+    store.record("http://example.org/garbled.pdf", sha256=sha256, size=len(garbled))
+
+    assert extract_pending(store, workers=1) == {'extracted': 0, 'failed': 1}
+    assert extract_pending(store, workers=1) == {'extracted': 0, 'failed': 0}
+    assert extract_pending(store, workers=1, redo_failed=True) == {'extracted': 0, 'failed': 1}
+    source = FullTextSource(store)
+    assert source.excerpt("http://example.org/garbled.pdf") == ''
+    assert source.missing == {"http://example.org/garbled.pdf"}
+    store.close()
@@ -0,0 +1,28 @@
+import pytest
+from scrapy.exceptions import DropItem
+
+from paper_analysis.sources import stable_id
+from paper_collect.items import PaperItem, stable_paper_id
+from paper_collect.pipelines import PaperCollectPipeline
+
+
+@pytest.mark.parametrize("doi, title", [
+    ("10.1145/3576915.3623157.", "Any Title"),
+    ("https://dl.acm.org/doi/10.1145/X", ""),
+    ("", "  Fuzzing  Kernel Drivers: A Study "),
+    (None, "Über-Fuzzing (2024)"),
+])
+def test_vendored_paper_id_matches_dedup(doi, title):
+    assert stable_paper_id(doi, title) == stable_id(doi, title)
+
+
+def test_exported_items_keep_their_fields():
+    aaai = {'paper_title': ' A  Paper ', 'pdf_url': 'http://x/a.pdf', 'authors': ['A', 'B'],
+            'relevance_score': 2.0}
+    assert PaperCollectPipeline().process_item(dict(aaai)) == aaai
+    with pytest.raises(DropItem):
+        PaperCollectPipeline().process_item({'title': '  ', 'authors': ['A']})
+
+    paper = PaperItem.from_dict(aaai)
+    assert (paper.title, paper.authors, paper.pdf_link) == ("A Paper", "A, B", "http://x/a.pdf")
+    assert paper.paper_id == stable_id('', 'A Paper')
@@ -0,0 +1,94 @@
+import json
+import os
+
+import pytest
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+
+from paper_collect.relevance import RelevanceScorer
+from paper_collect.spiders.aaai_papers import AAAISpider
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECTION_URL = "https://ojs.aaai.org/index.php/AAAI/issue/view/624"
+
+
+def article(title, href):
+    return f"""
+      <li><div class="obj_article_summary">
+        <h3 class="title"><a href="{href}">{title}</a></h3>
+        <div class="meta"><div class="authors">Alice, Bob</div></div>
+      </div></li>"""
+
+
+# 两个栏目：普通技术栏目和安全相关栏目，后者的栏目名本身就能让论文过阈值
+PAGE = f"""<html><body>
+  <div class="section"><h2>AAAI Technical Track on Machine Learning I</h2>
+    <ul class="cmp_article_list articles">
+      {article("Backdoor Attacks on Graph Neural Networks", "/article/1")}
+      {article("Efficient Graph Transformers for Traffic Forecasting", "/article/2")}
+    </ul></div>
+  <div class="section"><h2>AAAI Special Track on Safe, Robust and Responsible AI</h2>
+    <ul class="cmp_article_list articles">
+      {article("Calibrated Uncertainty for Reward Models", "/article/3")}
+    </ul></div>
+</body></html>"""
+
+
+@pytest.fixture
+def scorer():
+    return RelevanceScorer()
+
+
+def test_each_term_counts_once_with_its_weight(scorer):
+    assert scorer.score("Backdoor Attacks on Graph Neural Networks") == 6
+    assert scorer.score("Attack the attack: attacks everywhere") == 3
+    assert scorer.score("Efficient Graph Transformers for Traffic Forecasting") == 0
+    # "generative adversarial" 只是模型名称，不算对抗攻击
+    assert scorer.score("Generative Adversarial Networks for Image Synthesis") == 0
+    assert scorer.score("Adversarial Examples for Vision Models") == 3
+
+
+def test_section_terms_only_score_in_the_section_name(scorer):
+    title = "Calibrated Uncertainty for Reward Models"
+    assert scorer.score(title) == 0
+    assert scorer.score(title, "AAAI Special Track on Safe, Robust and Responsible AI") == 2
+    assert scorer.score("Value Alignment of Language Models") == 0
+    assert scorer.score("Value Alignment of Language Models", "Special Track on AI Alignment") == 1
+
+
+def test_default_threshold_on_the_recorded_aaai_titles(scorer):
+    # 未经筛选的 AAAI 2025 全量列表：阈值 2 时保留 295 / 3486 篇
+    with open(os.path.join(ROOT, "datas", "aaai2025_1.json"), "r", encoding="utf-8") as file:
+        titles = [paper["paper_title"] for paper in json.load(file)]
+    assert len(titles) == 3486
+    assert sum(scorer.score(title) >= 2 for title in titles) == 295
+
+
+def crawl_section(min_score=None, **settings):
+    crawler = get_crawler(AAAISpider, {"AAAI_RELEVANCE_THRESHOLD": 2, **settings})
+    spider = AAAISpider.from_crawler(crawler, min_score=min_score)
+    response = HtmlResponse(SECTION_URL, body=PAGE, encoding="utf-8", request=Request(SECTION_URL))
+    requests = list(spider.parse_section_articles(response))
+    counts = {key: crawler.stats.get_value(f"aaai/relevance/{key}", 0)
+              for key in ("kept", "skipped", "deprioritized")}
+    return requests, counts
+
+
+def test_papers_below_the_threshold_are_not_requested():
+    requests, counts = crawl_section()
+    assert [r.url.rsplit("/", 1)[1] for r in requests] == ["1", "3"]
+    assert [r.meta["item"]["relevance_score"] for r in requests] == [6, 2]
+    assert counts == {"kept": 2, "skipped": 1, "deprioritized": 0}
+
+
+def test_deprioritized_papers_are_requested_last():
+    requests, counts = crawl_section(AAAI_RELEVANCE_MODE="deprioritize")
+    assert [(r.url.rsplit("/", 1)[1], r.priority) for r in requests] == [("1", 0), ("2", -1), ("3", 0)]
+    assert counts == {"kept": 2, "skipped": 0, "deprioritized": 1}
+
+
+def test_min_score_zero_disables_the_filter():
+    requests, counts = crawl_section(min_score="0")
+    assert len(requests) == 3
+    assert all(r.priority == 0 for r in requests)
+    assert counts == {"kept": 3, "skipped": 0, "deprioritized": 0}
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import os
+import random
+import socket
+
+import pytest
+
+from paper_analysis.cli import main, output_paths
+from paper_analysis.llm import APIError
+from paper_analysis.mock_server import MockBehavior, MockServer
+from paper_analysis.retry import CircuitBreaker, FailureQueue, RetryPolicy, classify_error
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("exc, error_class", [
+    (APIError("too many requests", status=429), 'rate_limit'),
+    (ValueError("Throttling.RateQuota: Requests rate limit exceeded"), 'rate_limit'),
+    (APIError("bad gateway", status=502), 'server'),
+    (ValueError("status_code: 503, code: ServiceUnavailable"), 'server'),
+    (APIError("invalid api key", status=401), 'client'),
+    (APIError("bad request", status=400), 'client'),
+    (asyncio.TimeoutError(), 'timeout'),
+    (socket.timeout("timed out"), 'timeout'),
+    (ConnectionResetError("reset by peer"), 'connection'),
+    (KeyError("choices"), 'unknown'),
+])
+def test_errors_are_classified_by_status_and_type(exc, error_class):
+    assert classify_error(exc) == error_class
+
+
+def test_backoff_grows_per_class_and_stops_when_retries_run_out(monkeypatch):
+    monkeypatch.setattr(random, "uniform", lambda low, high: high)
+    policy = RetryPolicy()
+    assert [policy.delay('server', attempt) for attempt in range(5)] == [1.0, 2.0, 4.0, 8.0, None]
+    rate_limit = [policy.delay('rate_limit', attempt) for attempt in range(7)]
+    assert rate_limit == [2.0, 4.0, 8.0, 16.0, 32.0, 60.0, None]
+    assert policy.delay('client', 0) is None
+    # Retry-After wins over a shorter backoff, but not over the cap of the class
+    assert policy.delay('rate_limit', 0, retry_after=10) == 10
+    assert policy.delay('server', 0, retry_after=600) == 30.0
+
+    monkeypatch.setattr(random, "uniform", lambda low, high: low)
+    assert policy.delay('server', 2) == 2.0  # half of the backoff is fixed
+    capped = RetryPolicy(max_retries=1)
+    assert capped.delay('rate_limit', 0) is not None and capped.delay('rate_limit', 1) is None
+    assert RetryPolicy(max_retries=0).delay('server', 0) is None
+
+
+def test_breaker_opens_probes_and_closes():
+    async def scenario():
+        breaker = CircuitBreaker(threshold=3, cooldown=0.1, max_cooldown=0.15)
+        breaker.record_failure('server')
+        breaker.record_failure('client')  # says nothing about the endpoint
+        breaker.record_failure('timeout')
+        assert breaker.state == 'closed'
+        breaker.record_failure('rate_limit')
+        assert breaker.state == 'open' and breaker.opened == 1
+
+        # After the cooldown a single probe goes through, the others keep waiting
+        await asyncio.wait_for(breaker.before_call(), 1)
+        assert breaker.state == 'half_open'
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(breaker.before_call(), 0.2)
+
+        # A failed probe reopens the circuit with a longer (capped) cooldown
+        breaker.record_failure('server')
+        assert breaker.state == 'open' and breaker.cooldown == 0.15 and breaker.opened == 2
+        await asyncio.wait_for(breaker.before_call(), 1)
+        breaker.record_success()
+        assert breaker.state == 'closed' and breaker.cooldown == 0.1 and breaker.failures == 0
+        await asyncio.wait_for(breaker.before_call(), 0.01)
+
+    asyncio.run(scenario())
+
+
+def test_failure_queue_survives_restarts_and_compacts(tmp_path):
+    path = str(tmp_path / "papers_keywords.json.failures.jsonl")
+    queue = FailureQueue(path)
+    queue.add("a", 0, "Paper A", {'class': 'server', 'message': "500", 'attempts': 5})
+    queue.add("b", 1, "Paper B", {'class': 'timeout', 'message': "timed out", 'attempts': 4})
+    queue.close()
+
+    queue = FailureQueue(path)
+    assert len(queue) == 2 and "a" in queue
+    queue.add("a", 0, "Paper A", {'class': 'rate_limit', 'message': "429", 'attempts': 7})
+    queue.resolve("b")
+    queue.resolve("c")  # never queued: nothing is written
+    with open(path, "r", encoding="utf-8") as file:
+        assert len(file.readlines()) == 4
+    queue.close()
+
+    with open(path, "r", encoding="utf-8") as file:
+        records = [json.loads(line) for line in file]
+    assert [(r['key'], r['error_class'], r['attempts']) for r in records] == [("a", 'rate_limit', 12)]
+    queue = FailureQueue(path)
+    queue.resolve("a")
+    queue.close()
+    assert not os.path.exists(path)
+
+
+def test_retry_failures_relabels_only_the_queued_papers(tmp_path):
+    with open(os.path.join(ROOT, "datas", "SP24.json"), "r", encoding="utf-8") as file:
+        papers = json.load(file)[:12]
+    input_path = tmp_path / "papers.json"
+    input_path.write_text(json.dumps(papers, ensure_ascii=False), encoding="utf-8")
+    output, _ = output_paths(str(input_path), str(tmp_path))
+    queue_path = output + ".failures.jsonl"
+
+    behavior = MockBehavior(latency=0.0, error_rate=0.5, seed=3)
+    with MockServer(behavior) as server:
+        args = ["label", str(input_path), "--labels", os.path.join(ROOT, "web_of_science", "labels.txt"),
+                "--client", "compatible", "--base-url", server.base_url, "--api-key", "test", "--cache", "",
+                "--output-dir", str(tmp_path), "--max-retries", "0", "--breaker-threshold", "0"]
+        main(args)
+        failed = len(FailureQueue(queue_path))
+        assert 0 < failed < len(papers)
+        with open(output, "r", encoding="utf-8") as file:
+            assert sum("关键词提取失败" in json.dumps(p, ensure_ascii=False) for p in json.load(file)) == failed
+
+        behavior.error_rate = 0.0
+        requests = behavior.stats['requests']
+        main(args + ["--retry-failures"])
+        assert behavior.stats['requests'] - requests == failed
+
+    assert not os.path.exists(queue_path)
+    with open(output, "r", encoding="utf-8") as file:
+        relabeled = json.load(file)
+    assert len(relabeled) == len(papers)
+    assert not any("关键词提取失败" in json.dumps(p, ensure_ascii=False) for p in relabeled)
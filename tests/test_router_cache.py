@@ -0,0 +1,64 @@
+import asyncio
+import os
+
+import pytest
+
+from paper_analysis.cache import ResponseCache
+from paper_analysis.engine import LabelingEngine
+from paper_analysis.llm import PROMPT_TEMPLATE, build_chain
+from paper_analysis.mock_server import MockBehavior, MockServer
+from paper_analysis.router import Router
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def server():
+    with MockServer(MockBehavior(latency=0.0, seed=1)) as server:
+        yield server
+
+
+@pytest.fixture
+def labels():
+    with open(os.path.join(ROOT, "web_of_science", "labels.txt"), "r", encoding="utf-8") as file:
+        return file.read().strip()
+
+
+def engine_for(server, labels, cache, cheap_model):
+    route = {"client": "compatible", "base_url": server.base_url}
+    router = Router.from_config({"default_tier": "cheap", "escalate_to": "big", "routes": [
+        dict(route, name="cheap", model=cheap_model, tier="cheap"),
+        dict(route, name="big", model="big-model", tier="big"),
+    ]}, api_key="test")
+    chain = build_chain(router, PROMPT_TEMPLATE, ["title", "abstract", "labels"])
+    return LabelingEngine(chain, labels, "未分类", prompt_template=PROMPT_TEMPLATE, cache=cache, router=router)
+
+
+def invoke(engine, labels, tier=None):
+    usage = engine._new_usage()
+    inputs = {"title": "Fuzzing Kernel Drivers", "abstract": "We fuzz drivers.", "labels": labels}
+    asyncio.run(engine._invoke(asyncio.Semaphore(1), engine.chain, PROMPT_TEMPLATE, inputs, usage, tier=tier))
+    return usage
+
+
+def cached_models(cache):
+    return sorted(row[0] for row in cache._conn.execute("SELECT model FROM responses"))
+
+
+def test_cache_keys_on_tier_and_serving_model(server, labels, tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), labels=labels)
+    engine = engine_for(server, labels, cache, "cheap-model")
+
+    assert invoke(engine, labels)['api_calls'] == 1
+    assert invoke(engine, labels)['cached_calls'] == 1
+    # The cheap tier's answer is not replayed for the escalation tier
+    assert invoke(engine, labels, tier="big")['api_calls'] == 1
+    assert invoke(engine, labels, tier="big")['cached_calls'] == 1
+    assert cached_models(cache) == ["big-model", "cheap-model"]
+
+    # Another model behind the cheap tier does not reuse the old model's answer
+    engine = engine_for(server, labels, cache, "other-cheap-model")
+    assert invoke(engine, labels)['api_calls'] == 1
+    assert invoke(engine, labels, tier="big")['cached_calls'] == 1
+    assert cached_models(cache) == ["big-model", "cheap-model", "other-cheap-model"]
+    cache.close()
@@ -0,0 +1,42 @@
+import json
+
+from paper_analysis.search import Searcher, add_files
+from paper_analysis.sources import ConferenceAdapter
+
+
+def write(path, papers):
+    path.write_text(json.dumps(papers, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+def labeled(title, year=None):
+    paper = {"title": title, "abstract": "We fuzz kernel drivers.", "keywords": "fuzzing (模糊测试)",
+             "theme_label": "3.8.1 漏洞挖掘与逆向分析"}
+    return dict(paper, year=year) if year else paper
+
+
+def test_yearless_v2_output_is_found_by_year(tmp_path):
+    v2 = write(tmp_path / "usenix_papers_keywords_v2.json", [labeled("DriverFuzz")])
+    ccs = write(tmp_path / "CCS24_papers_keywords.json", [labeled("KernelFuzz")])
+    ndss = write(tmp_path / "ndss_papers_keywords_v2.json", [labeled("NetFuzz", "2023")])
+    index = str(tmp_path / "index")
+
+    list(add_files([v2, ccs, ndss], index))
+    assert {hit['source'] for _, hit in Searcher(index).search("fuzzing", year=2024)} == {"ccs"}
+
+    # The fallback year fills only the papers and files that carry none; CCS24 is unchanged
+    assert [count for _, count in add_files([v2, ccs, ndss], index, year="2024")] == [1, None, 1]
+    hits = Searcher(index).search("fuzzing", year=2024)
+    assert sorted((hit['source'], hit['year']) for _, hit in hits) == [("ccs", "2024"), ("usenix", "2024")]
+    assert [hit['title'] for _, hit in Searcher(index).search("fuzzing", year=2023)] == ["NetFuzz"]
+
+    list(add_files([v2], index, file_years={"usenix_papers_keywords_v2.json": "2022"}))
+    assert [hit['title'] for _, hit in Searcher(index).search("fuzzing", year=2022)] == ["DriverFuzz"]
+
+
+def test_labeled_conference_records_keep_the_year():
+    paper = {"title": "DriverFuzz", "abstract": "x", "authors": ["A"], "pdf_link": "", "year": "2024"}
+    result = {"keywords": "fuzzing", "theme_label": "3.8.1 漏洞挖掘与逆向分析"}
+    full, keywords_only = ConferenceAdapter().records(paper, result)
+    assert full['year'] == keywords_only['year'] == "2024"
+    assert 'year' not in ConferenceAdapter().records(dict(paper, year=""), result)[0]
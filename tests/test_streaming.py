@@ -0,0 +1,37 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from paper_analysis.mock_server import MockBehavior, MockServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_streamed_run_has_clean_stderr_and_closes_streams(tmp_path):
+    with open(os.path.join(ROOT, "datas", "SP24.json"), "r", encoding="utf-8") as file:
+        papers = json.load(file)[:40]
+    input_path = tmp_path / "papers.json"
+    input_path.write_text(json.dumps(papers, ensure_ascii=False), encoding="utf-8")
+
+    behavior = MockBehavior(latency=0.3, trailing_lines=20, seed=1)
+    with MockServer(behavior) as server:
+        run = subprocess.run(
+            [sys.executable, "-m", "paper_analysis", "label", str(input_path),
+             "--labels", os.path.join(ROOT, "web_of_science", "labels.txt"), "--client", "compatible",
+             "--base-url", server.base_url, "--api-key", "test", "--cache", "", "--output-dir", str(tmp_path),
+             "--stream"],
+            cwd=ROOT, capture_output=True, text=True, timeout=120)
+        # The server notices a closed connection on its next write
+        deadline = time.monotonic() + 5
+        while behavior.stats['cancelled'] < behavior.stats['streamed'] and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    assert run.returncode == 0, run.stderr
+    # Only the progress bar may write to stderr
+    noise = [line for line in run.stderr.replace("\r", "\n").splitlines()
+             if line.strip() and not line.startswith("Extracting Keywords and Labels")]
+    assert noise == []
+    assert behavior.stats['streamed'] == len(papers)
+    assert behavior.stats['cancelled'] == len(papers)
@@ -0,0 +1,27 @@
+import os
+
+from paper_analysis.preclassifier import canonical_label
+from paper_analysis.taxonomy import Taxonomy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def taxonomy():
+    with open(os.path.join(ROOT, "web_of_science", "labels.txt"), "r", encoding="utf-8") as file:
+        return Taxonomy.parse(file.read())
+
+
+def test_code_wins_over_a_name_that_does_not_fit_it():
+    labels = taxonomy()
+    assert labels.resolve("人工智能安全").code == "7.1"
+    assert labels.resolve("3.8.1 人工智能安全").code == "3.8.1"
+    assert labels.resolve("3.8.1 漏洞挖掘").code == "3.8.1"
+    assert labels.resolve("主题标签：3.8.1 漏洞挖掘与逆向分析").code == "3.8.1"
+
+
+def test_training_labels_resolve_like_the_engine():
+    labels = taxonomy()
+    assert canonical_label(labels, "人工智能安全") == labels.resolve("人工智能安全").text
+    assert canonical_label(labels, "人工智能安全").startswith("7.1 ")
+    assert canonical_label(labels, "3.8.1 漏洞挖掘与逆向分析") == "3.8.1 漏洞挖掘与逆向分析"
+    assert canonical_label(labels, "未分类") is None
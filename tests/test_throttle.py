@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+
+import pytest
+from scrapy.http import Request, Response
+from scrapy.settings import Settings
+
+from paper_collect import middlewares
+from paper_collect.middlewares import AdaptiveThrottleMiddleware
+
+
+class FakeDownloader:
+    """Just the downloader slot bookkeeping the middleware touches."""
+
+    def __init__(self):
+        self.slots = {}
+        self.per_slot_settings = {}
+
+    def get_slot_key(self, request):
+        return "example.org"
+
+    def open_slot(self):
+        settings = self.per_slot_settings["example.org"]
+        slot = SimpleNamespace(concurrency=settings["concurrency"], delay=settings["delay"])
+        self.slots["example.org"] = slot
+        return slot
+
+
+@pytest.fixture
+def throttle():
+    settings = Settings({"ADAPTIVE_THROTTLE_ENABLED": True, "ADAPTIVE_THROTTLE_TARGET_LATENCY": 1.0,
+                         "ADAPTIVE_THROTTLE_START_CONCURRENCY": 2, "ADAPTIVE_THROTTLE_START_DELAY": 1.0,
+                         "ADAPTIVE_THROTTLE_MAX_CONCURRENCY": 4, "ADAPTIVE_THROTTLE_MIN_DELAY": 0.25})
+    crawler = SimpleNamespace(settings=settings, engine=SimpleNamespace(downloader=FakeDownloader()),
+                              spider=SimpleNamespace(logger=SimpleNamespace(debug=lambda *args: None)))
+    return AdaptiveThrottleMiddleware(crawler)
+
+
+def download(throttle, latency, status=200, flags=None, headers=None):
+    request = Request("https://example.org/paper", meta={"download_slot": "example.org",
+                                                         "download_latency": latency})
+    throttle.process_request(request)
+    downloader = throttle.crawler.engine.downloader
+    slot = downloader.slots.get("example.org") or downloader.open_slot()
+    throttle.process_response(request, Response(request.url, status=status, flags=flags, headers=headers))
+    return slot
+
+
+def test_fast_responses_raise_concurrency_and_shorten_the_delay(throttle):
+    for _ in range(20):
+        slot = download(throttle, 0.1)
+    assert slot.concurrency == 4
+    assert slot.delay == 0.25
+
+
+def test_slow_and_throttled_responses_back_off(throttle):
+    for _ in range(4):
+        slot = download(throttle, 0.1)
+    assert slot.concurrency == 3
+    fast_delay = slot.delay
+    for _ in range(10):
+        slot = download(throttle, 5.0)
+    assert slot.concurrency == 1
+    assert slot.delay > fast_delay
+
+    slot.concurrency, slot.delay = 4, 1.0
+    slot = download(throttle, 0.1, status=429, headers={"Retry-After": "7"})
+    assert (slot.concurrency, slot.delay) == (2, 7.0)
+    report = throttle.telemetry()["example.org"]
+    assert report["throttled"] == 1 and report["backoff_events"] == 1
+
+
+def test_cached_responses_are_not_counted(throttle):
+    slot = download(throttle, 0.1)
+    before = (slot.concurrency, slot.delay)
+    for _ in range(10):
+        download(throttle, 0.1, flags=["cached"])
+    assert (slot.concurrency, slot.delay) == before
+    report = throttle.telemetry()["example.org"]
+    assert report["requests"] == report["responses"] == 1
+
+
+def test_latency_window_is_bounded(throttle):
+    for _ in range(middlewares.LATENCY_WINDOW + 50):
+        download(throttle, 0.1)
+    state = throttle.domains["example.org"]
+    assert len(state.latencies) == middlewares.LATENCY_WINDOW
+    assert state.responses == middlewares.LATENCY_WINDOW + 50